@@ -1,5 +1,6 @@
 from allauth.account.adapter import DefaultAccountAdapter
 from django import forms
+from .campuses import EMAIL_DOMAINS
 
 
 class BITsEmailAdapter(DefaultAccountAdapter):
@@ -8,12 +9,7 @@ class BITsEmailAdapter(DefaultAccountAdapter):
     def clean_email(self, email):
         email = super().clean_email(email)
         # Check if email ends with @pilani.bits-pilani.ac.in or similar BITs domains
-        bits_domains = [
-            '@pilani.bits-pilani.ac.in',
-            '@goa.bits-pilani.ac.in',
-            '@hyderabad.bits-pilani.ac.in',
-            '@bits-pilani.ac.in'
-        ]
+        bits_domains = [f'@{domain}' for domain in EMAIL_DOMAINS] + ['@bits-pilani.ac.in']
         
         if not any(email.endswith(domain) for domain in bits_domains):
             # Allow non-BITs emails for now, but you can raise an error if needed
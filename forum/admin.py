@@ -1,21 +1,110 @@
+import json
+from django.conf import settings
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
 from django.contrib.auth.models import User
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Q
+from django.utils.functional import cached_property
 from .models import (
     UserProfile, Course, Resource, Category, Thread, Reply, 
-    Upvote, Tag, ThreadTag, Report
+    Upvote, Tag, ThreadTag, Report, ThreadPurge, ReplyArchive, UserStats, RollupWatermark,
+    ArchivedThread
 )
+from .retention import restore_replies
+from .moderation import set_threads_locked, soft_delete_threads, soft_delete_replies, resolve_reports
+
+
+# Fields of the GIN-indexed full-text vectors (migration 0014); admin search
+# on PostgreSQL must build the vector exactly as the index does to use it.
+SEARCH_CONFIG = 'english'
+THREAD_SEARCH_VECTOR = ('title', 'content')
+REPLY_SEARCH_VECTOR = ('content',)
+
+
+class EstimatedCountPaginator(Paginator):
+    """Paginator that trusts the PostgreSQL planner's row estimate for big results"""
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        connection = connections[queryset.db]
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                if not queryset.query.where:
+                    cursor.execute(
+                        'SELECT reltuples FROM pg_class WHERE oid = %s::regclass',
+                        [queryset.model._meta.db_table],
+                    )
+                else:
+                    sql, params = queryset.query.sql_with_params()
+                    cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+                row = cursor.fetchone()
+            if not queryset.query.where:
+                estimate = row[0] if row else 0
+            else:
+                plan = json.loads(row[0]) if isinstance(row[0], str) else row[0]
+                estimate = plan[0]['Plan']['Plan Rows']
+            if estimate > settings.ADMIN_ESTIMATED_COUNT_THRESHOLD:
+                return int(estimate)
+        return super().count
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    """Changelist settings for tables too big for exact counts"""
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+
+class FullTextSearchAdmin(LargeTableAdmin):
+    """
+    Searches search_vector through the full-text index instead of icontains,
+    plus the posts of an author whose username is the exact search term
+    """
+    search_vector = ()
+    search_fields = ['=author__username']
+
+    def get_search_fields(self, request):
+        fields = list(super().get_search_fields(request))
+        if connections[self.model.objects.db].vendor != 'postgresql':
+            fields += list(self.search_vector)
+        return fields
+
+    def get_search_results(self, request, queryset, search_term):
+        if not search_term or connections[queryset.db].vendor != 'postgresql':
+            return super().get_search_results(request, queryset, search_term)
+        from django.contrib.postgres.search import SearchQuery, SearchVector
+
+        queryset = queryset.annotate(search_document=SearchVector(*self.search_vector, config=SEARCH_CONFIG))
+        match = Q(search_document=SearchQuery(search_term, config=SEARCH_CONFIG, search_type='websearch'))
+        # Looked up on its own: joining auth_user into the match would keep
+        # the planner from combining the GIN index with the author_id one.
+        author_ids = list(User.objects.filter(username=search_term.strip()).values_list('pk', flat=True))
+        if author_ids:
+            match |= Q(author_id__in=author_ids)
+        return queryset.filter(match), False
 
 
 @admin.register(UserProfile)
 class UserProfileAdmin(admin.ModelAdmin):
-    list_display = ['user', 'full_name', 'bits_email', 'is_moderator', 'created_at']
-    list_filter = ['is_moderator', 'created_at']
+    list_display = ['user', 'full_name', 'bits_email', 'campus', 'is_moderator', 'created_at']
+    list_select_related = ['user']
+    list_filter = ['is_moderator', 'campus', 'created_at']
     search_fields = ['user__username', 'user__email', 'full_name', 'bits_email']
     list_editable = ['is_moderator']
     raw_id_fields = ['user']
 
 
+@admin.register(UserStats)
+class UserStatsAdmin(LargeTableAdmin):
+    list_display = ['user', 'karma', 'thread_count', 'reply_count', 'upvotes_received', 'updated_at']
+    list_select_related = ['user']
+    search_fields = ['user__username']
+    raw_id_fields = ['user']
+    readonly_fields = ['thread_count', 'reply_count', 'upvotes_received', 'karma']
+
+
 class UserProfileInline(admin.StackedInline):
     model = UserProfile
     can_delete = False
@@ -28,6 +117,7 @@ class CustomUserAdmin(UserAdmin):
     inlines = (UserProfileInline,)
     list_display = ('username', 'email', 'first_name', 'last_name', 'is_staff', 'get_is_moderator')
     list_filter = ('is_staff', 'is_superuser', 'is_active')
+    list_select_related = ('profile',)
     
     def get_is_moderator(self, obj):
         try:
@@ -47,29 +137,79 @@ admin.site.unregister(User)
 admin.site.register(User, CustomUserAdmin)
 
 admin.site.register(Course)
-admin.site.register(Resource)
+
+@admin.register(Resource)
+class ResourceAdmin(admin.ModelAdmin):
+    list_display = ['title', 'resource_type', 'course', 'created_at']
+    list_select_related = ['course']
+    list_filter = ['resource_type']
+    search_fields = ['title']
+    raw_id_fields = ['course']
 
 @admin.register(Category)
 class CategoryAdmin(admin.ModelAdmin):
-    list_display = ['name', 'slug', 'created_at']
+    list_display = ['name', 'slug', 'campus', 'created_at']
+    list_filter = ['campus']
     prepopulated_fields = {'slug': ('name',)}
     search_fields = ['name', 'slug']
 
 @admin.register(Thread)
-class ThreadAdmin(admin.ModelAdmin):
-    list_display = ['title', 'author', 'category', 'is_locked', 'created_at']
-    list_filter = ['category', 'is_locked', 'created_at']
-    search_fields = ['title', 'content', 'author__username']
+class ThreadAdmin(FullTextSearchAdmin):
+    list_display = ['title', 'author', 'category', 'campus', 'is_locked', 'is_deleted', 'created_at']
+    list_select_related = ['author', 'category']
+    list_filter = ['campus', 'category', 'is_locked', 'is_deleted', 'created_at']
+    search_vector = THREAD_SEARCH_VECTOR
     raw_id_fields = ['author', 'category', 'course', 'resource']
+    actions = ['lock_selected', 'unlock_selected', 'soft_delete_selected']
+
+    @admin.action(description='Lock selected threads')
+    def lock_selected(self, request, queryset):
+        changed = set_threads_locked(queryset, True)
+        self.message_user(request, f'{changed} thread(s) locked.')
+
+    @admin.action(description='Unlock selected threads')
+    def unlock_selected(self, request, queryset):
+        changed = set_threads_locked(queryset, False)
+        self.message_user(request, f'{changed} thread(s) unlocked.')
+
+    @admin.action(description='Hide selected threads')
+    def soft_delete_selected(self, request, queryset):
+        changed = soft_delete_threads(queryset)
+        self.message_user(request, f'{changed} thread(s) hidden.')
 
 @admin.register(Reply)
-class ReplyAdmin(admin.ModelAdmin):
+class ReplyAdmin(FullTextSearchAdmin):
     list_display = ['thread', 'author', 'is_deleted', 'created_at']
+    list_select_related = ['thread', 'author']
     list_filter = ['is_deleted', 'created_at']
-    search_fields = ['content', 'author__username', 'thread__title']
+    search_vector = REPLY_SEARCH_VECTOR
     raw_id_fields = ['thread', 'author']
+    actions = ['soft_delete_selected']
+
+    @admin.action(description='Delete selected replies')
+    def soft_delete_selected(self, request, queryset):
+        changed = soft_delete_replies(queryset)
+        self.message_user(request, f'{changed} reply(s) deleted.')
+
+@admin.register(ReplyArchive)
+class ReplyArchiveAdmin(LargeTableAdmin):
+    list_display = ['id', 'thread', 'author', 'deleted_at', 'archived_at']
+    list_select_related = ['thread', 'author']
+    list_filter = ['archived_at']
+    search_fields = ['author__username', 'thread__title']
+    raw_id_fields = ['thread', 'author']
+    actions = ['restore_selected']
+
+    @admin.action(description='Restore selected replies')
+    def restore_selected(self, request, queryset):
+        restored = restore_replies(queryset.filter(thread__is_deleted=False))
+        self.message_user(request, f'{restored} reply(s) restored.')
 
-admin.site.register(Upvote)
+@admin.register(Upvote)
+class UpvoteAdmin(LargeTableAdmin):
+    list_display = ['user', 'thread', 'reply_id', 'created_at']
+    list_select_related = ['user', 'thread']
+    raw_id_fields = ['user', 'thread', 'reply']
 
 @admin.register(Tag)
 class TagAdmin(admin.ModelAdmin):
@@ -77,15 +217,50 @@ class TagAdmin(admin.ModelAdmin):
     prepopulated_fields = {'slug': ('name',)}
     search_fields = ['name', 'slug']
 
-admin.site.register(ThreadTag)
+@admin.register(ThreadTag)
+class ThreadTagAdmin(LargeTableAdmin):
+    list_display = ['thread', 'tag']
+    list_select_related = ['thread', 'tag']
+    raw_id_fields = ['thread', 'tag']
 
 @admin.register(Report)
-class ReportAdmin(admin.ModelAdmin):
+class ReportAdmin(LargeTableAdmin):
     list_display = ['reporter', 'status', 'content_type', 'created_at', 'resolved_by']
+    list_select_related = ['reporter', 'resolved_by']
     list_filter = ['status', 'created_at']
     search_fields = ['reason', 'reporter__username']
     raw_id_fields = ['reporter', 'thread', 'reply', 'resolved_by']
+    actions = ['resolve_selected']
     
     def content_type(self, obj):
-        return 'Thread' if obj.thread else 'Reply'
+        return 'Thread' if obj.thread_id else 'Reply'
     content_type.short_description = 'Type'
+
+    @admin.action(description='Resolve selected reports')
+    def resolve_selected(self, request, queryset):
+        resolved = resolve_reports(queryset, request.user)
+        self.message_user(request, f'{resolved} report(s) resolved.')
+
+
+@admin.register(ThreadPurge)
+class ThreadPurgeAdmin(admin.ModelAdmin):
+    list_display = ['thread_id', 'thread_title', 'status', 'rows_deleted', 'requested_by', 'created_at', 'finished_at']
+    list_filter = ['status', 'created_at']
+    search_fields = ['thread_title']
+    raw_id_fields = ['requested_by']
+    readonly_fields = ['rows_deleted', 'started_at', 'finished_at', 'error']
+
+
+@admin.register(RollupWatermark)
+class RollupWatermarkAdmin(admin.ModelAdmin):
+    list_display = ['source', 'last_id', 'updated_at']
+    readonly_fields = ['source', 'last_id', 'updated_at']
+
+
+@admin.register(ArchivedThread)
+class ArchivedThreadAdmin(admin.ModelAdmin):
+    list_display = ['title', 'semester', 'category', 'author', 'reply_count', 'created_at', 'archived_at']
+    list_select_related = ['category', 'author']
+    list_filter = ['semester', 'category']
+    search_fields = ['title']
+    readonly_fields = [f.name for f in ArchivedThread._meta.fields]
@@ -0,0 +1,294 @@
+"""
+Cold archive for threads from past semesters.
+
+`manage.py archive_threads` moves locked threads with no activity since the
+archive cutoff out of Thread, Reply, Upvote and ThreadTag into
+ArchivedThread and ArchivedReply, a batch of threads per transaction, and
+then removes the originals with the same raw deletes as thread purges. The
+hot tables and their indexes are left with the current semester's threads.
+
+Archived threads keep their primary keys, so thread_detail and search read
+them through from the archive tables, and the users' stats keep counting
+them (rebuild_user_stats adds the archive back in).
+"""
+from collections import defaultdict
+from datetime import timedelta
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import connection, transaction
+from django.db.models import Exists, OuterRef, Q
+from django.utils import timezone
+from .models import (
+    Thread, Reply, ReplyArchive, Upvote, Report, Tag, ThreadTag, ThreadPurge, ArchivedThread, ArchivedReply,
+)
+from .purge import purge_thread
+from .courses import invalidate_course_hub
+from .summaries import invalidate_thread_summaries
+from .snapshots import unlink_thread as unlink_thread_snapshots
+from .search import bump_generation as bump_search_generation
+from .campuses import campus_filter
+
+
+# Semesters run July-December (I) and January-June (II), named by academic year.
+
+def semester_start(dt):
+    dt = timezone.localtime(dt)
+    month = 7 if dt.month >= 7 else 1
+    return dt.replace(month=month, day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def semester_of(dt):
+    """Label such as '2025-26/I' for the semester a datetime falls in"""
+    dt = timezone.localtime(dt)
+    if dt.month >= 7:
+        return f'{dt.year}-{(dt.year + 1) % 100:02d}/I'
+    return f'{dt.year - 1}-{dt.year % 100:02d}/II'
+
+
+def archive_cutoff(keep=None, now=None):
+    """Start of the oldest semester kept in the live tables"""
+    keep = settings.THREAD_ARCHIVE_KEEP_SEMESTERS if keep is None else keep
+    start = semester_start(now or timezone.now())
+    for _ in range(max(keep, 1) - 1):
+        start = semester_start(start - timedelta(days=1))
+    return start
+
+
+def archivable_threads(cutoff=None):
+    """Locked threads untouched since the cutoff that are safe to move"""
+    cutoff = cutoff or archive_cutoff()
+    return Thread.objects.filter(is_locked=True, is_deleted=False, updated_at__lt=cutoff).exclude(
+        Exists(Reply.objects.filter(thread=OuterRef('pk'), updated_at__gte=cutoff))
+    ).exclude(
+        # Threads under a pending report stay where moderators can reach them.
+        Exists(Report.objects.filter(
+            Q(thread=OuterRef('pk')) | Q(reply__thread=OuterRef('pk')), status='Pending'
+        ))
+    ).exclude(
+        Exists(ThreadPurge.objects.filter(thread_id=OuterRef('pk')))
+    )
+
+
+def _grouped_ids(queryset, key, value):
+    grouped = defaultdict(list)
+    for k, v in queryset.values_list(key, value):
+        grouped[k].append(v)
+    return grouped
+
+
+def _archive_batch(threads):
+    ids = [t.pk for t in threads]
+    tags = _grouped_ids(ThreadTag.objects.filter(thread_id__in=ids).order_by('tag__name'), 'thread_id', 'tag__name')
+    thread_upvoters = _grouped_ids(Upvote.objects.filter(thread_id__in=ids), 'thread_id', 'user_id')
+    replies = list(Reply.objects.filter(thread_id__in=ids).values(
+        'pk', 'thread_id', 'author_id', 'content', 'content_html',
+        'is_deleted', 'deleted_at', 'created_at', 'updated_at',
+    ))
+    reply_upvoters = _grouped_ids(
+        Upvote.objects.filter(reply_id__in=[r['pk'] for r in replies]), 'reply_id', 'user_id'
+    )
+
+    reply_counts = defaultdict(int)
+    for r in replies:
+        if not r['is_deleted']:
+            reply_counts[r['thread_id']] += 1
+
+    ArchivedThread.objects.bulk_create([
+        ArchivedThread(
+            id=t.pk,
+            semester=semester_of(t.created_at),
+            campus=t.campus,
+            title=t.title,
+            content=t.content,
+            content_html=t.content_html,
+            excerpt=t.excerpt,
+            author_id=t.author_id,
+            category_id=t.category_id,
+            course_id=t.course_id,
+            resource_id=t.resource_id,
+            tag_names=','.join(tags[t.pk]),
+            upvoter_ids=thread_upvoters[t.pk],
+            upvote_count=len(thread_upvoters[t.pk]),
+            reply_count=reply_counts[t.pk],
+            view_count=t.view_count,
+            unique_viewers=t.unique_viewers,
+            legacy_id=t.legacy_id,
+            created_at=t.created_at,
+            updated_at=t.updated_at,
+        )
+        for t in threads
+    ])
+    archived_replies = [
+        ArchivedReply(
+            id=r['pk'],
+            thread_id=r['thread_id'],
+            author_id=r['author_id'],
+            content=r['content'],
+            content_html=r['content_html'],
+            is_deleted=r['is_deleted'],
+            deleted_at=r['deleted_at'],
+            upvoter_ids=reply_upvoters[r['pk']],
+            upvote_count=len(reply_upvoters[r['pk']]),
+            created_at=r['created_at'],
+            updated_at=r['updated_at'],
+        )
+        for r in replies
+    ]
+    # Replies already moved to ReplyArchive would otherwise go with the thread.
+    archived_replies += [
+        ArchivedReply(
+            id=a.id,
+            thread_id=a.thread_id,
+            author_id=a.author_id,
+            content=a.content,
+            content_html=a.content_html,
+            is_deleted=True,
+            deleted_at=a.deleted_at,
+            upvoter_ids=a.upvoter_ids,
+            upvote_count=len(a.upvoter_ids),
+            created_at=a.created_at,
+            updated_at=a.deleted_at or a.created_at,
+        )
+        for a in ReplyArchive.objects.filter(thread_id__in=ids)
+    ]
+    ArchivedReply.objects.bulk_create(archived_replies, batch_size=1000)
+
+    for thread_id in ids:
+        purge_thread(thread_id)
+
+
+def archive_threads(cutoff=None, batch_size=100, progress=None):
+    """
+    Move archivable threads with their replies, votes and tags into the archive.
+
+    Each batch is copied and its originals deleted in one transaction.
+    Returns the number of threads archived.
+    """
+    queryset = archivable_threads(cutoff).order_by('pk')
+    archived = 0
+    last_pk = 0
+    while True:
+        with transaction.atomic():
+            threads = list(queryset.filter(pk__gt=last_pk).select_for_update()[:batch_size])
+            if not threads:
+                return archived
+            _archive_batch(threads)
+        last_pk = threads[-1].pk
+
+        # The raw deletes send no signals, so drop the cached pages here.
+        for course_id in {t.course_id for t in threads}:
+            invalidate_course_hub(course_id)
+        invalidate_thread_summaries([t.pk for t in threads])
+        for t in threads:
+            unlink_thread_snapshots(t.pk, t.category_id)
+        bump_search_generation()
+        archived += len(threads)
+        if progress:
+            progress(archived)
+
+
+def restore_threads(archives):
+    """Put archived threads back into the live tables, still locked"""
+    archives = list(archives)
+    if not archives:
+        return 0
+    ids = [a.pk for a in archives]
+
+    with transaction.atomic():
+        threads = [
+            Thread(
+                id=a.id,
+                title=a.title,
+                content=a.content,
+                content_html=a.content_html,
+                excerpt=a.excerpt,
+                author_id=a.author_id,
+                category_id=a.category_id,
+                course_id=a.course_id,
+                resource_id=a.resource_id,
+                campus=a.campus,
+                is_locked=True,
+                view_count=a.view_count,
+                unique_viewers=a.unique_viewers,
+                legacy_id=a.legacy_id,
+            )
+            for a in archives
+        ]
+        # bulk_create skips save() but auto_now(_add) still stamps the dates;
+        # bulk_update writes the originals back without touching them again.
+        Thread.objects.bulk_create(threads)
+        for thread, archive in zip(threads, archives):
+            thread.created_at, thread.updated_at = archive.created_at, archive.updated_at
+        Thread.objects.bulk_update(threads, ['created_at', 'updated_at'])
+
+        archived_replies = list(ArchivedReply.objects.filter(thread_id__in=ids))
+        replies = [
+            Reply(
+                id=r.id,
+                thread_id=r.thread_id,
+                author_id=r.author_id,
+                content=r.content,
+                content_html=r.content_html,
+                is_deleted=r.is_deleted,
+                deleted_at=r.deleted_at,
+            )
+            for r in archived_replies
+        ]
+        Reply.objects.bulk_create(replies, batch_size=1000)
+        for reply, archive in zip(replies, archived_replies):
+            reply.created_at, reply.updated_at = archive.created_at, archive.updated_at
+        Reply.objects.bulk_update(replies, ['created_at', 'updated_at'], batch_size=1000)
+
+        user_ids = {uid for a in archives for uid in a.upvoter_ids}
+        user_ids.update(uid for r in archived_replies for uid in r.upvoter_ids)
+        existing_users = set(User.objects.filter(pk__in=user_ids).values_list('pk', flat=True))
+        upvotes = [Upvote(user_id=uid, thread_id=a.id) for a in archives for uid in a.upvoter_ids]
+        upvotes += [Upvote(user_id=uid, reply_id=r.id) for r in archived_replies for uid in r.upvoter_ids]
+        Upvote.objects.bulk_create(
+            [u for u in upvotes if u.user_id in existing_users], batch_size=1000, ignore_conflicts=True
+        )
+
+        tags = {}
+        for name in {name for a in archives for name in a.tags}:
+            tags[name], _ = Tag.objects.get_or_create(name=name)
+        ThreadTag.objects.bulk_create(
+            [ThreadTag(thread_id=a.id, tag=tags[name]) for a in archives for name in a.tags],
+            ignore_conflicts=True,
+        )
+
+        ArchivedThread.objects.filter(pk__in=ids).delete()
+
+    for course_id in {a.course_id for a in archives}:
+        invalidate_course_hub(course_id)
+    invalidate_thread_summaries(ids)
+    for a in archives:
+        unlink_thread_snapshots(a.pk, a.category_id)
+    bump_search_generation()
+    return len(archives)
+
+
+def vacuum_hot_tables():
+    """Hand the space freed by archiving back to the live tables and their indexes"""
+    tables = [model._meta.db_table for model in (Thread, Reply, Upvote, ThreadTag)]
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            # VACUUM cannot run inside a transaction block; management
+            # commands run in autocommit, so each statement stands alone.
+            for table in tables:
+                cursor.execute(f'VACUUM (ANALYZE) {connection.ops.quote_name(table)}')
+        elif connection.vendor == 'sqlite':
+            cursor.execute('VACUUM')
+    return tables
+
+
+def search_archive(query, campus=''):
+    """Archived threads matching a search query, newest first"""
+    # Served by the trigram indexes of migration 0016 on PostgreSQL.
+    archived = ArchivedThread.objects.filter(
+        Q(title__icontains=query) |
+        Q(content__icontains=query) |
+        Q(tag_names__icontains=query)
+    )
+    archived = archived.filter(**campus_filter(campus))
+    return archived.order_by('-created_at')
+
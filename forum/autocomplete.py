@@ -0,0 +1,65 @@
+from hashlib import md5
+from django.conf import settings
+from django.core.cache import cache
+from .models import Course, Resource, Tag
+
+
+MAX_RESULTS = 20
+KEY = 'forum:autocomplete:{}:{}'
+
+
+def _cached(kind, term, limit, lookup):
+    """Run lookup() once per (kind, term, limit) per AUTOCOMPLETE_CACHE_SECONDS"""
+    key = KEY.format(kind, md5(f'{term}\x00{limit}'.encode()).hexdigest())
+    results = cache.get(key)
+    if results is None:
+        results = lookup()
+        cache.set(key, results, settings.AUTOCOMPLETE_CACHE_SECONDS)
+    return results
+
+
+def _limit(limit):
+    return max(1, min(limit or 10, MAX_RESULTS))
+
+
+def complete_courses(term, limit=10):
+    """Courses whose code starts with the term (codes are stored uppercase)"""
+    term = ' '.join(term.split()).upper()
+    limit = _limit(limit)
+    if not term:
+        return []
+    return _cached('course', term, limit, lambda: [
+        {'id': pk, 'label': f'{code} - {title}'}
+        for pk, code, title in Course.objects.filter(code__startswith=term)
+        .order_by('code').values_list('pk', 'code', 'title')[:limit]
+    ])
+
+
+def complete_resources(term, limit=10, course_id=None):
+    """Resources whose title contains the term, optionally within one course"""
+    term = ' '.join(term.split())
+    limit = _limit(limit)
+    if len(term) < 2:
+        return []
+
+    def lookup():
+        resources = Resource.objects.filter(title__icontains=term)
+        if course_id:
+            resources = resources.filter(course_id=course_id)
+        return [
+            {'id': pk, 'label': f'{title} ({resource_type})'}
+            for pk, title, resource_type in resources.order_by('title').values_list('pk', 'title', 'resource_type')[:limit]
+        ]
+    return _cached(f'resource:{course_id or ""}', term.lower(), limit, lookup)
+
+
+def complete_tags(term, limit=10):
+    """Tags whose name starts with the term (names are stored lowercase)"""
+    term = term.strip().lower()
+    limit = _limit(limit)
+    if not term:
+        return []
+    return _cached('tag', term, limit, lambda: [
+        {'id': pk, 'label': name}
+        for pk, name in Tag.objects.filter(name__startswith=term).order_by('name').values_list('pk', 'name')[:limit]
+    ])
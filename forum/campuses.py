@@ -0,0 +1,281 @@
+"""
+Campus scoping for Pilani, Goa and Hyderabad.
+
+Users, categories and threads carry a campus. Listings and search show the
+viewer's campus: the one they picked, else the one their email belongs to;
+an empty campus means all of them. Categories and threads with an empty
+campus are shared and show on every campus. A new thread takes its
+category's campus, else its author's.
+
+On PostgreSQL each campus can also keep its forum rows in a schema of its
+own (`<CAMPUS>_DB_SCHEMA`). prepare_schemas creates there a table for each
+PARTITIONED table that inherits the one in public, so queries on default
+still see every campus's rows. Reads, updates and deletes need no routing;
+links, "all campuses" listings and counts work as before. CampusRouter and
+CampusQuerySet send each new row to the alias of its own campus, whose
+search_path puts the campus schema first. Rows written inside a transaction
+on default stay there for atomicity; so do rows of shared threads. Moving a
+thread to another campus leaves its rows behind. place_rows moves such rows
+into the right schema, so `manage.py prepare_campus_schemas` has to run
+after migrate and then regularly.
+"""
+import re
+from collections import defaultdict
+from django.apps import apps
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connection, connections, models, transaction
+
+
+CAMPUS_CHOICES = [
+    ('pilani', 'Pilani'),
+    ('goa', 'Goa'),
+    ('hyderabad', 'Hyderabad'),
+]
+CAMPUSES = dict(CAMPUS_CHOICES)
+
+EMAIL_DOMAINS = {
+    'pilani.bits-pilani.ac.in': 'pilani',
+    'goa.bits-pilani.ac.in': 'goa',
+    'hyderabad.bits-pilani.ac.in': 'hyderabad',
+}
+
+SESSION_KEY = '_forum_campus'
+
+
+def campus_from_email(email):
+    """Campus of a BITS address, or '' for anything else"""
+    domain = (email or '').rsplit('@', 1)[-1].lower()
+    return EMAIL_DOMAINS.get(domain, '')
+
+
+def current_campus(request):
+    """
+    Campus the viewer is browsing, or '' for all campuses.
+
+    An explicit choice is kept in the session; otherwise the campus of the
+    user's profile is looked up once and remembered there too.
+    """
+    if hasattr(request, '_forum_campus'):
+        return request._forum_campus
+
+    session = getattr(request, 'session', None)
+    if session is not None and SESSION_KEY in session:
+        campus = session[SESSION_KEY]
+    else:
+        campus = ''
+        user = getattr(request, 'user', None)
+        if user is not None and user.is_authenticated:
+            from .models import UserProfile
+            campus = UserProfile.objects.filter(user=user).values_list('campus', flat=True).first() or ''
+            if session is not None:
+                session[SESSION_KEY] = campus
+    request._forum_campus = campus if campus in CAMPUSES else ''
+    return request._forum_campus
+
+
+def set_campus(request, campus):
+    campus = campus if campus in CAMPUSES else ''
+    request.session[SESSION_KEY] = campus
+    request._forum_campus = campus
+
+
+def campus_filter(campus, field='campus'):
+    """
+    Queryset filter kwargs for a campus: its rows and the shared ones (blank
+    campus); all campuses filter nothing
+    """
+    return {f'{field}__in': ['', campus]} if campus else {}
+
+
+def thread_campus(category, author_id):
+    """Campus a new thread belongs to: its category's, else its author's"""
+    if category.campus:
+        return category.campus
+    from .models import UserProfile
+    return UserProfile.objects.filter(user_id=author_id).values_list('campus', flat=True).first() or ''
+
+
+# Campus schemas
+
+# Forum tables whose rows live in their campus's schema, with the SQL for a
+# row's campus (r is the row). Everything else is shared.
+_THREAD_CAMPUS = '(SELECT t.campus FROM forum_thread t WHERE t.id = r.thread_id)'
+_VOTE_CAMPUS = (
+    '(SELECT t.campus FROM forum_thread t WHERE t.id = '
+    'COALESCE(r.thread_id, (SELECT p.thread_id FROM forum_reply p WHERE p.id = r.reply_id)))'
+)
+PARTITIONED = {
+    'thread': 'r.campus',
+    'reply': _THREAD_CAMPUS,
+    'upvote': _VOTE_CAMPUS,
+    'report': _VOTE_CAMPUS,
+    'threadtag': _THREAD_CAMPUS,
+    'relatedthread': _THREAD_CAMPUS,
+    'threadviewsketch': _THREAD_CAMPUS,
+    'replyarchive': _THREAD_CAMPUS,
+    'archivedthread': 'r.campus',
+    'archivedreply': '(SELECT t.campus FROM forum_archivedthread t WHERE t.id = r.thread_id)',
+}
+
+
+def campus_alias(campus):
+    """Database alias of a campus's schema, or None if it has none"""
+    return f'campus_{campus}' if campus in settings.CAMPUS_SCHEMAS else None
+
+
+def row_campus(obj, thread_campuses=None):
+    """Campus a forum row belongs to: its own, else its thread's"""
+    if hasattr(obj, 'campus'):
+        return obj.campus
+    if obj.thread_id is None:
+        # A vote or report on a reply, or a row not attached yet
+        return row_campus(obj.reply) if getattr(obj, 'reply_id', None) else ''
+    if thread_campuses is not None and obj.thread_id in thread_campuses:
+        return thread_campuses[obj.thread_id]
+    return obj.thread.campus
+
+
+def _routing():
+    # Inserts inside a transaction on default stay there, so it stays atomic.
+    return bool(settings.CAMPUS_SCHEMAS) and not connections[DEFAULT_DB_ALIAS].in_atomic_block
+
+
+def _partitioned(model):
+    return model._meta.app_label == 'forum' and model._meta.model_name in PARTITIONED
+
+
+class CampusRouter:
+    """
+    Send each new partitioned row to its campus's alias. Everything else,
+    reads included, uses default, whose tables take in every campus's.
+    """
+
+    def db_for_read(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        instance = hints.get('instance')
+        if (_partitioned(model) and isinstance(instance, model)
+                and instance._state.adding and _routing()):
+            return campus_alias(row_campus(instance)) or DEFAULT_DB_ALIAS
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Campus aliases are the same database.
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Campus schemas are built by prepare_schemas, not by migrations.
+        if db in {campus_alias(campus) for campus in settings.CAMPUS_SCHEMAS}:
+            return False
+        return None
+
+
+class CampusQuerySet(models.QuerySet):
+    """create() and bulk_create() place rows like CampusRouter does"""
+
+    def create(self, **kwargs):
+        if self._db not in (None, DEFAULT_DB_ALIAS):
+            return super().create(**kwargs)
+        obj = self.model(**kwargs)
+        # Without `using`, save() asks CampusRouter with the row as instance.
+        obj.save(force_insert=True)
+        return obj
+
+    def bulk_create(self, objs, *args, **kwargs):
+        objs = list(objs)
+        if self._db not in (None, DEFAULT_DB_ALIAS) or not objs or not _routing():
+            return super().bulk_create(objs, *args, **kwargs)
+        thread_campuses = None
+        if not hasattr(objs[0], 'campus'):
+            parent = self.model._meta.get_field('thread').related_model
+            thread_campuses = dict(parent.objects.filter(
+                pk__in={obj.thread_id for obj in objs if obj.thread_id is not None}
+            ).values_list('pk', 'campus'))
+        groups = defaultdict(list)
+        for obj in objs:
+            groups[campus_alias(row_campus(obj, thread_campuses)) or DEFAULT_DB_ALIAS].append(obj)
+        for alias, group in groups.items():
+            super(CampusQuerySet, self.using(alias)).bulk_create(group, *args, **kwargs)
+        return objs
+
+
+def _partitioned_models():
+    return [apps.get_model('forum', name) for name in PARTITIONED]
+
+
+def prepare_schemas():
+    """
+    Create the campus schemas and their tables and indexes, then place_rows.
+    Safe to repeat; run it after migrations, which only touch public.
+    """
+    qn = connection.ops.quote_name
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT current_schema()')
+        public = cursor.fetchone()[0]
+        parents = [f'{public}.{model._meta.db_table}' for model in _partitioned_models()]
+        # A foreign key only sees its target's own rows, not its children.
+        cursor.execute(
+            "SELECT conrelid::regclass::text, conname FROM pg_constraint "
+            "WHERE contype = 'f' AND confrelid = ANY(%s::regclass[])",
+            [parents],
+        )
+        for table, name in cursor.fetchall():
+            cursor.execute(f'ALTER TABLE {table} DROP CONSTRAINT {qn(name)}')
+
+        for schema in settings.CAMPUS_SCHEMAS.values():
+            cursor.execute(f'CREATE SCHEMA IF NOT EXISTS {qn(schema)}')
+            for model, parent in zip(_partitioned_models(), parents):
+                table = f'{qn(schema)}.{qn(model._meta.db_table)}'
+                cursor.execute(f'CREATE TABLE IF NOT EXISTS {table} () INHERITS ({parent})')
+                pk = model._meta.pk
+                if isinstance(pk, models.AutoField):
+                    # Identity is not inherited; ids come from the parent's sequence.
+                    cursor.execute('SELECT pg_get_serial_sequence(%s, %s)', [parent, pk.column])
+                    sequence = cursor.fetchone()[0]
+                    cursor.execute(
+                        f'ALTER TABLE {table} ALTER COLUMN {qn(pk.column)} SET DEFAULT nextval(%s::regclass)',
+                        [sequence],
+                    )
+                # Nor are indexes, including the ones behind unique constraints.
+                cursor.execute(
+                    'SELECT pg_get_indexdef(indexrelid) FROM pg_index WHERE indrelid = %s::regclass', [parent]
+                )
+                for (definition,) in cursor.fetchall():
+                    cursor.execute(re.sub(
+                        r'^CREATE (UNIQUE )?INDEX (\S+) ON \S+',
+                        lambda m: f'CREATE {m[1] or ""}INDEX IF NOT EXISTS {m[2]} ON {table}',
+                        definition,
+                    ))
+    return place_rows()
+
+
+def place_rows():
+    """
+    Move partitioned rows that sit in the wrong table into their campus's
+    schema, or into public for shared threads and campuses without one.
+    Returns the number of rows moved.
+    """
+    qn = connection.ops.quote_name
+    moved = 0
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT current_schema()')
+        public = cursor.fetchone()[0]
+        targets = [(schema, 'r_campus = %s', [campus]) for campus, schema in settings.CAMPUS_SCHEMAS.items()]
+        targets.append((public, "COALESCE(r_campus, '') <> ALL(%s)", [list(settings.CAMPUS_SCHEMAS)]))
+        for model in _partitioned_models():
+            name = f'{qn(public)}.{qn(model._meta.db_table)}'
+            columns = ', '.join(qn(f.column) for f in model._meta.concrete_fields)
+            for schema, condition, params in targets:
+                table = f'{qn(schema)}.{qn(model._meta.db_table)}'
+                with transaction.atomic():
+                    # Duplicates of rows already in place (say a second
+                    # vote from a race) are dropped.
+                    cursor.execute(
+                        f'WITH moved AS (DELETE FROM {name} r WHERE r.tableoid <> %s::regclass AND '
+                        f'{condition.replace("r_campus", PARTITIONED[model._meta.model_name])} RETURNING r.*) '
+                        f'INSERT INTO {table} ({columns}) SELECT {columns} FROM moved ON CONFLICT DO NOTHING',
+                        [table, *params],
+                    )
+                    moved += cursor.rowcount
+    return moved
@@ -0,0 +1,18 @@
+from functools import partial
+from .roles import is_moderator
+from .campuses import CAMPUS_CHOICES, current_campus
+
+
+def roles(request):
+    """Expose the viewer's moderator flag to templates, resolved lazily"""
+    return {
+        'is_moderator': partial(is_moderator, request),
+    }
+
+
+def campus(request):
+    """The campus being browsed and the ones to switch to"""
+    return {
+        'current_campus': partial(current_campus, request),
+        'campus_choices': CAMPUS_CHOICES,
+    }
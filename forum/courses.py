@@ -0,0 +1,64 @@
+from urllib.parse import quote
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Q, Prefetch
+from .models import Course, Resource, Thread
+
+
+HUB_KEY = 'forum:course-hub:{}'
+HUB_SIZE = 10
+
+
+def hub_key(code):
+    # Course codes contain spaces ("CS F111"), which memcached keys may not.
+    return HUB_KEY.format(quote(code))
+
+
+def _hub_threads():
+    return Thread.objects.filter(is_deleted=False).select_related('author', 'category').defer(
+        'content', 'content_html', 'excerpt',
+    ).annotate(
+        reply_count=Count('replies', filter=Q(replies__is_deleted=False), distinct=True),
+        upvote_count=Count('upvotes', distinct=True),
+    )
+
+
+def load_course_hub(code):
+    """
+    A course with everything its hub page shows, in five queries: the course,
+    its resources, and its recent, top and unanswered threads (sliced per
+    course in the database).
+    """
+    threads = _hub_threads()
+    return Course.objects.prefetch_related(
+        Prefetch('resources', queryset=Resource.objects.order_by('resource_type', 'title'), to_attr='resource_list'),
+        Prefetch('threads', queryset=threads.order_by('-created_at')[:HUB_SIZE], to_attr='recent_threads'),
+        Prefetch(
+            'threads',
+            queryset=threads.filter(upvote_count__gt=0).order_by('-upvote_count', '-created_at')[:HUB_SIZE],
+            to_attr='top_threads',
+        ),
+        Prefetch(
+            'threads',
+            queryset=threads.filter(reply_count=0, is_locked=False).order_by('-created_at')[:HUB_SIZE],
+            to_attr='unanswered_threads',
+        ),
+    ).get(code=code)
+
+
+def get_course_hub(code):
+    """The course hub, from the cache when possible; raises Course.DoesNotExist"""
+    key = hub_key(code)
+    course = cache.get(key)
+    if course is None:
+        course = load_course_hub(code)
+        cache.set(key, course, settings.COURSE_HUB_CACHE_SECONDS)
+    return course
+
+
+def invalidate_course_hub(course_id):
+    if not course_id:
+        return
+    code = Course.objects.filter(pk=course_id).values_list('code', flat=True).first()
+    if code:
+        cache.delete(hub_key(code))
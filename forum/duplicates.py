@@ -0,0 +1,285 @@
+"""
+Near-duplicate question detection for thread_create.
+
+Each thread is reduced to a MinHash signature over word shingles of its
+title and the start of its content, and indexed with LSH banding. The bulk
+of the index lives in sorted NumPy arrays (band key -> thread id, thread id
+-> signature) so hundreds of thousands of threads fit in a few tens of MB and
+a lookup is a handful of binary searches. Threads saved since the arrays
+were built sit in a small dict overlay that is folded in on compaction.
+
+The index is loaded once per process, kept current from Thread post_save,
+re-synced from the database every DUPLICATE_INDEX_REFRESH_SECONDS for saves
+made by other workers, and snapshotted to DUPLICATE_INDEX_PATH.
+"""
+import logging
+import os
+import tempfile
+import threading
+import time
+import zlib
+from datetime import datetime, timezone as dt_timezone
+
+import numpy as np
+from django.conf import settings
+from django.utils import timezone
+from .models import Thread
+from .utils import tokenize
+
+
+logger = logging.getLogger(__name__)
+
+NUM_PERM = 32
+BANDS = 8
+ROWS = NUM_PERM // BANDS
+SHINGLE_SIZE = 2
+CONTENT_WORDS = 150
+# Estimated Jaccard similarity a candidate needs to be suggested.
+THRESHOLD = 0.4
+# Overlay size at which the overlay is merged into the sorted arrays.
+COMPACT_AFTER = 5000
+
+_PRIME = np.uint64(4294967311)  # smallest prime above 2**32
+_rng = np.random.RandomState(20240601)
+_A = _rng.randint(1, 2 ** 31 - 1, size=NUM_PERM).astype(np.uint64)
+_B = _rng.randint(0, 2 ** 31 - 1, size=NUM_PERM).astype(np.uint64)
+_BAND_MIX = _rng.randint(1, 2 ** 31 - 1, size=ROWS).astype(np.uint64)
+
+
+def shingles(title, content):
+    words = tokenize(title) + tokenize(content)[:CONTENT_WORDS]
+    if len(words) < SHINGLE_SIZE:
+        return set(words)
+    return {' '.join(words[i:i + SHINGLE_SIZE]) for i in range(len(words) - SHINGLE_SIZE + 1)}
+
+
+def signature(title, content):
+    """MinHash signature (NUM_PERM uint32 values), or None for empty text"""
+    grams = shingles(title, content)
+    if not grams:
+        return None
+    hashes = np.fromiter((zlib.crc32(g.encode()) for g in grams), dtype=np.uint64, count=len(grams))
+    permuted = (np.outer(hashes, _A) + _B) % _PRIME
+    return permuted.min(axis=0).astype(np.uint32)
+
+
+def band_keys(sigs):
+    """
+    One 64-bit key per LSH band, with the band number folded into the key.
+    Takes a single signature or a 2-D array of them.
+    """
+    bands = sigs.astype(np.uint64).reshape(sigs.shape[:-1] + (BANDS, ROWS))
+    with np.errstate(over='ignore'):
+        keys = (bands * _BAND_MIX).sum(axis=-1) * np.uint64(BANDS) + np.arange(BANDS, dtype=np.uint64)
+    return keys
+
+
+class DuplicateIndex:
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.keys = np.empty(0, dtype=np.uint64)
+        self.key_ids = np.empty(0, dtype=np.int64)
+        self.sig_ids = np.empty(0, dtype=np.int64)
+        self.sigs = np.empty((0, NUM_PERM), dtype=np.uint32)
+        self.overlay = {}
+        self.overlay_buckets = {}
+        self.removed = set()
+        self.synced_at = None
+        self.checked_at = 0.0
+
+    def __len__(self):
+        return len(self.sig_ids) + len(self.overlay)
+
+    # Building and persistence
+
+    @classmethod
+    def build(cls, chunk_size=2000):
+        index = cls()
+        started = timezone.now()
+        threads = Thread.objects.filter(is_deleted=False).values_list('pk', 'title', 'content')
+        for pk, title, content in threads.iterator(chunk_size=chunk_size):
+            sig = signature(title, content)
+            if sig is not None:
+                # Straight into the overlay; compact() builds the arrays once.
+                index.overlay[pk] = sig
+        index.compact()
+        index.synced_at = started
+        return index
+
+    def compact(self):
+        """Merge the overlay into the sorted arrays"""
+        with self.lock:
+            if not self.overlay and not self.removed:
+                return
+            keep = ~np.isin(self.sig_ids, list(self.overlay) + list(self.removed))
+            ids = np.concatenate([self.sig_ids[keep], np.fromiter(self.overlay, dtype=np.int64, count=len(self.overlay))])
+            sigs = np.vstack([self.sigs[keep]] + [s[None, :] for s in self.overlay.values()]) if len(ids) else self.sigs[:0]
+            order = np.argsort(ids)
+            self.sig_ids, self.sigs = ids[order], sigs[order]
+
+            if len(self.sig_ids):
+                all_keys = band_keys(self.sigs).ravel()
+                all_ids = np.repeat(self.sig_ids, BANDS)
+                order = np.argsort(all_keys, kind='stable')
+                self.keys, self.key_ids = all_keys[order], all_ids[order]
+            else:
+                self.keys = np.empty(0, dtype=np.uint64)
+                self.key_ids = np.empty(0, dtype=np.int64)
+            self.overlay = {}
+            self.overlay_buckets = {}
+            self.removed = set()
+
+    def save(self, path=None):
+        """Write a snapshot atomically (write to a temp file, then rename)"""
+        path = path or settings.DUPLICATE_INDEX_PATH
+        self.compact()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.npz')
+        with os.fdopen(fd, 'wb') as f:
+            np.savez(
+                f, keys=self.keys, key_ids=self.key_ids, sig_ids=self.sig_ids, sigs=self.sigs,
+                synced_at=np.array([self.synced_at.timestamp() if self.synced_at else 0.0]),
+            )
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path=None):
+        path = path or settings.DUPLICATE_INDEX_PATH
+        index = cls()
+        with np.load(path) as data:
+            index.keys = data['keys']
+            index.key_ids = data['key_ids']
+            index.sig_ids = data['sig_ids']
+            index.sigs = data['sigs']
+            synced = float(data['synced_at'][0])
+        index.synced_at = datetime.fromtimestamp(synced, tz=dt_timezone.utc) if synced else None
+        return index
+
+    # Updates
+
+    def _drop_from_overlay(self, thread_id):
+        sig = self.overlay.pop(thread_id, None)
+        if sig is not None:
+            for key in band_keys(sig).tolist():
+                bucket = self.overlay_buckets.get(key)
+                if bucket:
+                    bucket.discard(thread_id)
+
+    def add(self, thread_id, title, content):
+        sig = signature(title, content)
+        with self.lock:
+            self._drop_from_overlay(thread_id)
+            self.removed.discard(thread_id)
+            if sig is None:
+                self.removed.add(thread_id)
+                return
+            self.overlay[thread_id] = sig
+            for key in band_keys(sig).tolist():
+                self.overlay_buckets.setdefault(key, set()).add(thread_id)
+            if len(self.overlay) >= COMPACT_AFTER:
+                self.compact()
+
+    def remove(self, thread_id):
+        with self.lock:
+            self._drop_from_overlay(thread_id)
+            self.removed.add(thread_id)
+
+    def sync(self):
+        """Pick up threads saved by other processes since the last sync"""
+        started = timezone.now()
+        changed = Thread.objects.order_by().values_list('pk', 'title', 'content', 'is_deleted')
+        if self.synced_at:
+            changed = changed.filter(updated_at__gte=self.synced_at)
+        for pk, title, content, is_deleted in changed.iterator(chunk_size=2000):
+            if is_deleted:
+                self.remove(pk)
+            else:
+                self.add(pk, title, content)
+        self.synced_at = started
+        self.checked_at = time.monotonic()
+
+    # Lookups
+
+    def _signature_of(self, thread_id):
+        sig = self.overlay.get(thread_id)
+        if sig is not None:
+            return sig
+        pos = np.searchsorted(self.sig_ids, thread_id)
+        if pos < len(self.sig_ids) and self.sig_ids[pos] == thread_id:
+            return self.sigs[pos]
+        return None
+
+    def query(self, title, content, limit=5, threshold=THRESHOLD, exclude=None):
+        """[(thread_id, estimated_similarity)] for likely duplicates, best first"""
+        sig = signature(title, content)
+        if sig is None:
+            return []
+        keys = band_keys(sig)
+        with self.lock:
+            candidates = set()
+            left = np.searchsorted(self.keys, keys, side='left')
+            right = np.searchsorted(self.keys, keys, side='right')
+            for lo, hi in zip(left, right):
+                candidates.update(self.key_ids[lo:hi].tolist())
+            for key in keys.tolist():
+                candidates.update(self.overlay_buckets.get(key, ()))
+            candidates -= self.removed
+            candidates.discard(exclude)
+
+            results = []
+            for thread_id in candidates:
+                other = self._signature_of(thread_id)
+                if other is None:
+                    continue
+                similarity = float(np.mean(other == sig))
+                if similarity >= threshold:
+                    results.append((thread_id, similarity))
+        results.sort(key=lambda r: -r[1])
+        return results[:limit]
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_index():
+    """The process-wide index, loaded from the snapshot (or built) on first use"""
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                try:
+                    index = DuplicateIndex.load()
+                except (FileNotFoundError, OSError, ValueError, KeyError):
+                    index = DuplicateIndex.build()
+                index.sync()
+                _index = index
+    elif time.monotonic() - _index.checked_at > settings.DUPLICATE_INDEX_REFRESH_SECONDS:
+        _index.sync()
+    return _index
+
+
+def loaded_index():
+    """The index if this process has loaded it already, without loading it"""
+    return _index
+
+
+def warm_index():
+    """Load the index at worker start so the first lookup is not slow"""
+    try:
+        get_index()
+    except Exception:
+        logger.exception('Could not load the duplicate question index')
+
+
+def find_duplicates(title, content, limit=5, exclude=None):
+    """Live threads that look like near-duplicates of the given text"""
+    matches = get_index().query(title, content, limit=limit, exclude=exclude)
+    if not matches:
+        return []
+    threads = Thread.objects.filter(pk__in=[m[0] for m in matches], is_deleted=False).only('pk', 'title')
+    titles = {t.pk: t.title for t in threads}
+    return [
+        {'id': pk, 'title': titles[pk], 'similarity': round(score, 2)}
+        for pk, score in matches if pk in titles
+    ]
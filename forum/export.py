@@ -0,0 +1,157 @@
+import csv
+import io
+import json
+import zlib
+from django.db.models import Count
+from .models import Thread, Reply, ThreadTag
+
+
+CSV_COLUMNS = [
+    'record_type', 'thread_id', 'reply_id', 'category', 'course', 'title',
+    'author', 'content', 'tags', 'upvotes', 'created_at',
+]
+
+# Serialized bytes collected before a chunk is handed to the response (and
+# to the compressor), so neither sees one tiny write per record.
+FLUSH_BYTES = 64 * 1024
+
+
+def export_threads(course=None, category=None):
+    """Live threads to export, scoped to a course and/or a category"""
+    threads = Thread.objects.filter(is_deleted=False)
+    if course is not None:
+        threads = threads.filter(course=course)
+    if category is not None:
+        threads = threads.filter(category=category)
+    return threads
+
+
+def _grouped_by_thread(rows, key='thread_id'):
+    """Yield (thread_id, [rows]) from rows already ordered by thread_id"""
+    current, group = None, []
+    for row in rows:
+        if row[key] != current:
+            if group:
+                yield current, group
+            current, group = row[key], []
+        group.append(row)
+    if group:
+        yield current, group
+
+
+def _follow(grouped):
+    """Callable returning the group for a thread id from an ordered group stream"""
+    pending = [next(grouped, None)]
+
+    def take(thread_id):
+        while pending[0] is not None and pending[0][0] < thread_id:
+            pending[0] = next(grouped, None)
+        if pending[0] is not None and pending[0][0] == thread_id:
+            group = pending[0][1]
+            pending[0] = next(grouped, None)
+            return group
+        return []
+    return take
+
+
+def iter_thread_records(threads, chunk_size=2000):
+    """
+    Yield one dict per thread with its tags, vote count and replies.
+
+    Threads, replies and tags are read by three ordered iterator() queries
+    (server-side cursors on PostgreSQL) and merged on thread id, so memory
+    stays bounded by the largest single thread rather than the export.
+    """
+    thread_rows = threads.order_by('pk').annotate(upvote_count=Count('upvotes')).values(
+        'pk', 'title', 'content', 'created_at', 'is_locked',
+        'author__username', 'category__slug', 'course__code', 'upvote_count',
+    ).iterator(chunk_size=chunk_size)
+    reply_rows = Reply.objects.filter(
+        thread__in=threads.values('pk'), is_deleted=False
+    ).order_by('thread_id', 'pk').annotate(upvote_count=Count('upvotes')).values(
+        'pk', 'thread_id', 'content', 'created_at', 'author__username', 'upvote_count',
+    ).iterator(chunk_size=chunk_size)
+    tag_rows = ThreadTag.objects.filter(
+        thread__in=threads.values('pk')
+    ).order_by('thread_id', 'tag__name').values('thread_id', 'tag__name').iterator(chunk_size=chunk_size)
+
+    replies_for = _follow(_grouped_by_thread(reply_rows))
+    tags_for = _follow(_grouped_by_thread(tag_rows))
+
+    for row in thread_rows:
+        yield {
+            'id': row['pk'],
+            'title': row['title'],
+            'content': row['content'],
+            'author': row['author__username'],
+            'category': row['category__slug'],
+            'course': row['course__code'],
+            'is_locked': row['is_locked'],
+            'upvotes': row['upvote_count'],
+            'created_at': row['created_at'].isoformat(),
+            'tags': [t['tag__name'] for t in tags_for(row['pk'])],
+            'replies': [
+                {
+                    'id': r['pk'],
+                    'author': r['author__username'],
+                    'content': r['content'],
+                    'upvotes': r['upvote_count'],
+                    'created_at': r['created_at'].isoformat(),
+                }
+                for r in replies_for(row['pk'])
+            ],
+        }
+
+
+def jsonl_lines(records):
+    for record in records:
+        yield json.dumps(record, ensure_ascii=False) + '\n'
+
+
+def csv_lines(records):
+    """One CSV row per thread followed by one per reply"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    def emit(values):
+        writer.writerow(values)
+        line = buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+        return line
+
+    yield emit(CSV_COLUMNS)
+    for t in records:
+        yield emit([
+            'thread', t['id'], '', t['category'], t['course'] or '', t['title'],
+            t['author'], t['content'], ' '.join(t['tags']), t['upvotes'], t['created_at'],
+        ])
+        for r in t['replies']:
+            yield emit([
+                'reply', t['id'], r['id'], t['category'], t['course'] or '', '',
+                r['author'], r['content'], '', r['upvotes'], r['created_at'],
+            ])
+
+
+def stream_export(threads, fmt='jsonl', compress=False, chunk_size=2000):
+    """Yield the export as byte chunks, optionally gzip-compressed on the fly"""
+    lines = (csv_lines if fmt == 'csv' else jsonl_lines)(iter_thread_records(threads, chunk_size))
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31) if compress else None
+
+    pending, size = [], 0
+    for line in lines:
+        data = line.encode('utf-8')
+        pending.append(data)
+        size += len(data)
+        if size >= FLUSH_BYTES:
+            chunk = b''.join(pending)
+            pending, size = [], 0
+            chunk = compressor.compress(chunk) if compressor else chunk
+            if chunk:
+                yield chunk
+
+    chunk = b''.join(pending)
+    if compressor:
+        chunk = compressor.compress(chunk) + compressor.flush()
+    if chunk:
+        yield chunk
@@ -1,7 +1,43 @@
 from django import forms
+from django.urls import reverse_lazy
+from django.utils.html import format_html
 from .models import Thread, Reply, Report, Category, Course, Resource
 
 
+class AutocompleteWidget(forms.Widget):
+    """
+    Hidden pk input plus a typeahead text box fed by a JSON endpoint, so the
+    page never lists every choice. Only the selected object's label is loaded.
+    """
+
+    def __init__(self, url, label=str, forward=None, attrs=None):
+        super().__init__(attrs)
+        self.url = url
+        self.label = label
+        # Query parameter -> id of another input whose value is sent along
+        self.forward = forward or {}
+        self.model = None
+
+    def render(self, name, value, attrs=None, renderer=None):
+        attrs = self.build_attrs(self.attrs, attrs)
+        label = ''
+        if value not in (None, '') and self.model is not None:
+            obj = self.model.objects.filter(pk=value).first()
+            label = self.label(obj) if obj else ''
+        return format_html(
+            '<input type="hidden" name="{}" id="{}" value="{}">'
+            '<input type="text" class="{}" autocomplete="off" value="{}" placeholder="{}"'
+            ' data-autocomplete-url="{}" data-autocomplete-target="{}" data-autocomplete-forward="{}">',
+            name, attrs.get('id', f'id_{name}'), '' if value is None else value,
+            attrs.get('class', 'form-control'), label, attrs.get('placeholder', ''),
+            self.url, attrs.get('id', f'id_{name}'),
+            ','.join(f'{param}:{field_id}' for param, field_id in self.forward.items()),
+        )
+
+    def value_from_datadict(self, data, files, name):
+        return data.get(name) or None
+
+
 class ThreadForm(forms.ModelForm):
     class Meta:
         model = Thread
@@ -19,22 +55,28 @@ class ThreadForm(forms.ModelForm):
             'category': forms.Select(attrs={
                 'class': 'form-control'
             }),
-            'course': forms.Select(attrs={
-                'class': 'form-control'
-            }),
-            'resource': forms.Select(attrs={
-                'class': 'form-control'
-            }),
+            'course': AutocompleteWidget(
+                reverse_lazy('forum:autocomplete_courses'),
+                label=lambda c: f'{c.code} - {c.title}',
+                attrs={'class': 'form-control', 'placeholder': 'Start typing a course code (optional)'},
+            ),
+            'resource': AutocompleteWidget(
+                reverse_lazy('forum:autocomplete_resources'),
+                forward={'course': 'id_course'},
+                attrs={'class': 'form-control', 'placeholder': 'Search resources by title (optional)'},
+            ),
         }
     
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
+        # The querysets are never evaluated in full: validation looks up just
+        # the submitted pk, and the widgets only load the selected object.
         self.fields['course'].required = False
         self.fields['course'].queryset = Course.objects.all()
-        self.fields['course'].empty_label = 'Select a course (optional)'
+        self.fields['course'].widget.model = Course
         self.fields['resource'].required = False
         self.fields['resource'].queryset = Resource.objects.all()
-        self.fields['resource'].empty_label = 'Select a resource (optional)'
+        self.fields['resource'].widget.model = Resource
 
 
 class ReplyForm(forms.ModelForm):
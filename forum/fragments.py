@@ -0,0 +1,94 @@
+"""
+Cached HTML fragments for the reply list on thread_detail.
+
+Each reply's body (content and author link) and action buttons are rendered
+once per (reply, updated_at, author version, viewer role) and kept in the
+cache; the author version is bumped when the author's name may have changed
+(signals). Upvote counts
+and the viewer's own upvotes change far more often, so they stay out of the
+fragments and are filled in live by the page template.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+from .models import Reply, Upvote
+from .roles import is_moderator
+
+
+KEY = 'forum:reply-fragment:{}:{}:{}:{}'
+AUTHOR_VERSION_KEY = 'forum:reply-author-version:{}'
+
+# Columns the reply list needs when every fragment is a cache hit.
+LIST_FIELDS = ['id', 'thread_id', 'author_id', 'created_at', 'updated_at']
+
+
+def role_class(request, reply):
+    """Which variant of a reply's action buttons this viewer sees"""
+    user = request.user
+    if not user.is_authenticated:
+        return 'anonymous'
+    if is_moderator(request):
+        return 'moderator'
+    if reply.author_id == user.pk:
+        return 'author'
+    return 'other'
+
+
+def fragment_key(reply, author_version, role):
+    return KEY.format(reply.pk, int(reply.updated_at.timestamp() * 1000000), author_version, role)
+
+
+def invalidate_author(user_id):
+    """Re-render the fragments of every reply by this user"""
+    key = AUTHOR_VERSION_KEY.format(user_id)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, 1, None)
+
+
+def attach_reply_fragments(request, replies):
+    """
+    Set reply.fragment (body and actions HTML) and reply.user_upvoted on a
+    page of replies loaded with only LIST_FIELDS. Two cache.get_many calls
+    (author versions, then fragments) cover the page; replies that miss are
+    loaded in full and rendered once.
+    """
+    replies = list(replies)
+    if not replies:
+        return replies
+
+    versions = cache.get_many([AUTHOR_VERSION_KEY.format(reply.author_id) for reply in replies])
+    keys = {
+        reply.pk: fragment_key(
+            reply, versions.get(AUTHOR_VERSION_KEY.format(reply.author_id), 0), role_class(request, reply)
+        )
+        for reply in replies
+    }
+    cached = cache.get_many(list(keys.values()))
+
+    missing = [reply.pk for reply in replies if keys[reply.pk] not in cached]
+    if missing:
+        rendered = {}
+        for reply in Reply.objects.filter(pk__in=missing).select_related('author'):
+            role = role_class(request, reply)
+            context = {'reply': reply, 'role': role}
+            rendered[keys[reply.pk]] = {
+                'body': render_to_string('forum/reply_body.html', context),
+                'actions': render_to_string('forum/reply_actions.html', context),
+            }
+        cache.set_many(rendered, settings.REPLY_FRAGMENT_CACHE_SECONDS)
+        cached.update(rendered)
+
+    upvoted = set()
+    if request.user.is_authenticated:
+        upvoted = set(Upvote.objects.filter(
+            user=request.user, reply_id__in=[reply.pk for reply in replies]
+        ).values_list('reply_id', flat=True))
+
+    for reply in replies:
+        fragment = cached.get(keys[reply.pk], {'body': '', 'actions': ''})
+        reply.fragment = {part: mark_safe(html) for part, html in fragment.items()}
+        reply.user_upvoted = reply.pk in upvoted
+    return replies
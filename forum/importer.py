@@ -0,0 +1,383 @@
+"""
+Bulk import of the course catalogue and of threads from the old forum.
+
+Records are read as a stream from CSV or JSONL (optionally gzipped) and
+written in batches: courses and resources are upserted with
+bulk_create(update_conflicts=True), threads and replies are bulk-inserted
+with their markdown rendered in a process pool. Each batch commits on its
+own and the number of records done is written to a checkpoint file, so an
+interrupted import can be resumed; threads already imported are recognised
+by legacy_id and skipped, which makes replaying a batch harmless.
+"""
+import csv
+import gzip
+import io
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+import django
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.utils.dateparse import parse_datetime
+from django.utils.text import slugify
+from .models import UserProfile, Course, Resource, Category, Tag, Thread, ThreadTag, Reply, ArchivedThread
+from .stats import rebuild_user_stats
+from .search import bump_generation as bump_search_generation
+from .courses import invalidate_course_hub
+from .summaries import invalidate_thread_summaries
+from .snapshots import unlink_thread as unlink_thread_snapshots
+from .utils import render_markdown, make_excerpt
+
+
+KINDS = ['courses', 'resources', 'threads']
+
+
+# Reading
+
+def open_input(path):
+    if path.endswith('.gz'):
+        return io.TextIOWrapper(gzip.open(path, 'rb'), encoding='utf-8', newline='')
+    return open(path, encoding='utf-8', newline='')
+
+
+def _is_csv(path):
+    return path.removesuffix('.gz').endswith('.csv')
+
+
+def read_records(path):
+    """Yield one dict per record; CSV reply rows are folded into their thread"""
+    with open_input(path) as f:
+        if not _is_csv(path):
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+            return
+
+        thread = None
+        for row in csv.DictReader(f):
+            kind = row.get('record_type') or 'thread'
+            if kind == 'reply':
+                if thread is not None:
+                    thread.setdefault('replies', []).append(row)
+                continue
+            if thread is not None:
+                yield thread
+            thread = row
+        if thread is not None:
+            yield thread
+
+
+def _batches(iterable, size):
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+# Checkpoints
+
+def checkpoint_path(path):
+    return f'{path}.checkpoint'
+
+
+def read_checkpoint(path):
+    try:
+        with open(checkpoint_path(path)) as f:
+            return int(f.read().strip() or 0)
+    except FileNotFoundError:
+        return 0
+
+
+def write_checkpoint(path, done):
+    tmp = checkpoint_path(path) + '.tmp'
+    with open(tmp, 'w') as f:
+        f.write(str(done))
+    os.replace(tmp, checkpoint_path(path))
+
+
+# Markdown rendering
+
+def _init_worker():
+    # Workers started with spawn (macOS, Windows) import Django from scratch.
+    try:
+        django.setup()
+    except Exception:
+        pass
+
+
+def _render(text):
+    return str(render_markdown(text)) if text else ''
+
+
+class MarkdownRenderer:
+    """Renders markdown in a process pool, or inline when workers=0"""
+
+    def __init__(self, workers=None):
+        self.pool = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) if workers != 0 else None
+
+    def render(self, texts):
+        if self.pool is None:
+            return [_render(t) for t in texts]
+        return list(self.pool.map(_render, texts, chunksize=64))
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.shutdown()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+# Lookups shared by the batch writers
+
+def _clean(value):
+    return (value or '').strip()
+
+
+def _tag_names(value):
+    if isinstance(value, list):
+        names = value
+    else:
+        names = _clean(value).replace(',', ' ').split()
+    return [n.strip().lower() for n in names if n and n.strip()]
+
+
+def _parse_time(value):
+    return parse_datetime(value) if value else None
+
+
+def ensure_users(usernames):
+    """Map usernames to ids, creating inactive accounts for unknown authors"""
+    usernames = {u for u in usernames if u}
+    existing = dict(User.objects.filter(username__in=usernames).values_list('username', 'pk'))
+    missing = usernames - existing.keys()
+    if missing:
+        users = []
+        for name in missing:
+            user = User(username=name, is_active=False)
+            user.set_unusable_password()
+            users.append(user)
+        User.objects.bulk_create(users, ignore_conflicts=True)
+        created = dict(User.objects.filter(username__in=missing).values_list('username', 'pk'))
+        # bulk_create skips the post_save signal that creates profiles.
+        UserProfile.objects.bulk_create(
+            [UserProfile(user_id=pk) for pk in created.values()], ignore_conflicts=True
+        )
+        existing.update(created)
+    return existing
+
+
+def ensure_categories(names):
+    """Map category slugs or names to ids, creating the missing ones"""
+    names = {n for n in names if n}
+    by_slug = {slugify(n): n for n in names}
+    Category.objects.bulk_create(
+        [Category(name=name, slug=slug) for slug, name in by_slug.items()], ignore_conflicts=True
+    )
+    ids = dict(Category.objects.filter(slug__in=by_slug).values_list('slug', 'pk'))
+    return {name: ids.get(slugify(name)) for name in names}
+
+
+def ensure_tags(names):
+    """Map tag names to ids, creating the missing ones"""
+    names = set(names)
+    if not names:
+        return {}
+    Tag.objects.bulk_create([Tag(name=n, slug=slugify(n)) for n in names], ignore_conflicts=True)
+    ids = dict(Tag.objects.filter(name__in=names).values_list('name', 'pk'))
+    # A new name whose slug belongs to another tag was not inserted; use that tag.
+    unresolved = {slugify(n): n for n in names - ids.keys()}
+    for slug, pk in Tag.objects.filter(slug__in=unresolved).values_list('slug', 'pk'):
+        ids[unresolved[slug]] = pk
+    return ids
+
+
+def course_ids(codes):
+    codes = {c for c in codes if c}
+    return dict(Course.objects.filter(code__in=codes).values_list('code', 'pk'))
+
+
+# Batch writers
+
+def import_courses(records, **kwargs):
+    courses = {}
+    for r in records:
+        code = _clean(r.get('code'))
+        if code:
+            courses[code] = Course(code=code, title=_clean(r.get('title')), department=_clean(r.get('department')))
+    Course.objects.bulk_create(
+        list(courses.values()),
+        update_conflicts=True, unique_fields=['code'], update_fields=['title', 'department'],
+    )
+    return len(courses)
+
+
+def import_resources(records, **kwargs):
+    courses = course_ids(_clean(r.get('course')) for r in records)
+    resources = {}
+    for r in records:
+        link = _clean(r.get('link'))
+        if link:
+            resources[link] = Resource(
+                title=_clean(r.get('title')),
+                resource_type=_clean(r.get('resource_type') or r.get('type')) or 'Link',
+                link=link,
+                course_id=courses.get(_clean(r.get('course'))),
+            )
+    Resource.objects.bulk_create(
+        list(resources.values()),
+        update_conflicts=True, unique_fields=['link'], update_fields=['title', 'resource_type', 'course'],
+    )
+    return len(resources)
+
+
+def refresh_cached_pages(threads):
+    """Drop the cached pages that list newly imported threads"""
+    invalidate_thread_summaries([t.pk for t in threads])
+    for course_id in {t.course_id for t in threads}:
+        invalidate_course_hub(course_id)
+    for t in threads:
+        unlink_thread_snapshots(t.pk, t.category_id)
+    bump_search_generation()
+
+
+def import_threads(records, renderer, **kwargs):
+    """Insert a batch of threads with their tags and replies; returns threads inserted"""
+    records = [r for r in records if _clean(r.get('title'))]
+    for r in records:
+        r['legacy_id'] = _clean(str(r.get('legacy_id') or r.get('id') or r.get('thread_id') or '')) or None
+    legacy_ids = [r['legacy_id'] for r in records if r['legacy_id']]
+    seen = set(Thread.objects.filter(legacy_id__in=legacy_ids).values_list('legacy_id', flat=True))
+    # Threads archived since an earlier run count as imported too.
+    seen.update(ArchivedThread.objects.filter(legacy_id__in=legacy_ids).values_list('legacy_id', flat=True))
+    fresh = []
+    for r in records:
+        if r['legacy_id'] is None or r['legacy_id'] not in seen:
+            fresh.append(r)
+            seen.add(r['legacy_id'])
+    if not fresh:
+        return 0
+
+    replies = [(r, reply) for r in fresh for reply in r.get('replies') or [] if _clean(reply.get('content'))]
+    users = ensure_users(
+        [_clean(r.get('author')) for r in fresh] + [_clean(reply.get('author')) for _, reply in replies]
+    )
+    categories = ensure_categories(_clean(r.get('category')) or 'General' for r in fresh)
+    courses = course_ids(_clean(r.get('course')) for r in fresh)
+    resources = dict(Resource.objects.filter(
+        link__in=[_clean(r.get('resource')) for r in fresh if _clean(r.get('resource'))]
+    ).values_list('link', 'pk'))
+    tags = ensure_tags(name for r in fresh for name in _tag_names(r.get('tags')))
+
+    html = renderer.render([r.get('content') or '' for r in fresh] + [reply['content'] for _, reply in replies])
+    # A thread's campus is its category's, else its author's (campuses.thread_campus).
+    category_campuses = dict(Category.objects.filter(pk__in=categories.values()).values_list('pk', 'campus'))
+    author_campuses = dict(UserProfile.objects.filter(user_id__in=users.values()).values_list('user_id', 'campus'))
+
+    threads = []
+    for r, content_html in zip(fresh, html):
+        author_id = users.get(_clean(r.get('author')))
+        if author_id is None:
+            continue
+        category_id = categories[_clean(r.get('category')) or 'General']
+        thread = Thread(
+            title=_clean(r.get('title'))[:255],
+            content=r.get('content') or '',
+            content_html=content_html,
+            excerpt=make_excerpt(content_html),
+            author_id=author_id,
+            category_id=category_id,
+            campus=category_campuses.get(category_id) or author_campuses.get(author_id) or '',
+            course_id=courses.get(_clean(r.get('course'))),
+            resource_id=resources.get(_clean(r.get('resource'))),
+            is_locked=str(r.get('is_locked')).lower() in ('1', 'true', 'yes'),
+            legacy_id=r['legacy_id'],
+        )
+        r['_thread'] = thread
+        threads.append(thread)
+    # bulk_create skips save(), so the pre-rendered HTML is kept, and skips
+    # the signals, so stats and cached pages are refreshed at the end.
+    Thread.objects.bulk_create(threads)
+
+    reply_objs = []
+    for (r, reply), content_html in zip(replies, html[len(fresh):]):
+        author_id = users.get(_clean(reply.get('author')))
+        if '_thread' not in r or author_id is None:
+            continue
+        reply_objs.append(Reply(
+            thread=r['_thread'],
+            author_id=author_id,
+            content=reply['content'],
+            content_html=content_html,
+        ))
+        reply_objs[-1]._source = reply
+    Reply.objects.bulk_create(reply_objs)
+
+    ThreadTag.objects.bulk_create([
+        ThreadTag(thread=r['_thread'], tag_id=tags[name])
+        for r in fresh if '_thread' in r
+        for name in set(_tag_names(r.get('tags'))) if name in tags
+    ], ignore_conflicts=True)
+
+    # auto_now_add stamped the import time; put the original timestamps back.
+    dated_threads = []
+    for r in fresh:
+        created = _parse_time(r.get('created_at'))
+        if '_thread' in r and created:
+            r['_thread'].created_at = created
+            dated_threads.append(r['_thread'])
+    Thread.objects.bulk_update(dated_threads, ['created_at'], batch_size=1000)
+    dated_replies = []
+    for reply in reply_objs:
+        created = _parse_time(reply._source.get('created_at'))
+        if created:
+            reply.created_at = created
+            dated_replies.append(reply)
+    Reply.objects.bulk_update(dated_replies, ['created_at'], batch_size=1000)
+
+    rebuild_user_stats({t.author_id for t in threads} | {reply.author_id for reply in reply_objs})
+    # After the batch commits, so no request caches the pages again without it.
+    transaction.on_commit(lambda: refresh_cached_pages(threads))
+    return len(threads)
+
+
+WRITERS = {
+    'courses': import_courses,
+    'resources': import_resources,
+    'threads': import_threads,
+}
+
+
+def run_import(path, kind, batch_size=500, workers=None, resume=False, progress=None):
+    """
+    Import every record in `path` as `kind`. Returns (records read, rows written).
+
+    `progress` is called after each batch with (records done, rows written,
+    records per second).
+    """
+    skip = read_checkpoint(path) if resume else 0
+    records = islice(read_records(path), skip, None)
+    writer = WRITERS[kind]
+    done, written = skip, 0
+    started = time.monotonic()
+
+    with MarkdownRenderer(workers if kind == 'threads' else 0) as renderer:
+        for batch in _batches(records, batch_size):
+            with transaction.atomic():
+                written += writer(batch, renderer=renderer)
+            done += len(batch)
+            write_checkpoint(path, done)
+            if progress:
+                elapsed = time.monotonic() - started
+                progress(done, written, (done - skip) / elapsed if elapsed else 0.0)
+
+    try:
+        os.remove(checkpoint_path(path))
+    except FileNotFoundError:
+        pass
+    return done, written
@@ -0,0 +1,354 @@
+"""
+Load testing against a real gunicorn stack.
+
+`manage.py loadtest` seeds users and threads into the configured database,
+which has to be a throwaway one, starts gunicorn on it (or targets --url),
+and runs many concurrent clients
+in threads. Each client picks scenarios from a weighted mix: anonymous
+browsing, logging in, creating threads, replying and voting. Results are
+reported per scenario: throughput, latency percentiles, errors, responses
+refused by rate limiting and requests that failed on a database lock. On
+PostgreSQL a sampler also counts backends waiting on locks, attributed to
+scenarios by the table their statement touches. The seeded users, who get
+a fresh random password each run, are deleted afterwards together with the
+seeded category and everything the clients created.
+"""
+import http.cookiejar
+import random
+import re
+import secrets
+import socket
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from collections import defaultdict
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.db import connection
+from .models import UserProfile, Category, Thread
+from .utils import render_markdown, make_excerpt
+
+
+SCENARIOS = ['browse', 'login', 'create', 'reply', 'vote']
+DEFAULT_MIX = {'browse': 70, 'login': 2, 'create': 3, 'reply': 10, 'vote': 15}
+
+USER_EMAIL = 'loadtest{}@pilani.bits-pilani.ac.in'
+SEED_USERNAMES = r'^loadtest[0-9]+$'
+SEED_CATEGORY = 'Load test'
+
+LOCK_ERRORS = re.compile(rb'database is locked|deadlock detected|lock timeout|could not obtain lock')
+
+# Which scenario a statement waiting on a lock most likely belongs to.
+LOCK_TABLES = [
+    ('forum_upvote', 'vote'),
+    ('forum_reply', 'reply'),
+    ('forum_threadtag', 'create'),
+    ('forum_thread', 'create'),
+    ('django_session', 'login'),
+    ('auth_user', 'login'),
+]
+
+
+def parse_mix(text):
+    """'browse=70,vote=30' -> {'browse': 70, 'vote': 30}"""
+    mix = {}
+    for part in filter(None, (p.strip() for p in text.split(','))):
+        name, _, weight = part.partition('=')
+        if name not in SCENARIOS:
+            raise ValueError(f'unknown scenario {name!r}; choose from {", ".join(SCENARIOS)}')
+        mix[name] = int(weight or 1)
+    return mix
+
+
+# Seeding
+
+def seeded_users():
+    return User.objects.filter(username__regex=SEED_USERNAMES, email__startswith='loadtest')
+
+
+def new_password():
+    return secrets.token_urlsafe(16)
+
+
+def seed(users, threads, password):
+    """
+    Create the load-test users, logging in with password, and a category of
+    open threads for them; returns the category
+    """
+    cleanup()
+    # One hash for everyone: hashing per user would take minutes.
+    hashed = make_password(password)
+    User.objects.bulk_create([
+        User(username=f'loadtest{i}', email=USER_EMAIL.format(i), password=hashed) for i in range(users)
+    ], batch_size=1000)
+    UserProfile.objects.bulk_create([
+        UserProfile(user=user, full_name=user.username, campus='pilani') for user in seeded_users()
+    ], batch_size=1000)
+
+    category = Category.objects.create(name=SEED_CATEGORY, description='Seeded by manage.py loadtest')
+    authors = list(seeded_users().values_list('pk', flat=True))
+    content_html = render_markdown('Seeded thread body for load testing.')
+    Thread.objects.bulk_create([
+        Thread(
+            title=f'Load test thread {i}', content='Seeded thread body for load testing.',
+            content_html=content_html, excerpt=make_excerpt(content_html),
+            author_id=authors[i % len(authors)], category=category, campus='pilani',
+        )
+        for i in range(threads)
+    ], batch_size=1000)
+    return category
+
+
+def cleanup():
+    """
+    Delete the seeded category and users, and with them the threads, replies
+    and votes of the run; returns the number of rows deleted
+    """
+    # Through the ORM, so the signals drop stats and cached pages too.
+    deleted, _ = Category.objects.filter(name=SEED_CATEGORY).delete()
+    users, _ = seeded_users().delete()
+    return deleted + users
+
+
+# Server
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+class GunicornServer:
+    """gunicorn on a local port, with its log kept for lock errors"""
+
+    def __init__(self, workers, port=None, extra_args=()):
+        self.port = port or free_port()
+        self.url = f'http://127.0.0.1:{self.port}'
+        self.log = open(f'/tmp/loadtest-gunicorn-{self.port}.log', 'w+b')
+        self.process = subprocess.Popen(
+            [sys.executable, '-m', 'gunicorn', 'studydeck.wsgi:application',
+             '--bind', f'127.0.0.1:{self.port}', '--workers', str(workers), *extra_args],
+            stdout=self.log, stderr=subprocess.STDOUT,
+        )
+
+    def wait_ready(self, timeout=60):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if self.process.poll() is not None:
+                raise RuntimeError(f'gunicorn exited with {self.process.returncode}; see {self.log.name}')
+            try:
+                urllib.request.urlopen(f'{self.url}/forum/', timeout=2).read()
+                return
+            except (urllib.error.URLError, ConnectionError, socket.timeout):
+                time.sleep(0.2)
+        raise RuntimeError(f'gunicorn did not answer within {timeout}s; see {self.log.name}')
+
+    def lock_errors_logged(self):
+        self.log.seek(0)
+        return len(LOCK_ERRORS.findall(self.log.read()))
+
+    def stop(self):
+        self.process.terminate()
+        try:
+            self.process.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+        self.log.close()
+
+
+# Clients
+
+class Results:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.limited = defaultdict(int)
+        self.lock_errors = defaultdict(int)
+        self.lock_waits = defaultdict(int)
+
+    def record(self, scenario, seconds, status, body=b''):
+        with self.lock:
+            self.latencies[scenario].append(seconds)
+            # django-ratelimit refuses with a plain 403; CSRF failures are errors.
+            if status == 403 and b'CSRF' not in (body or b''):
+                self.limited[scenario] += 1
+            elif status >= 400 or status == 0:
+                self.errors[scenario] += 1
+            if LOCK_ERRORS.search(body or b''):
+                self.lock_errors[scenario] += 1
+
+
+class NoRedirect(urllib.request.HTTPRedirectHandler):
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+class Client:
+    """One simulated user with its own cookies"""
+
+    def __init__(self, base_url, index, targets, results, timeout=30):
+        self.base_url = base_url
+        self.index = index
+        self.targets = targets
+        self.results = results
+        self.timeout = timeout
+        self.cookies = http.cookiejar.CookieJar()
+        self.opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(self.cookies), NoRedirect)
+        self.anonymous = urllib.request.build_opener(NoRedirect)
+        self.logged_in = False
+
+    def _request(self, scenario, path, data=None, headers=None, opener=None):
+        request = urllib.request.Request(
+            self.base_url + path,
+            data=urllib.parse.urlencode(data).encode() if data is not None else None,
+            headers=headers or {},
+        )
+        started = time.perf_counter()
+        try:
+            response = (opener or self.opener).open(request, timeout=self.timeout)
+            status, body = response.status, response.read()
+        except urllib.error.HTTPError as e:
+            status, body = e.code, e.read()
+        except (urllib.error.URLError, ConnectionError, socket.timeout):
+            status, body = 0, b''
+        self.results.record(scenario, time.perf_counter() - started, status, body)
+        return status
+
+    def _csrf(self):
+        for cookie in self.cookies:
+            if cookie.name == 'csrftoken':
+                return cookie.value
+        return ''
+
+    def browse(self):
+        kind = random.random()
+        if kind < 0.2:
+            path = '/forum/'
+        elif kind < 0.4:
+            path = f'/forum/category/{random.choice(self.targets["categories"])}/'
+        else:
+            path = f'/forum/thread/{random.choice(self.targets["threads"])}/'
+        self._request('browse', path, opener=self.anonymous)
+
+    def login(self):
+        self.cookies.clear()
+        self.opener.open(self.base_url + '/accounts/login/', timeout=self.timeout).read()
+        status = self._request('login', '/accounts/login/', {
+            'login': USER_EMAIL.format(self.index % self.targets['users']),
+            'password': self.targets['password'],
+            'csrfmiddlewaretoken': self._csrf(),
+        })
+        self.logged_in = status == 302
+
+    def create(self):
+        self._request('create', '/forum/thread/create/', {
+            'title': f'Load test question {random.randrange(10 ** 9)}',
+            'content': 'How does this behave under load?',
+            'category': self.targets['category_id'],
+            'tags': 'loadtest',
+            'csrfmiddlewaretoken': self._csrf(),
+        })
+
+    def reply(self):
+        thread_id = random.choice(self.targets['threads'])
+        self._request('reply', f'/forum/thread/{thread_id}/reply/', {
+            'content': 'Replying under load.',
+            'csrfmiddlewaretoken': self._csrf(),
+        })
+
+    def vote(self):
+        # A few hot threads, so that votes contend the way real ones do.
+        thread_id = random.choice(self.targets['hot_threads'])
+        self._request('vote', '/forum/upvote/toggle/', {
+            'content_type': 'thread', 'content_id': thread_id,
+        }, headers={'X-CSRFToken': self._csrf()})
+
+    def run(self, mix, deadline):
+        names, weights = zip(*mix.items())
+        needs_login = any(name in ('create', 'reply', 'vote') for name in names)
+        while time.monotonic() < deadline:
+            if needs_login and not self.logged_in:
+                self.login()
+                continue
+            getattr(self, random.choices(names, weights)[0])()
+
+
+def sample_lock_waits(results, stop, interval=0.05):
+    """Count PostgreSQL backends waiting on locks, by the scenario's table"""
+    from django.db import connections
+    conn = connections.create_connection('default')
+    try:
+        with conn.cursor() as cursor:
+            while not stop.wait(interval):
+                cursor.execute(
+                    "SELECT query FROM pg_stat_activity "
+                    "WHERE datname = current_database() AND wait_event_type = 'Lock'"
+                )
+                for (query,) in cursor.fetchall():
+                    scenario = next((s for table, s in LOCK_TABLES if table in query), 'other')
+                    with results.lock:
+                        results.lock_waits[scenario] += 1
+    finally:
+        conn.close()
+
+
+def run_load(base_url, mix, clients, duration, targets):
+    """Drive clients for duration seconds; returns Results"""
+    results = Results()
+    deadline = time.monotonic() + duration
+    stop = threading.Event()
+    sampler = None
+    if connection.vendor == 'postgresql':
+        sampler = threading.Thread(target=sample_lock_waits, args=(results, stop), daemon=True)
+        sampler.start()
+
+    workers = [
+        threading.Thread(target=Client(base_url, i, targets, results).run, args=(mix, deadline), daemon=True)
+        for i in range(clients)
+    ]
+    started = time.monotonic()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    results.elapsed = time.monotonic() - started
+    stop.set()
+    if sampler:
+        sampler.join()
+    return results
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * len(ordered) + 0.5)) - 1)]
+
+
+def summarize(results, lock_wait_interval=0.05):
+    """Per-scenario rows: requests, rps, latency percentiles (ms), error counts"""
+    rows = []
+    for scenario in SCENARIOS:
+        latencies = results.latencies.get(scenario)
+        if not latencies:
+            continue
+        count = len(latencies)
+        rows.append({
+            'scenario': scenario,
+            'requests': count,
+            'rps': count / results.elapsed,
+            'p50_ms': percentile(latencies, 50) * 1000,
+            'p90_ms': percentile(latencies, 90) * 1000,
+            'p99_ms': percentile(latencies, 99) * 1000,
+            'max_ms': max(latencies) * 1000,
+            'error_pct': 100 * results.errors[scenario] / count,
+            'rate_limited': results.limited[scenario],
+            'lock_errors': results.lock_errors[scenario],
+            'lock_wait_s': results.lock_waits[scenario] * lock_wait_interval,
+        })
+    return rows
@@ -0,0 +1,38 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from forum.models import ReplyArchive
+from forum.retention import archivable_replies, archive_deleted_replies, restore_replies
+
+
+class Command(BaseCommand):
+    help = 'Move old soft-deleted replies into the archive table, or restore archived ones'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=settings.REPLY_ARCHIVE_AFTER_DAYS,
+                            help='Archive replies deleted more than this many days ago')
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help='Replies moved per transaction')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Only report how many replies would be archived')
+        parser.add_argument('--restore', type=int, nargs='+', metavar='REPLY_ID',
+                            help='Restore the given archived replies instead of archiving')
+
+    def handle(self, *args, **options):
+        if options['restore']:
+            archives = ReplyArchive.objects.filter(pk__in=options['restore'])
+            restored = restore_replies(archives)
+            self.stdout.write(self.style.SUCCESS(f'{restored} reply(s) restored'))
+            return
+
+        if options['dry_run']:
+            count = archivable_replies(options['days']).count()
+            self.stdout.write(f'{count} reply(s) would be archived')
+            return
+
+        def progress(count):
+            self.stdout.write(f'  {count} replies archived so far')
+
+        archived = archive_deleted_replies(
+            days=options['days'], batch_size=options['batch_size'], progress=progress
+        )
+        self.stdout.write(self.style.SUCCESS(f'{archived} reply(s) archived'))
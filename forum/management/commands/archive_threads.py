@@ -0,0 +1,44 @@
+from django.core.management.base import BaseCommand, CommandError
+from forum.models import ArchivedThread
+from forum.archive import archive_cutoff, archivable_threads, archive_threads, restore_threads, vacuum_hot_tables
+
+
+class Command(BaseCommand):
+    help = 'Move locked threads from past semesters into the archive tables, or restore archived ones'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--keep-semesters', type=int, default=None,
+                            help='Semesters kept in the live tables, counting the current one '
+                                 '(default: THREAD_ARCHIVE_KEEP_SEMESTERS)')
+        parser.add_argument('--batch-size', type=int, default=100,
+                            help='Threads moved per transaction')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Only report how many threads would be archived')
+        parser.add_argument('--vacuum', action='store_true',
+                            help='Vacuum the live tables afterwards so they and their indexes shrink')
+        parser.add_argument('--restore', type=int, nargs='+', metavar='THREAD_ID',
+                            help='Restore the given archived threads instead of archiving')
+
+    def handle(self, *args, **options):
+        if options['restore']:
+            restored = restore_threads(ArchivedThread.objects.filter(pk__in=options['restore']))
+            self.stdout.write(self.style.SUCCESS(f'{restored} thread(s) restored'))
+            return
+
+        if options['keep_semesters'] is not None and options['keep_semesters'] < 1:
+            raise CommandError('--keep-semesters must be at least 1')
+        cutoff = archive_cutoff(options['keep_semesters'])
+        if options['dry_run']:
+            count = archivable_threads(cutoff).count()
+            self.stdout.write(f'{count} thread(s) inactive since before {cutoff:%Y-%m-%d} would be archived')
+            return
+
+        def progress(count):
+            self.stdout.write(f'  {count} threads archived so far')
+
+        archived = archive_threads(cutoff, batch_size=options['batch_size'], progress=progress)
+        self.stdout.write(self.style.SUCCESS(f'{archived} thread(s) archived'))
+
+        if options['vacuum'] and archived:
+            tables = vacuum_hot_tables()
+            self.stdout.write(f'Vacuumed {", ".join(tables)}')
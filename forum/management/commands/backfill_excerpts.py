@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand
+from forum.models import Thread
+from forum.summaries import invalidate_thread_summaries
+from forum.utils import make_excerpt
+
+
+class Command(BaseCommand):
+    help = 'Fill in Thread.excerpt from content_html for threads saved before it existed'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Threads read and updated per batch')
+        parser.add_argument('--all', action='store_true',
+                            help='Recompute every excerpt, not just empty ones')
+
+    def handle(self, *args, **options):
+        threads = Thread.objects.order_by('pk').only('pk', 'content_html')
+        if not options['all']:
+            threads = threads.filter(excerpt='')
+
+        updated = 0
+        last_pk = 0
+        while True:
+            batch = list(threads.filter(pk__gt=last_pk)[:options['batch_size']])
+            if not batch:
+                break
+            last_pk = batch[-1].pk
+            for thread in batch:
+                thread.excerpt = make_excerpt(thread.content_html)
+            # bulk_update leaves updated_at alone, so threads do not look edited.
+            Thread.objects.bulk_update(batch, ['excerpt'])
+            invalidate_thread_summaries([thread.pk for thread in batch])
+            updated += len(batch)
+            self.stdout.write(f'  {updated} threads updated')
+        self.stdout.write(self.style.SUCCESS(f'Backfilled {updated} excerpt(s)'))
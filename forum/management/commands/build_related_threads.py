@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand, CommandError
+from forum.related import build_related_threads, update_related_threads
+
+
+class Command(BaseCommand):
+    help = 'Compute related-thread recommendations from TF-IDF vectors'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--top-k', type=int, default=5,
+                            help='Related threads stored per thread')
+        parser.add_argument('--block-by', choices=['category', 'course'], default='category',
+                            help='Only compare threads within the same category or course')
+        parser.add_argument('--min-score', type=float, default=0.05,
+                            help='Drop neighbours below this cosine similarity')
+        parser.add_argument('--incremental', action='store_true',
+                            help='Only add threads created since the last full build')
+
+    def handle(self, *args, **options):
+        def progress(block, count):
+            self.stdout.write(f'  {block[0]} {block[1]}: {count}')
+
+        if options['incremental']:
+            try:
+                added = update_related_threads(
+                    top_k=options['top_k'], min_score=options['min_score'], progress=progress
+                )
+            except FileNotFoundError:
+                raise CommandError('No saved model yet; run a full build first.')
+            self.stdout.write(self.style.SUCCESS(f'{added} new thread(s) linked'))
+            return
+
+        written = build_related_threads(
+            top_k=options['top_k'], block_by=options['block_by'],
+            min_score=options['min_score'], progress=progress,
+        )
+        self.stdout.write(self.style.SUCCESS(f'{written} related-thread link(s) written'))
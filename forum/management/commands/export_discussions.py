@@ -0,0 +1,46 @@
+import sys
+from django.core.management.base import BaseCommand, CommandError
+from forum.export import export_threads, stream_export
+from forum.models import Course, Category
+
+
+class Command(BaseCommand):
+    help = 'Stream all discussion for a course or category as JSONL or CSV'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--course', help='Course code, e.g. "CS F111"')
+        parser.add_argument('--category', help='Category slug')
+        parser.add_argument('--format', choices=['jsonl', 'csv'], default='jsonl')
+        parser.add_argument('--gzip', action='store_true', help='Compress the output with gzip')
+        parser.add_argument('--output', '-o', help='File to write (default: stdout)')
+        parser.add_argument('--chunk-size', type=int, default=2000,
+                            help='Rows fetched per round trip from the database')
+
+    def handle(self, *args, **options):
+        course = category = None
+        if options['course']:
+            course = Course.objects.filter(code=options['course']).first()
+            if course is None:
+                raise CommandError(f'No course with code {options["course"]!r}')
+        if options['category']:
+            category = Category.objects.filter(slug=options['category']).first()
+            if category is None:
+                raise CommandError(f'No category with slug {options["category"]!r}')
+        if course is None and category is None:
+            raise CommandError('Pass --course and/or --category')
+
+        chunks = stream_export(
+            export_threads(course=course, category=category),
+            fmt=options['format'], compress=options['gzip'], chunk_size=options['chunk_size'],
+        )
+        out = open(options['output'], 'wb') if options['output'] else sys.stdout.buffer
+        written = 0
+        try:
+            for chunk in chunks:
+                out.write(chunk)
+                written += len(chunk)
+        finally:
+            if options['output']:
+                out.close()
+        if options['output']:
+            self.stderr.write(self.style.SUCCESS(f'Wrote {written} bytes to {options["output"]}'))
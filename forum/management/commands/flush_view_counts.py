@@ -0,0 +1,19 @@
+import time
+from django.core.management.base import BaseCommand
+from forum.viewcounts import flush_view_counts
+
+
+class Command(BaseCommand):
+    help = 'Write buffered thread view counts and unique-viewer estimates to the database'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=int, default=None,
+                            help='Keep running, flushing every this many seconds')
+
+    def handle(self, *args, **options):
+        while True:
+            updated = flush_view_counts()
+            self.stdout.write(self.style.SUCCESS(f'Updated view counts for {updated} thread(s)'))
+            if not options['interval']:
+                return
+            time.sleep(options['interval'])
@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand, CommandError
+from forum.importer import KINDS, run_import
+
+
+class Command(BaseCommand):
+    help = 'Bulk import courses, resources or legacy threads from CSV or JSONL (optionally .gz)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=KINDS)
+        parser.add_argument('path', help='CSV or JSONL file; thread files use the export_discussions layout')
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help='Records written per transaction')
+        parser.add_argument('--workers', type=int, default=None,
+                            help='Processes rendering markdown (default: one per CPU, 0 renders inline)')
+        parser.add_argument('--resume', action='store_true',
+                            help='Continue from the checkpoint left by an interrupted run')
+
+    def handle(self, *args, **options):
+        def progress(done, written, rate):
+            self.stdout.write(f'  {done} records read, {written} written ({rate:.0f} records/s)')
+
+        try:
+            done, written = run_import(
+                options['path'], options['kind'],
+                batch_size=options['batch_size'], workers=options['workers'],
+                resume=options['resume'], progress=progress,
+            )
+        except FileNotFoundError as e:
+            raise CommandError(str(e))
+        self.stdout.write(self.style.SUCCESS(f'{done} record(s) read, {written} {options["kind"]} written'))
@@ -0,0 +1,51 @@
+import re
+import subprocess
+import sys
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+
+LINE_RE = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$')
+
+
+class Command(BaseCommand):
+    help = 'Report how long each module takes to import when the app starts, using python -X importtime'
+
+    def add_arguments(self, parser):
+        parser.add_argument('modules', nargs='*',
+                            help='Modules to import after django.setup() (default: ROOT_URLCONF and forum.warmup)')
+        parser.add_argument('--top', type=int, default=30, help='Rows to show (default: 30)')
+        parser.add_argument('--sort', choices=['cumulative', 'self'], default='cumulative',
+                            help='Order by time including submodules, or by the module alone')
+        parser.add_argument('--warmup', action='store_true',
+                            help='Also run forum.warmup.import_heavy_modules() to time the lazy imports')
+
+    def handle(self, *args, **options):
+        modules = options['modules'] or [settings.ROOT_URLCONF, 'forum.warmup']
+        code = ['import django', 'django.setup()'] + [f'import {name}' for name in modules]
+        if options['warmup']:
+            code.append('forum.warmup.import_heavy_modules()')
+
+        # A fresh interpreter: this one has imported most of it already.
+        result = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', '; '.join(code)],
+            capture_output=True, text=True,
+        )
+        if result.returncode:
+            raise CommandError(result.stderr.strip().splitlines()[-1])
+
+        rows = []
+        for line in result.stderr.splitlines():
+            match = LINE_RE.match(line)
+            if match:
+                own, cumulative, indent, name = match.groups()
+                rows.append((name, int(own), int(cumulative), len(indent) // 2))
+        if not rows:
+            raise CommandError('python -X importtime printed nothing')
+
+        total = sum(own for _, own, _, _ in rows)
+        key = 2 if options['sort'] == 'cumulative' else 1
+        self.stdout.write(f'{"module":<60}{"self ms":>10}{"cumul. ms":>11}')
+        for name, own, cumulative, _ in sorted(rows, key=lambda row: row[key], reverse=True)[:options['top']]:
+            self.stdout.write(f'{name:<60}{own / 1000:>10.1f}{cumulative / 1000:>11.1f}')
+        self.stdout.write(f'{len(rows)} module(s) imported in {total / 1000:.0f}ms')
@@ -0,0 +1,102 @@
+import json
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from forum.loadtest import (
+    DEFAULT_MIX, GunicornServer, parse_mix, new_password, seed, cleanup, run_load, summarize,
+)
+from forum.models import Category
+
+
+class Command(BaseCommand):
+    help = 'Run concurrent browse/login/create/reply/vote clients against gunicorn and report per scenario'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--clients', type=int, default=20, help='Concurrent clients (default: 20)')
+        parser.add_argument('--duration', type=int, default=30, help='Seconds to run (default: 30)')
+        parser.add_argument('--mix', default=','.join(f'{k}={v}' for k, v in DEFAULT_MIX.items()),
+                            help='Scenario weights, e.g. browse=70,vote=30')
+        parser.add_argument('--users', type=int, default=200, help='Load-test users to seed and log in as')
+        parser.add_argument('--threads', type=int, default=500, help='Open threads to seed')
+        parser.add_argument('--hot-threads', type=int, default=10,
+                            help='Threads the votes concentrate on (default: 10)')
+        parser.add_argument('--workers', type=int, default=3, help='gunicorn workers (default: 3)')
+        parser.add_argument('--port', type=int, default=None, help='Port for gunicorn (default: any free one)')
+        parser.add_argument('--url', default=None, help='Test a server that is already running instead')
+        parser.add_argument('--json', dest='json_path', default=None, help='Also write the results to this file')
+        parser.add_argument('--throwaway-db', action='store_true',
+                            help='Confirm the configured database is disposable; needed when DEBUG is off')
+
+    def handle(self, *args, **options):
+        try:
+            mix = parse_mix(options['mix'])
+        except ValueError as e:
+            raise CommandError(str(e))
+        if not mix:
+            raise CommandError('--mix selects no scenarios')
+
+        if not settings.DEBUG and not options['throwaway_db']:
+            raise CommandError(
+                'DEBUG is off, so this may be a real database. The load test adds and deletes users '
+                'and threads in it; pass --throwaway-db if it is a disposable copy.'
+            )
+        if options['users'] < 1 or options['threads'] < 1:
+            raise CommandError('--users and --threads must be at least 1')
+
+        password = new_password()
+        category = seed(options['users'], options['threads'], password)
+        self.stdout.write(f'Seeded {options["users"]} user(s) and {options["threads"]} thread(s)')
+        try:
+            self.run_load_test(options, mix, category, password)
+        finally:
+            self.stdout.write(f'Deleted {cleanup()} seeded or created row(s)')
+
+    def run_load_test(self, options, mix, category, password):
+        thread_ids = list(category.threads.order_by('-created_at').values_list('pk', flat=True))
+        targets = {
+            'users': options['users'],
+            'password': password,
+            'threads': thread_ids,
+            'hot_threads': thread_ids[:options['hot_threads']],
+            'categories': list(Category.objects.values_list('slug', flat=True)),
+            'category_id': category.pk,
+        }
+
+        server = None
+        url = options['url']
+        if not url:
+            server = GunicornServer(options['workers'], options['port'])
+            self.stdout.write(f'Starting gunicorn with {options["workers"]} worker(s) on {server.url}')
+            try:
+                server.wait_ready()
+            except RuntimeError as e:
+                server.stop()
+                raise CommandError(str(e))
+            url = server.url
+
+        self.stdout.write(f'Running {options["clients"]} client(s) for {options["duration"]}s: {options["mix"]}')
+        try:
+            results = run_load(url.rstrip('/'), mix, options['clients'], options['duration'], targets)
+        finally:
+            logged = server.lock_errors_logged() if server else None
+            if server:
+                server.stop()
+
+        rows = summarize(results)
+        self.stdout.write(
+            f'{"scenario":<10}{"requests":>9}{"req/s":>8}{"p50 ms":>9}{"p90 ms":>9}{"p99 ms":>9}'
+            f'{"max ms":>9}{"errors":>8}{"limited":>9}{"locked":>8}{"lock wait":>11}'
+        )
+        for row in rows:
+            self.stdout.write(
+                f'{row["scenario"]:<10}{row["requests"]:>9}{row["rps"]:>8.1f}{row["p50_ms"]:>9.0f}'
+                f'{row["p90_ms"]:>9.0f}{row["p99_ms"]:>9.0f}{row["max_ms"]:>9.0f}{row["error_pct"]:>7.1f}%'
+                f'{row["rate_limited"]:>9}{row["lock_errors"]:>8}{row["lock_wait_s"]:>10.1f}s'
+            )
+        total = sum(row['requests'] for row in rows)
+        self.stdout.write(f'{total} request(s) in {results.elapsed:.1f}s, {total / results.elapsed:.1f} req/s')
+        if logged is not None:
+            self.stdout.write(f'Lock errors in the gunicorn log: {logged}')
+
+        if options['json_path']:
+            with open(options['json_path'], 'w') as f:
+                json.dump({'elapsed': results.elapsed, 'scenarios': rows, 'lock_errors_logged': logged}, f, indent=2)
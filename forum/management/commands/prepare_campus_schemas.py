@@ -0,0 +1,16 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from forum.campuses import prepare_schemas
+
+
+class Command(BaseCommand):
+    help = "Create the campus schemas for forum rows and move rows into their campus's schema"
+
+    def handle(self, *args, **options):
+        if not settings.CAMPUS_SCHEMAS:
+            raise CommandError('No campus schemas configured (set <CAMPUS>_DB_SCHEMA)')
+        if connection.vendor != 'postgresql':
+            raise CommandError('Campus schemas need PostgreSQL')
+        moved = prepare_schemas()
+        self.stdout.write(self.style.SUCCESS(f'{moved} row(s) moved into their campus schema'))
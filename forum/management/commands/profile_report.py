@@ -0,0 +1,70 @@
+from collections import Counter, defaultdict
+from datetime import timedelta
+from pathlib import Path
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from forum.profiling import read
+
+
+class Command(BaseCommand):
+    help = 'Aggregate the profiles in PROFILE_SPOOL_DIR into the functions that took the most samples'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--view', default=None, help='Only profiles of this URL name, e.g. forum:search')
+        parser.add_argument('--hours', type=float, default=None, help='Only profiles from the last this many hours')
+        parser.add_argument('--top', type=int, default=25, help='Functions to list (default: 25)')
+        parser.add_argument('--merge', default=None,
+                            help='Also write all matching stacks, summed, to this collapsed-stack file')
+        parser.add_argument('--clear', action='store_true', help='Delete the profiles that were reported')
+
+    def handle(self, *args, **options):
+        spool = Path(settings.PROFILE_SPOOL_DIR)
+        since = timezone.now() - timedelta(hours=options['hours']) if options['hours'] else None
+
+        stacks = Counter()
+        views = defaultdict(list)
+        used = []
+        for path in sorted(spool.glob('*.folded')):
+            meta, profile = read(path)
+            if options['view'] and meta.get('view') != options['view']:
+                continue
+            if since and (parse_datetime(meta.get('time', '')) or since) < since:
+                continue
+            stacks.update(profile)
+            views[meta.get('view', '?')].append(float(meta.get('duration_ms', 0)))
+            used.append(path)
+        if not used:
+            raise CommandError(f'No matching profiles in {spool}')
+
+        self.stdout.write(f'{len(used)} profile(s), {sum(stacks.values())} sample(s)')
+        for view, durations in sorted(views.items(), key=lambda item: -len(item[1])):
+            self.stdout.write(
+                f'  {view}: {len(durations)} profile(s), '
+                f'median {sorted(durations)[len(durations) // 2]:.0f}ms, max {max(durations):.0f}ms'
+            )
+
+        # Self: samples with the function on top. Total: samples with it
+        # anywhere on the stack, counted once per sample however recursive.
+        own, total = Counter(), Counter()
+        for stack, count in stacks.items():
+            frames = stack.split(';')
+            own[frames[-1]] += count
+            for name in set(frames):
+                total[name] += count
+        samples = sum(stacks.values())
+
+        self.stdout.write(f'\n{"self %":>7}{"total %":>9}  function')
+        for name, count in own.most_common(options['top']):
+            self.stdout.write(f'{100 * count / samples:>6.1f}%{100 * total[name] / samples:>8.1f}%  {name}')
+
+        if options['merge']:
+            with open(options['merge'], 'w') as f:
+                for stack, count in stacks.most_common():
+                    f.write(f'{stack} {count}\n')
+            self.stdout.write(f'\nMerged stacks written to {options["merge"]}')
+        if options['clear']:
+            for path in used:
+                path.unlink(missing_ok=True)
+            self.stdout.write(f'{len(used)} profile(s) deleted')
@@ -0,0 +1,28 @@
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from forum.snapshots import publish_snapshots
+
+
+class Command(BaseCommand):
+    help = 'Write static HTML snapshots of the forum home, categories and hottest threads for nginx'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--top', type=int, default=None,
+                            help='Number of most viewed threads to snapshot (default: SNAPSHOT_TOP_THREADS)')
+        parser.add_argument('--interval', type=int, default=None,
+                            help='Keep running, republishing every this many seconds')
+
+    def handle(self, *args, **options):
+        if not settings.SNAPSHOT_ROOT:
+            raise CommandError('SNAPSHOT_ROOT is not set')
+
+        while True:
+            started = time.monotonic()
+            written, removed = publish_snapshots(top=options['top'])
+            self.stdout.write(
+                f'{written} snapshot(s) written, {removed} removed in {time.monotonic() - started:.1f}s'
+            )
+            if not options['interval']:
+                return
+            time.sleep(options['interval'])
@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand
+from forum.models import ThreadPurge
+from forum.purge import run_purge
+
+
+class Command(BaseCommand):
+    help = 'Hard-delete threads queued for purging, in bounded batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=None,
+                            help='Rows per DELETE statement (default: THREAD_PURGE_BATCH_SIZE)')
+        parser.add_argument('--limit', type=int, default=None,
+                            help='Maximum number of queued purges to process')
+        parser.add_argument('--retry-failed', action='store_true',
+                            help='Also pick up purges that previously failed')
+
+    def handle(self, *args, **options):
+        statuses = ['Pending', 'Running']
+        if options['retry_failed']:
+            statuses.append('Failed')
+        purges = ThreadPurge.objects.filter(status__in=statuses).order_by('created_at')
+        if options['limit']:
+            purges = purges[:options['limit']]
+
+        processed = 0
+        for purge in purges:
+            self.stdout.write(f'Purging thread {purge.thread_id} "{purge.thread_title}"')
+
+            def progress(label, count):
+                self.stdout.write(f'  {label}: {count} rows deleted so far')
+
+            try:
+                run_purge(purge, batch_size=options['batch_size'], progress=progress)
+            except Exception as e:
+                self.stderr.write(self.style.ERROR(f'  failed: {e}'))
+                continue
+            processed += 1
+            self.stdout.write(self.style.SUCCESS(f'  done, {purge.rows_deleted} rows deleted'))
+
+        self.stdout.write(f'{processed} thread(s) purged')
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+from forum.stats import rebuild_user_stats
+
+
+class Command(BaseCommand):
+    help = 'Recompute per-user thread, reply, upvote and karma counters'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=int, nargs='+', metavar='USER_ID',
+                            help='Only rebuild these users')
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Users per grouped query')
+
+    def handle(self, *args, **options):
+        written = rebuild_user_stats(options['user'], batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt stats for {written} user(s)'))
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+from forum.rollups import CHUNK_SIZE, rollup_activity, reset_rollups
+
+
+class Command(BaseCommand):
+    help = 'Fold new threads, replies and upvotes into the daily activity rollups'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE,
+                            help='Primary key range aggregated per transaction')
+        parser.add_argument('--rebuild', action='store_true',
+                            help='Empty the rollups first and rebuild them from all rows')
+
+    def handle(self, *args, **options):
+        if options['rebuild']:
+            reset_rollups()
+
+        def progress(source, done, upper):
+            self.stdout.write(f'  {source}: up to id {done} of {upper}')
+
+        result = rollup_activity(chunk_size=options['chunk_size'], progress=progress)
+        summary = ', '.join(f'{source} up to id {last}' for source, last in result.items() if last)
+        self.stdout.write(self.style.SUCCESS(f'Rollups up to date ({summary or "nothing new"})'))
@@ -0,0 +1,301 @@
+"""
+Prometheus metrics, shared across gunicorn workers through files.
+
+Each process counts in memory and writes its totals to a file of its own
+under METRICS_DIR at most once a second (and when a gunicorn worker exits);
+/metrics adds up every file there. Files of exited workers stay, so the
+counters never go down; gunicorn.conf.py clears the directory when the
+server starts.
+
+Counted here:
+- request latency per URL name, in MetricsMiddleware;
+- database queries and their time per alias, through an execute_wrapper
+  the middleware installs for the request;
+- cache hits and misses per key namespace, by the Metered*Cache backends;
+- requests refused by @ratelimit;
+- outgoing email, by MeteredEmailBackend wrapping EMAIL_DELIVERY_BACKEND.
+"""
+import json
+import os
+import threading
+import time
+import uuid
+from collections import defaultdict
+from contextlib import ExitStack
+from pathlib import Path
+from django.conf import settings
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.cache.backends.redis import RedisCache
+from django.core.mail import get_connection
+from django.core.mail.backends.base import BaseEmailBackend
+from django.db import connections
+from django.db.models import Count
+from django_ratelimit.exceptions import Ratelimited
+
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+FLUSH_SECONDS = 1.0
+
+METRICS = {
+    'studydeck_http_request_duration_seconds': ('histogram', 'Request latency by URL name'),
+    'studydeck_db_queries_total': ('counter', 'Database queries run while serving requests'),
+    'studydeck_db_query_seconds_total': ('counter', 'Time spent in those database queries'),
+    'studydeck_cache_requests_total': ('counter', 'Cache lookups by key namespace and result'),
+    'studydeck_ratelimit_rejections_total': ('counter', 'Requests refused by @ratelimit'),
+    'studydeck_email_send_duration_seconds': ('histogram', 'Time to hand a batch of email to the mail backend'),
+    'studydeck_email_messages_total': ('counter', 'Email messages by result'),
+    'studydeck_thread_purges': ('gauge', 'Queued thread purges by status'),
+}
+
+
+class Store:
+    """This process's counters and histograms"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.pid = os.getpid()
+        self.path = None
+        self.counters = defaultdict(float)
+        self.histograms = {}
+        self.flushed = time.monotonic()
+
+    def _check_fork(self):
+        # A forked worker starts from zero; its parent reports its own.
+        if self.pid != os.getpid():
+            self.__init__()
+
+    def inc(self, name, labels, amount=1):
+        with self.lock:
+            self._check_fork()
+            self.counters[name, labels] += amount
+
+    def observe(self, name, labels, value, buckets=DURATION_BUCKETS):
+        with self.lock:
+            self._check_fork()
+            histogram = self.histograms.get((name, labels))
+            if histogram is None:
+                histogram = self.histograms[name, labels] = [[0] * len(buckets), 0.0, 0]
+            for i, bound in enumerate(buckets):
+                if value <= bound:
+                    histogram[0][i] += 1
+                    break
+            histogram[1] += value
+            histogram[2] += 1
+
+    def flush(self, force=False):
+        with self.lock:
+            self._check_fork()
+            if not force and time.monotonic() - self.flushed < FLUSH_SECONDS:
+                return
+            self.flushed = time.monotonic()
+            data = {
+                'counters': [[name, list(labels), value] for (name, labels), value in self.counters.items()],
+                'histograms': [[name, list(labels), *h] for (name, labels), h in self.histograms.items()],
+            }
+        directory = metrics_dir()
+        directory.mkdir(parents=True, exist_ok=True)
+        if self.path is None:
+            # Not just the pid: a later process may be given the same one.
+            self.path = directory / f'{self.pid}-{uuid.uuid4().hex[:8]}.json'
+        tmp = self.path.with_suffix('.tmp')
+        tmp.write_text(json.dumps(data))
+        os.replace(tmp, self.path)
+
+
+_store = Store()
+inc = _store.inc
+observe = _store.observe
+flush = _store.flush
+
+
+def metrics_dir():
+    return Path(settings.METRICS_DIR)
+
+
+def clear_files():
+    """Forget the previous server's processes; called when gunicorn starts"""
+    for path in metrics_dir().glob('*.json'):
+        path.unlink(missing_ok=True)
+
+
+# Collection
+
+def _view_name(request):
+    match = getattr(request, 'resolver_match', None)
+    return match.view_name if match else '<unresolved>'
+
+
+class MetricsMiddleware:
+    """Time each request and count its queries under the view's URL name"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        queries = defaultdict(lambda: [0, 0.0])
+
+        def count_query(execute, sql, params, many, context):
+            started = time.perf_counter()
+            try:
+                return execute(sql, params, many, context)
+            finally:
+                totals = queries[context['connection'].alias]
+                totals[0] += 1
+                totals[1] += time.perf_counter() - started
+
+        started = time.perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(count_query))
+            response = self.get_response(request)
+        elapsed = time.perf_counter() - started
+
+        view = _view_name(request)
+        observe('studydeck_http_request_duration_seconds',
+                (('view', view), ('method', request.method), ('status', f'{response.status_code // 100}xx')),
+                elapsed)
+        for alias, (count, seconds) in queries.items():
+            labels = (('view', view), ('alias', alias))
+            inc('studydeck_db_queries_total', labels, count)
+            inc('studydeck_db_query_seconds_total', labels, seconds)
+        flush()
+        return response
+
+    def process_exception(self, request, exception):
+        if isinstance(exception, Ratelimited):
+            inc('studydeck_ratelimit_rejections_total', (('view', _view_name(request)),))
+
+
+def cache_namespace(key):
+    """'forum:thread-summary:12' -> 'forum:thread-summary', 'rl:abc' -> 'rl'"""
+    parts = str(key).split(':', 2)
+    return ':'.join(parts[:2]) if parts[0] == 'forum' and len(parts) > 1 else parts[0]
+
+
+_missing = object()
+
+
+def _count_lookup(key, hit):
+    inc('studydeck_cache_requests_total', (('namespace', cache_namespace(key)), ('result', 'hit' if hit else 'miss')))
+
+
+class MeteredCacheMixin:
+    def get(self, key, default=None, version=None):
+        value = super().get(key, _missing, version)
+        _count_lookup(key, value is not _missing)
+        return default if value is _missing else value
+
+
+class MeteredLocMemCache(MeteredCacheMixin, LocMemCache):
+    """LocMemCache counting hits and misses (its get_many goes through get)"""
+
+
+class MeteredRedisCache(MeteredCacheMixin, RedisCache):
+    """RedisCache counting hits and misses"""
+
+    def get_many(self, keys, version=None):
+        found = super().get_many(keys, version)
+        for key in keys:
+            _count_lookup(key, key in found)
+        return found
+
+
+class MeteredEmailBackend(BaseEmailBackend):
+    """Times and counts mail handed to EMAIL_DELIVERY_BACKEND"""
+
+    def __init__(self, fail_silently=False, **kwargs):
+        super().__init__(fail_silently=fail_silently)
+        self.backend = get_connection(settings.EMAIL_DELIVERY_BACKEND, fail_silently=fail_silently, **kwargs)
+
+    def open(self):
+        return self.backend.open()
+
+    def close(self):
+        return self.backend.close()
+
+    def send_messages(self, email_messages):
+        messages = list(email_messages)
+        started = time.perf_counter()
+        sent = 0
+        try:
+            sent = self.backend.send_messages(messages) or 0
+            return sent
+        finally:
+            observe('studydeck_email_send_duration_seconds', (), time.perf_counter() - started)
+            if sent:
+                inc('studydeck_email_messages_total', (('result', 'sent'),), sent)
+            if len(messages) > sent:
+                inc('studydeck_email_messages_total', (('result', 'failed'),), len(messages) - sent)
+
+
+# Exposition
+
+def collect():
+    """Every process's totals added up: (counters, histograms)"""
+    flush(force=True)
+    counters = defaultdict(float)
+    histograms = {}
+    for path in metrics_dir().glob('*.json'):
+        try:
+            data = json.loads(path.read_text())
+        except (OSError, ValueError):
+            continue
+        for name, labels, value in data['counters']:
+            counters[name, tuple(map(tuple, labels))] += value
+        for name, labels, buckets, total, count in data['histograms']:
+            key = (name, tuple(map(tuple, labels)))
+            if key not in histograms:
+                histograms[key] = [[0] * len(buckets), 0.0, 0]
+            merged = histograms[key]
+            merged[0] = [a + b for a, b in zip(merged[0], buckets)]
+            merged[1] += total
+            merged[2] += count
+    return counters, histograms
+
+
+def queue_gauges():
+    """Read at scrape time, from the database"""
+    from .models import ThreadPurge
+    rows = ThreadPurge.objects.exclude(status='Done').values_list('status').annotate(count=Count('pk'))
+    return {('studydeck_thread_purges', (('status', status),)): count for status, count in rows}
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{key}="{_escape(value)}"' for key, value in pairs) + '}'
+
+
+def _number(value):
+    # Exact: :g keeps six significant digits, which counters soon outgrow.
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def render():
+    """All metrics in the Prometheus text exposition format"""
+    counters, histograms = collect()
+    gauges = queue_gauges()
+    by_name = defaultdict(list)
+    for (name, labels), value in sorted({**counters, **gauges}.items()):
+        by_name[name].append(f'{name}{_labels(labels)} {_number(value)}')
+    for (name, labels), (buckets, total, count) in sorted(histograms.items()):
+        cumulative = 0
+        for bound, n in zip(DURATION_BUCKETS, buckets):
+            cumulative += n
+            by_name[name].append(f'{name}_bucket{_labels(labels, [("le", f"{bound:g}")])} {cumulative}')
+        by_name[name].append(f'{name}_bucket{_labels(labels, [("le", "+Inf")])} {count}')
+        by_name[name].append(f'{name}_sum{_labels(labels)} {_number(total)}')
+        by_name[name].append(f'{name}_count{_labels(labels)} {count}')
+
+    lines = []
+    for name, (kind, help_text) in METRICS.items():
+        lines += [f'# HELP {name} {help_text}', f'# TYPE {name} {kind}']
+        lines += by_name.get(name, [])
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,59 @@
+# Generated by Django 5.2.8 on 2026-10-19 01:32
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('forum', '0004_thread_soft_delete_and_purge_queue'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReplyArchive',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('content', models.TextField()),
+                ('content_html', models.TextField(blank=True)),
+                ('upvoter_ids', models.JSONField(blank=True, default=list)),
+                ('created_at', models.DateTimeField()),
+                ('deleted_at', models.DateTimeField(blank=True, null=True)),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name_plural': 'Archived replies',
+                'ordering': ['-archived_at'],
+            },
+        ),
+        migrations.AddField(
+            model_name='reply',
+            name='deleted_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='reply',
+            index=models.Index(condition=models.Q(('is_deleted', False)), fields=['thread', 'created_at'], name='reply_live_thread_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='reply',
+            index=models.Index(condition=models.Q(('is_deleted', False)), fields=['author', '-created_at'], name='reply_live_author_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='reply',
+            index=models.Index(condition=models.Q(('is_deleted', True)), fields=['deleted_at'], name='reply_deleted_idx'),
+        ),
+        migrations.AddField(
+            model_name='replyarchive',
+            name='author',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_replies', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='replyarchive',
+            name='thread',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_replies', to='forum.thread'),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.8 on 2026-10-19 01:34
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('forum', '0005_reply_archive_and_partial_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserStats',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('thread_count', models.IntegerField(default=0)),
+                ('reply_count', models.IntegerField(default=0)),
+                ('upvotes_received', models.IntegerField(default=0)),
+                ('karma', models.IntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name_plural': 'User stats',
+                'indexes': [models.Index(fields=['-karma', 'user'], name='userstats_karma_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.8 on 2026-10-19 01:36
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('forum', '0006_user_stats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RelatedThread',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('score', models.FloatField()),
+                ('related', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='forum.thread')),
+                ('thread', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='related_links', to='forum.thread')),
+            ],
+            options={
+                'ordering': ['-score'],
+                'indexes': [models.Index(fields=['thread', '-score'], name='relatedthread_lookup_idx')],
+                'unique_together': {('thread', 'related')},
+            },
+        ),
+    ]
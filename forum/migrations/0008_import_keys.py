@@ -0,0 +1,39 @@
+# Generated by Django 5.2.8 on 2026-10-19 01:40
+
+from django.db import migrations, models
+
+
+def merge_duplicate_resources(apps, schema_editor):
+    """Keep the oldest resource per link and point threads at it"""
+    Resource = apps.get_model('forum', 'Resource')
+    Thread = apps.get_model('forum', 'Thread')
+    duplicates = (
+        Resource.objects.values('link')
+        .annotate(n=models.Count('pk'), keep=models.Min('pk'))
+        .filter(n__gt=1)
+    )
+    for row in duplicates:
+        extra = Resource.objects.filter(link=row['link']).exclude(pk=row['keep'])
+        Thread.objects.filter(resource__in=extra).update(resource_id=row['keep'])
+        extra.delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('forum', '0007_related_threads'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='thread',
+            name='legacy_id',
+            field=models.CharField(blank=True, editable=False, max_length=64, null=True, unique=True),
+        ),
+        migrations.RunPython(merge_duplicate_resources, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='resource',
+            name='link',
+            field=models.URLField(unique=True),
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.2.8 on 2026-10-19 01:44
+
+from django.db import migrations, models
+
+
+def add_resource_title_trigram_index(apps, schema_editor):
+    # Serves title__icontains in resource autocomplete; PostgreSQL only.
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(
+        'CREATE INDEX IF NOT EXISTS resource_title_trgm_idx '
+        'ON forum_resource USING gin (UPPER(title) gin_trgm_ops)'
+    )
+
+
+def drop_resource_title_trigram_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('DROP INDEX IF EXISTS resource_title_trgm_idx')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('forum', '0008_import_keys'),
+        ('forum', '0002_enable_pg_trgm'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='course',
+            index=models.Index(fields=['code'], name='course_code_prefix_idx', opclasses=['varchar_pattern_ops']),
+        ),
+        migrations.AddIndex(
+            model_name='tag',
+            index=models.Index(fields=['name'], name='tag_name_prefix_idx', opclasses=['varchar_pattern_ops']),
+        ),
+        migrations.RunPython(add_resource_title_trigram_index, drop_resource_title_trigram_index),
+    ]
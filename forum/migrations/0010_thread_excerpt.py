@@ -0,0 +1,18 @@
+# Generated by Django 5.2.8 on 2026-10-19 01:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('forum', '0009_autocomplete_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='thread',
+            name='excerpt',
+            field=models.CharField(blank=True, editable=False, max_length=300),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.8 on 2026-10-19 01:48
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('forum', '0010_thread_excerpt'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ThreadViewSketch',
+            fields=[
+                ('thread', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='view_sketch', serialize=False, to='forum.thread')),
+                ('registers', models.BinaryField()),
+            ],
+        ),
+        migrations.AddField(
+            model_name='thread',
+            name='unique_viewers',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='thread',
+            name='view_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+    ]
@@ -0,0 +1,65 @@
+# Generated by Django 5.2.8 on 2026-10-19 01:53
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('forum', '0012_activity_rollups'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedThread',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('semester', models.CharField(db_index=True, max_length=10)),
+                ('title', models.CharField(max_length=255)),
+                ('content', models.TextField()),
+                ('content_html', models.TextField(blank=True)),
+                ('excerpt', models.CharField(blank=True, max_length=300)),
+                ('tag_names', models.CharField(blank=True, max_length=500)),
+                ('upvoter_ids', models.JSONField(blank=True, default=list)),
+                ('upvote_count', models.PositiveIntegerField(default=0)),
+                ('reply_count', models.PositiveIntegerField(default=0)),
+                ('view_count', models.PositiveIntegerField(default=0)),
+                ('unique_viewers', models.PositiveIntegerField(default=0)),
+                ('legacy_id', models.CharField(blank=True, max_length=64, null=True, unique=True)),
+                ('created_at', models.DateTimeField()),
+                ('updated_at', models.DateTimeField()),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+                ('author', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_threads', to=settings.AUTH_USER_MODEL)),
+                ('category', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_threads', to='forum.category')),
+                ('course', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='archived_threads', to='forum.course')),
+                ('resource', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='archived_threads', to='forum.resource')),
+            ],
+            options={
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.CreateModel(
+            name='ArchivedReply',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('content', models.TextField()),
+                ('content_html', models.TextField(blank=True)),
+                ('is_deleted', models.BooleanField(default=False)),
+                ('deleted_at', models.DateTimeField(blank=True, null=True)),
+                ('upvoter_ids', models.JSONField(blank=True, default=list)),
+                ('upvote_count', models.PositiveIntegerField(default=0)),
+                ('created_at', models.DateTimeField()),
+                ('updated_at', models.DateTimeField()),
+                ('author', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_thread_replies', to=settings.AUTH_USER_MODEL)),
+                ('thread', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='replies', to='forum.archivedthread')),
+            ],
+            options={
+                'verbose_name_plural': 'Archived thread replies',
+                'ordering': ['created_at'],
+                'indexes': [models.Index(fields=['thread', 'created_at'], name='forum_archi_thread__7394d2_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,43 @@
+from django.db import migrations
+
+
+# Kept in step with THREAD_SEARCH_VECTOR and REPLY_SEARCH_VECTOR in
+# forum/admin.py: a search only uses the index if it builds the same vector.
+SEARCH_INDEXES = [
+    ('thread', 'thread_search_idx', ('title', 'content')),
+    ('reply', 'reply_search_idx', ('content',)),
+]
+
+
+def _indexes(apps):
+    from django.contrib.postgres.indexes import GinIndex
+    from django.contrib.postgres.search import SearchVector
+
+    for model_name, name, fields in SEARCH_INDEXES:
+        yield apps.get_model('forum', model_name), GinIndex(SearchVector(*fields, config='english'), name=name)
+
+
+def add_search_indexes(apps, schema_editor):
+    # Full-text indexes for admin search; PostgreSQL only.
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for model, index in _indexes(apps):
+        schema_editor.add_index(model, index)
+
+
+def drop_search_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for model, index in _indexes(apps):
+        schema_editor.remove_index(model, index)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('forum', '0013_thread_archive'),
+    ]
+
+    operations = [
+        migrations.RunPython(add_search_indexes, drop_search_indexes),
+    ]
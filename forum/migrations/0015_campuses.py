@@ -0,0 +1,60 @@
+# Generated by Django 5.2.8 on 2026-10-19 01:59
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+CAMPUS_DOMAINS = {
+    'pilani.bits-pilani.ac.in': 'pilani',
+    'goa.bits-pilani.ac.in': 'goa',
+    'hyderabad.bits-pilani.ac.in': 'hyderabad',
+}
+
+
+def backfill_campuses(apps, schema_editor):
+    UserProfile = apps.get_model('forum', 'UserProfile')
+    Thread = apps.get_model('forum', 'Thread')
+    for campus_domain, campus in CAMPUS_DOMAINS.items():
+        UserProfile.objects.filter(user__email__iendswith=f'@{campus_domain}').update(campus=campus)
+        UserProfile.objects.filter(campus='', bits_email__iendswith=f'@{campus_domain}').update(campus=campus)
+    Thread.objects.update(campus=Coalesce(Subquery(
+        UserProfile.objects.filter(user_id=OuterRef('author_id')).values('campus')[:1]
+    ), Value('')))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('forum', '0014_admin_search_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='archivedthread',
+            name='campus',
+            field=models.CharField(blank=True, choices=[('pilani', 'Pilani'), ('goa', 'Goa'), ('hyderabad', 'Hyderabad')], max_length=10),
+        ),
+        migrations.AddField(
+            model_name='category',
+            name='campus',
+            field=models.CharField(blank=True, choices=[('pilani', 'Pilani'), ('goa', 'Goa'), ('hyderabad', 'Hyderabad')], max_length=10),
+        ),
+        migrations.AddField(
+            model_name='thread',
+            name='campus',
+            field=models.CharField(blank=True, choices=[('pilani', 'Pilani'), ('goa', 'Goa'), ('hyderabad', 'Hyderabad')], max_length=10),
+        ),
+        migrations.AddField(
+            model_name='userprofile',
+            name='campus',
+            field=models.CharField(blank=True, choices=[('pilani', 'Pilani'), ('goa', 'Goa'), ('hyderabad', 'Hyderabad')], max_length=10),
+        ),
+        migrations.AddIndex(
+            model_name='thread',
+            index=models.Index(condition=models.Q(('is_deleted', False)), fields=['campus', '-created_at'], name='thread_live_campus_idx'),
+        ),
+        migrations.RunPython(backfill_campuses, migrations.RunPython.noop),
+    ]
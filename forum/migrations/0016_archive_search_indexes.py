@@ -0,0 +1,41 @@
+from django.db import migrations
+
+
+# search_archive filters with icontains, which PostgreSQL runs as
+# UPPER(column::text) LIKE UPPER(...); trigram indexes on the same
+# expressions answer it without reading the whole archive.
+ARCHIVE_SEARCH_INDEXES = [
+    ('archivedthread_title_trgm_idx', 'title'),
+    ('archivedthread_content_trgm_idx', 'content'),
+    ('archivedthread_tags_trgm_idx', 'tag_names'),
+]
+
+
+def add_archive_search_indexes(apps, schema_editor):
+    # PostgreSQL only; other databases keep scanning the archive.
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for name, column in ARCHIVE_SEARCH_INDEXES:
+        schema_editor.execute(
+            f'CREATE INDEX IF NOT EXISTS {name} '
+            f'ON forum_archivedthread USING gin (UPPER({column}) gin_trgm_ops)'
+        )
+
+
+def drop_archive_search_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for name, _ in ARCHIVE_SEARCH_INDEXES:
+        schema_editor.execute(f'DROP INDEX IF EXISTS {name}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('forum', '0015_campuses'),
+        ('forum', '0002_enable_pg_trgm'),
+    ]
+
+    operations = [
+        migrations.RunPython(add_archive_search_indexes, drop_archive_search_indexes),
+    ]
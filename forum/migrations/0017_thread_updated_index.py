@@ -0,0 +1,19 @@
+# Generated by Django 5.2.8 on 2026-10-19 02:24
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('forum', '0016_archive_search_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='thread',
+            index=models.Index(fields=['updated_at'], name='thread_updated_idx'),
+        ),
+    ]
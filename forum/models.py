@@ -2,6 +2,7 @@ from django.db import models
 from django.contrib.auth.models import User
 from django.utils.text import slugify
 from django.urls import reverse
+from .campuses import CAMPUS_CHOICES, CampusQuerySet
 
 
 class UserProfile(models.Model):
@@ -11,6 +12,7 @@ class UserProfile(models.Model):
     image = models.URLField(blank=True, null=True)
     bits_email = models.EmailField(unique=True, null=True, blank=True)
     is_moderator = models.BooleanField(default=False)
+    campus = models.CharField(max_length=10, choices=CAMPUS_CHOICES, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -21,6 +23,25 @@ class UserProfile(models.Model):
         return reverse('forum:user_profile', kwargs={'user_id': self.user.id})
 
 
+class UserStats(models.Model):
+    """Per-user activity counters, kept up to date incrementally by forum.stats"""
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name='stats')
+    thread_count = models.IntegerField(default=0)
+    reply_count = models.IntegerField(default=0)
+    upvotes_received = models.IntegerField(default=0)
+    karma = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name_plural = "User stats"
+        indexes = [
+            models.Index(fields=['-karma', 'user'], name='userstats_karma_idx'),
+        ]
+
+    def __str__(self):
+        return f"Stats for user {self.user_id}"
+
+
 class Course(models.Model):
     """Course model representing academic courses"""
     code = models.CharField(max_length=20, unique=True)
@@ -30,6 +51,11 @@ class Course(models.Model):
 
     class Meta:
         ordering = ['code']
+        indexes = [
+            # Prefix (LIKE 'CS F1%') lookups for autocomplete; the unique
+            # index alone cannot serve them outside the C collation.
+            models.Index(fields=['code'], name='course_code_prefix_idx', opclasses=['varchar_pattern_ops']),
+        ]
 
     def __str__(self):
         return f"{self.code} - {self.title}"
@@ -45,7 +71,7 @@ class Resource(models.Model):
 
     title = models.CharField(max_length=255)
     resource_type = models.CharField(max_length=10, choices=RESOURCE_TYPES)
-    link = models.URLField()
+    link = models.URLField(unique=True)
     course = models.ForeignKey(Course, on_delete=models.CASCADE, related_name='resources', null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
@@ -58,6 +84,8 @@ class Category(models.Model):
     name = models.CharField(max_length=100, unique=True)
     slug = models.SlugField(max_length=100, unique=True, blank=True)
     description = models.TextField(blank=True)
+    # Blank for categories shared by every campus.
+    campus = models.CharField(max_length=10, choices=CAMPUS_CHOICES, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
     class Meta:
@@ -84,6 +112,9 @@ class Tag(models.Model):
 
     class Meta:
         ordering = ['name']
+        indexes = [
+            models.Index(fields=['name'], name='tag_name_prefix_idx', opclasses=['varchar_pattern_ops']),
+        ]
 
     def save(self, *args, **kwargs):
         if not self.slug:
@@ -99,24 +130,41 @@ class Thread(models.Model):
     title = models.CharField(max_length=255)
     content = models.TextField()
     content_html = models.TextField(blank=True, editable=False)
+    # Plain-text start of content_html for list pages, so they never load the full text
+    excerpt = models.CharField(max_length=300, blank=True, editable=False)
     author = models.ForeignKey(User, on_delete=models.CASCADE, related_name='threads')
     category = models.ForeignKey(Category, on_delete=models.CASCADE, related_name='threads')
     course = models.ForeignKey(Course, on_delete=models.SET_NULL, null=True, blank=True, related_name='threads')
     resource = models.ForeignKey(Resource, on_delete=models.SET_NULL, null=True, blank=True, related_name='threads')
+    campus = models.CharField(max_length=10, choices=CAMPUS_CHOICES, blank=True)
     is_locked = models.BooleanField(default=False)
+    is_deleted = models.BooleanField(default=False)
+    # Written by `manage.py flush_view_counts` from the buffered counters in forum.viewcounts
+    view_count = models.PositiveIntegerField(default=0, editable=False)
+    unique_viewers = models.PositiveIntegerField(default=0, editable=False)
+    # Id of the thread on the old forum, for threads brought in by import_forum_data
+    legacy_id = models.CharField(max_length=64, unique=True, null=True, blank=True, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = CampusQuerySet.as_manager()
+
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['campus', '-created_at'], condition=models.Q(is_deleted=False), name='thread_live_campus_idx'),
+            # Deleted threads included: the duplicate index syncs deletions too.
+            models.Index(fields=['updated_at'], name='thread_updated_idx'),
+        ]
 
     def __str__(self):
         return self.title
 
     def save(self, *args, **kwargs):
-        from .utils import render_markdown
+        from .utils import render_markdown, make_excerpt
         if self.content:
             self.content_html = render_markdown(self.content)
+        self.excerpt = make_excerpt(self.content_html)
         super().save(*args, **kwargs)
 
     def get_absolute_url(self):
@@ -129,11 +177,43 @@ class Thread(models.Model):
         return self.upvotes.count()
 
 
+class RelatedThread(models.Model):
+    """Precomputed nearest neighbour of a thread by TF-IDF cosine similarity"""
+    thread = models.ForeignKey(Thread, on_delete=models.CASCADE, related_name='related_links')
+    related = models.ForeignKey(Thread, on_delete=models.CASCADE, related_name='+')
+    score = models.FloatField()
+
+    objects = CampusQuerySet.as_manager()
+
+    class Meta:
+        ordering = ['-score']
+        unique_together = ['thread', 'related']
+        indexes = [
+            models.Index(fields=['thread', '-score'], name='relatedthread_lookup_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.thread_id} -> {self.related_id} ({self.score:.2f})"
+
+
+class ThreadViewSketch(models.Model):
+    """HyperLogLog registers of a thread's distinct viewers, merged on each view flush"""
+    thread = models.OneToOneField(Thread, on_delete=models.CASCADE, primary_key=True, related_name='view_sketch')
+    registers = models.BinaryField()
+
+    objects = CampusQuerySet.as_manager()
+
+    def __str__(self):
+        return f"View sketch for thread {self.thread_id}"
+
+
 class ThreadTag(models.Model):
     """Many-to-many relationship between Threads and Tags"""
     thread = models.ForeignKey(Thread, on_delete=models.CASCADE, related_name='thread_tags')
     tag = models.ForeignKey(Tag, on_delete=models.CASCADE, related_name='thread_tags')
 
+    objects = CampusQuerySet.as_manager()
+
     class Meta:
         unique_together = ['thread', 'tag']
 
@@ -148,12 +228,22 @@ class Reply(models.Model):
     content = models.TextField()
     content_html = models.TextField(blank=True, editable=False)
     is_deleted = models.BooleanField(default=False)
+    deleted_at = models.DateTimeField(null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = CampusQuerySet.as_manager()
+
     class Meta:
         ordering = ['created_at']
         verbose_name_plural = "Replies"
+        # Live reply queries always filter is_deleted=False, so index only those
+        # rows; soft-deleted ones are found by the archiver through their own index.
+        indexes = [
+            models.Index(fields=['thread', 'created_at'], condition=models.Q(is_deleted=False), name='reply_live_thread_idx'),
+            models.Index(fields=['author', '-created_at'], condition=models.Q(is_deleted=False), name='reply_live_author_idx'),
+            models.Index(fields=['deleted_at'], condition=models.Q(is_deleted=True), name='reply_deleted_idx'),
+        ]
 
     def __str__(self):
         return f"Reply by {self.author.username} on {self.thread.title}"
@@ -168,6 +258,29 @@ class Reply(models.Model):
         return self.upvotes.count()
 
 
+class ReplyArchive(models.Model):
+    """Soft-deleted reply moved out of the live Reply table after the retention period"""
+    # Keeps the original Reply primary key so a restore puts it back unchanged.
+    id = models.BigIntegerField(primary_key=True)
+    thread = models.ForeignKey(Thread, on_delete=models.CASCADE, related_name='archived_replies')
+    author = models.ForeignKey(User, on_delete=models.CASCADE, related_name='archived_replies')
+    content = models.TextField()
+    content_html = models.TextField(blank=True)
+    upvoter_ids = models.JSONField(default=list, blank=True)
+    created_at = models.DateTimeField()
+    deleted_at = models.DateTimeField(null=True, blank=True)
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    objects = CampusQuerySet.as_manager()
+
+    class Meta:
+        ordering = ['-archived_at']
+        verbose_name_plural = "Archived replies"
+
+    def __str__(self):
+        return f"Archived reply {self.id} on thread {self.thread_id}"
+
+
 class Upvote(models.Model):
     """Upvote/Like system for threads and replies"""
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='upvotes')
@@ -175,6 +288,8 @@ class Upvote(models.Model):
     reply = models.ForeignKey(Reply, on_delete=models.CASCADE, related_name='upvotes', null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    objects = CampusQuerySet.as_manager()
+
     class Meta:
         unique_together = [
             ['user', 'thread'],
@@ -212,6 +327,8 @@ class Report(models.Model):
     resolved_at = models.DateTimeField(null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    objects = CampusQuerySet.as_manager()
+
     class Meta:
         ordering = ['-created_at']
         constraints = [
@@ -227,3 +344,150 @@ class Report(models.Model):
     def __str__(self):
         content = self.thread.title if self.thread else f"Reply {self.reply.id}"
         return f"Report on {content} by {self.reporter.username}"
+
+
+class ThreadPurge(models.Model):
+    """Queued hard-delete of a thread, carried out in batches by purge_threads"""
+    STATUS_CHOICES = [
+        ('Pending', 'Pending'),
+        ('Running', 'Running'),
+        ('Done', 'Done'),
+        ('Failed', 'Failed'),
+    ]
+
+    # Plain id rather than a foreign key: the row must outlive the thread it purges.
+    thread_id = models.BigIntegerField(unique=True)
+    thread_title = models.CharField(max_length=255)
+    requested_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='thread_purges')
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='Pending')
+    rows_deleted = models.PositiveIntegerField(default=0)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['created_at']
+
+    def __str__(self):
+        return f"Purge of thread {self.thread_id} ({self.status})"
+
+
+class ActivityRollup(models.Model):
+    """Counts of threads, replies and upvotes created on one day"""
+    day = models.DateField()
+    threads = models.PositiveIntegerField(default=0)
+    replies = models.PositiveIntegerField(default=0)
+    upvotes = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        abstract = True
+
+
+class DailyCategoryActivity(ActivityRollup):
+    category = models.ForeignKey(Category, on_delete=models.CASCADE, related_name='daily_activity')
+
+    class Meta:
+        unique_together = ['day', 'category']
+        verbose_name_plural = "Daily category activity"
+
+    def __str__(self):
+        return f"{self.category_id} on {self.day}"
+
+
+class DailyCourseActivity(ActivityRollup):
+    course = models.ForeignKey(Course, on_delete=models.CASCADE, related_name='daily_activity')
+
+    class Meta:
+        unique_together = ['day', 'course']
+        verbose_name_plural = "Daily course activity"
+
+    def __str__(self):
+        return f"{self.course_id} on {self.day}"
+
+
+class DailyUserActivity(ActivityRollup):
+    """Per-user counts; upvotes are the ones the user's posts received"""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='daily_activity')
+
+    class Meta:
+        unique_together = ['day', 'user']
+        verbose_name_plural = "Daily user activity"
+
+    def __str__(self):
+        return f"{self.user_id} on {self.day}"
+
+
+class RollupWatermark(models.Model):
+    """Highest primary key of a source table already folded into the rollups"""
+    source = models.CharField(max_length=20, unique=True)
+    last_id = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.source} up to {self.last_id}"
+
+
+class ArchivedThread(models.Model):
+    """Locked thread from a past semester moved out of the live tables"""
+    # Keeps the original Thread primary key so links and search results still resolve.
+    id = models.BigIntegerField(primary_key=True)
+    semester = models.CharField(max_length=10, db_index=True)
+    campus = models.CharField(max_length=10, choices=CAMPUS_CHOICES, blank=True)
+    title = models.CharField(max_length=255)
+    content = models.TextField()
+    content_html = models.TextField(blank=True)
+    excerpt = models.CharField(max_length=300, blank=True)
+    author = models.ForeignKey(User, on_delete=models.CASCADE, related_name='archived_threads')
+    category = models.ForeignKey(Category, on_delete=models.CASCADE, related_name='archived_threads')
+    course = models.ForeignKey(Course, on_delete=models.SET_NULL, null=True, blank=True, related_name='archived_threads')
+    resource = models.ForeignKey(Resource, on_delete=models.SET_NULL, null=True, blank=True, related_name='archived_threads')
+    tag_names = models.CharField(max_length=500, blank=True)
+    upvoter_ids = models.JSONField(default=list, blank=True)
+    upvote_count = models.PositiveIntegerField(default=0)
+    reply_count = models.PositiveIntegerField(default=0)
+    view_count = models.PositiveIntegerField(default=0)
+    unique_viewers = models.PositiveIntegerField(default=0)
+    legacy_id = models.CharField(max_length=64, unique=True, null=True, blank=True)
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    objects = CampusQuerySet.as_manager()
+
+    class Meta:
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"{self.title} ({self.semester})"
+
+    @property
+    def tags(self):
+        return self.tag_names.split(',') if self.tag_names else []
+
+
+class ArchivedReply(models.Model):
+    """Reply of an archived thread, including ones that had been deleted"""
+    id = models.BigIntegerField(primary_key=True)
+    thread = models.ForeignKey(ArchivedThread, on_delete=models.CASCADE, related_name='replies')
+    author = models.ForeignKey(User, on_delete=models.CASCADE, related_name='archived_thread_replies')
+    content = models.TextField()
+    content_html = models.TextField(blank=True)
+    is_deleted = models.BooleanField(default=False)
+    deleted_at = models.DateTimeField(null=True, blank=True)
+    upvoter_ids = models.JSONField(default=list, blank=True)
+    upvote_count = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+
+    objects = CampusQuerySet.as_manager()
+
+    class Meta:
+        ordering = ['created_at']
+        verbose_name_plural = "Archived thread replies"
+        indexes = [
+            models.Index(fields=['thread', 'created_at']),
+        ]
+
+    def __str__(self):
+        return f"Archived reply {self.id} on thread {self.thread_id}"
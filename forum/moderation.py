@@ -0,0 +1,73 @@
+"""
+Bulk moderation actions that run as a single UPDATE.
+
+The admin actions call these instead of saving rows one by one. update()
+sends no signals, so each function does once, for the whole set, what the
+per-row signals and views would have done: rebuild the affected users'
+stats and drop the cached hubs, thread cards, snapshots and search results.
+"""
+from django.utils import timezone
+from .models import Thread, Reply
+from .stats import rebuild_user_stats
+from .courses import invalidate_course_hub
+from .summaries import invalidate_thread_summaries
+from .snapshots import unlink_thread as unlink_thread_snapshots
+from .search import bump_generation as bump_search_generation
+
+
+def _refresh_threads(rows):
+    """rows: (thread id, course id, category id) of the threads that changed"""
+    invalidate_thread_summaries([pk for pk, _, _ in rows])
+    for course_id in {course_id for _, course_id, _ in rows}:
+        invalidate_course_hub(course_id)
+    for pk, _, category_id in rows:
+        unlink_thread_snapshots(pk, category_id)
+    if rows:
+        bump_search_generation()
+
+
+def set_threads_locked(queryset, locked):
+    """Lock or unlock the threads in queryset; returns the number changed"""
+    queryset = queryset.filter(is_locked=not locked)
+    rows = list(queryset.values_list('pk', 'course_id', 'category_id'))
+    changed = Thread.objects.filter(pk__in=[pk for pk, _, _ in rows]).update(
+        is_locked=locked, updated_at=timezone.now(),
+    )
+    _refresh_threads(rows)
+    return changed
+
+
+def soft_delete_threads(queryset):
+    """Hide the threads in queryset; returns the number hidden"""
+    rows = list(queryset.filter(is_deleted=False).values_list('pk', 'course_id', 'category_id'))
+    ids = [pk for pk, _, _ in rows]
+    # Replies in a hidden thread stop counting towards their authors too.
+    affected_users = set(Thread.objects.filter(pk__in=ids).values_list('author_id', flat=True))
+    affected_users.update(
+        Reply.objects.filter(thread_id__in=ids, is_deleted=False).values_list('author_id', flat=True).distinct()
+    )
+    changed = Thread.objects.filter(pk__in=ids).update(is_deleted=True, updated_at=timezone.now())
+    rebuild_user_stats(affected_users)
+    _refresh_threads(rows)
+    return changed
+
+
+def soft_delete_replies(queryset):
+    """Soft-delete the replies in queryset; returns the number deleted"""
+    queryset = queryset.filter(is_deleted=False)
+    ids = list(queryset.values_list('pk', flat=True))
+    affected_users = set(queryset.values_list('author_id', flat=True).distinct())
+    rows = list(Thread.objects.filter(replies__in=ids).distinct().values_list('pk', 'course_id', 'category_id'))
+    now = timezone.now()
+    # updated_at moves too, which retires the replies' cached fragments.
+    changed = Reply.objects.filter(pk__in=ids).update(is_deleted=True, deleted_at=now, updated_at=now)
+    rebuild_user_stats(affected_users)
+    _refresh_threads(rows)
+    return changed
+
+
+def resolve_reports(queryset, user):
+    """Mark the pending reports in queryset resolved by user"""
+    return queryset.filter(status='Pending').update(
+        status='Resolved', resolved_by=user, resolved_at=timezone.now(),
+    )
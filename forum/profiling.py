@@ -0,0 +1,168 @@
+"""
+Sampling profiler for slow requests.
+
+A request is profiled when a staff user sends `X-Profile: 1`, or, with
+PROFILE_SLOW_MS set, when it is one of the PROFILE_SAMPLE_RATE share of
+requests watched at a coarser interval and turns out slower than that.
+One sampler thread per process reads the stacks of the requests being
+profiled from sys._current_frames(); requests that are not profiled only
+cost a settings check and a random number.
+
+Each profile is written to PROFILE_SPOOL_DIR as collapsed stacks ("a;b;c
+count" lines, what flamegraph.pl and speedscope read) under `# key: value`
+lines with the request's details. `manage.py profile_report` sums them up.
+"""
+import os
+import random
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from pathlib import Path
+from django.conf import settings
+from django.utils import timezone
+
+
+HEADER = 'X-Profile'
+
+
+class Profile:
+    def __init__(self, interval):
+        self.interval = interval
+        self.due = time.monotonic() + interval
+        self.stacks = Counter()
+
+
+_profiles = {}
+_lock = threading.Lock()
+_wake = threading.Event()
+_sampler_pid = None
+
+
+def _frame_name(frame):
+    return f'{frame.f_globals.get("__name__", "?")}:{frame.f_code.co_name}'
+
+
+def _collapse(frame):
+    names = []
+    while frame is not None:
+        names.append(_frame_name(frame))
+        frame = frame.f_back
+    return ';'.join(reversed(names))
+
+
+def _sample_forever():
+    while True:
+        with _lock:
+            active = list(_profiles.items())
+        if not active:
+            _wake.wait()
+            _wake.clear()
+            continue
+        now = time.monotonic()
+        due = [(ident, profile) for ident, profile in active if profile.due <= now]
+        if due:
+            frames = sys._current_frames()
+            for ident, profile in due:
+                frame = frames.get(ident)
+                if frame is not None:
+                    profile.stacks[_collapse(frame)] += 1
+                profile.due = now + profile.interval
+        time.sleep(max(0.0, min(profile.due for _, profile in active) - time.monotonic()))
+
+
+def _ensure_sampler():
+    global _sampler_pid
+    # Threads do not survive fork, so each worker starts its own.
+    if _sampler_pid != os.getpid():
+        _sampler_pid = os.getpid()
+        threading.Thread(target=_sample_forever, name='forum-profiler', daemon=True).start()
+
+
+def start(interval):
+    ident = threading.get_ident()
+    profile = Profile(interval)
+    with _lock:
+        _ensure_sampler()
+        _profiles[ident] = profile
+    _wake.set()
+    return profile
+
+
+def stop():
+    with _lock:
+        return _profiles.pop(threading.get_ident(), None)
+
+
+def write(profile, meta):
+    """Spool the profile; returns its path"""
+    spool = Path(settings.PROFILE_SPOOL_DIR)
+    spool.mkdir(parents=True, exist_ok=True)
+    stamp = timezone.now().strftime('%Y%m%dT%H%M%S')
+    path = spool / f'{stamp}-{os.getpid()}-{uuid.uuid4().hex[:8]}.folded'
+    lines = [f'# {key}: {value}' for key, value in meta.items()]
+    lines += [f'{stack} {count}' for stack, count in profile.stacks.most_common()]
+    tmp = path.with_suffix('.tmp')
+    tmp.write_text('\n'.join(lines) + '\n')
+    os.replace(tmp, path)
+    return path
+
+
+def read(path):
+    """(meta, stacks) of a spooled profile"""
+    meta, stacks = {}, Counter()
+    with open(path) as f:
+        for line in f:
+            line = line.rstrip('\n')
+            if line.startswith('# '):
+                key, _, value = line[2:].partition(': ')
+                meta[key] = value
+            elif line:
+                stack, _, count = line.rpartition(' ')
+                stacks[stack] += int(count)
+    return meta, stacks
+
+
+class ProfilerMiddleware:
+    """Profile requests asked for by staff, and a sample of the slow ones"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def _trigger(self, request):
+        if request.headers.get(HEADER) and request.user.is_staff:
+            return 'header', settings.PROFILE_INTERVAL_MS
+        if settings.PROFILE_SLOW_MS and random.random() < settings.PROFILE_SAMPLE_RATE:
+            return 'slow', settings.PROFILE_SLOW_INTERVAL_MS
+        return None, None
+
+    def __call__(self, request):
+        trigger, interval_ms = self._trigger(request)
+        if trigger is None:
+            return self.get_response(request)
+
+        started = time.perf_counter()
+        profile = start(interval_ms / 1000)
+        try:
+            response = self.get_response(request)
+        finally:
+            stop()
+        elapsed_ms = (time.perf_counter() - started) * 1000
+
+        if profile.stacks and (trigger == 'header' or elapsed_ms >= settings.PROFILE_SLOW_MS):
+            match = request.resolver_match
+            write(profile, {
+                'view': match.view_name if match else '<unresolved>',
+                'method': request.method,
+                'path': request.get_full_path(),
+                'status': response.status_code,
+                'duration_ms': round(elapsed_ms, 1),
+                'trigger': trigger,
+                'interval_ms': interval_ms,
+                'samples': sum(profile.stacks.values()),
+                'user': request.user.pk or '',
+                'pid': os.getpid(),
+                'time': timezone.now().isoformat(),
+            })
+        return response
@@ -0,0 +1,138 @@
+from django.conf import settings
+from django.db import router, transaction
+from django.utils import timezone
+from .models import (
+    Thread, Reply, ReplyArchive, Upvote, Report, ThreadTag, ThreadPurge, RelatedThread, ThreadViewSketch
+)
+from .stats import rebuild_user_stats
+from .courses import invalidate_course_hub
+from .summaries import invalidate_thread_summaries
+from .snapshots import unlink_thread as unlink_thread_snapshots
+from .search import bump_generation as bump_search_generation
+
+
+# Rows that reference a reply or a thread, in the order they have to go.
+# Anything added here is deleted before its parent, without signals.
+REPLY_DEPENDENTS = [
+    (Upvote, 'reply_id'),
+    (Report, 'reply_id'),
+]
+
+THREAD_DEPENDENTS = [
+    (Upvote, 'thread_id'),
+    (Report, 'thread_id'),
+    (ThreadTag, 'thread_id'),
+    (ReplyArchive, 'thread_id'),
+    (RelatedThread, 'thread_id'),
+    (ThreadViewSketch, 'thread_id'),
+    (RelatedThread, 'related_id'),
+]
+
+
+def _raw_delete_ids(model, ids):
+    """Issue a single DELETE ... WHERE id IN (...) bypassing the collector"""
+    if not ids:
+        return 0
+    using = router.db_for_write(model)
+    with transaction.atomic(using=using):
+        return model.objects.filter(pk__in=ids)._raw_delete(using) or 0
+
+
+def _delete_in_batches(queryset, batch_size, progress=None, label=''):
+    """Delete rows matching queryset in primary key chunks of batch_size"""
+    deleted = 0
+    while True:
+        ids = list(queryset.order_by('pk').values_list('pk', flat=True)[:batch_size])
+        if not ids:
+            return deleted
+        deleted += _raw_delete_ids(queryset.model, ids)
+        if progress:
+            progress(label, deleted)
+
+
+def purge_thread(thread_id, batch_size=None, progress=None):
+    """
+    Hard-delete a thread and everything hanging off it in bounded batches.
+
+    Replies are removed a batch at a time together with their own votes and
+    reports, then the thread's votes, reports and tags, and finally the thread.
+    Returns the total number of rows deleted.
+    """
+    batch_size = batch_size or settings.THREAD_PURGE_BATCH_SIZE
+    deleted = 0
+
+    reply_ids_qs = Reply.objects.filter(thread_id=thread_id).order_by('pk').values_list('pk', flat=True)
+    while True:
+        reply_ids = list(reply_ids_qs[:batch_size])
+        if not reply_ids:
+            break
+        for model, field in REPLY_DEPENDENTS:
+            deleted += _delete_in_batches(
+                model.objects.filter(**{f'{field}__in': reply_ids}), batch_size
+            )
+        deleted += _raw_delete_ids(Reply, reply_ids)
+        if progress:
+            progress('replies', deleted)
+
+    for model, field in THREAD_DEPENDENTS:
+        deleted += _delete_in_batches(
+            model.objects.filter(**{field: thread_id}), batch_size
+        )
+        if progress:
+            progress(model._meta.verbose_name_plural, deleted)
+
+    deleted += _raw_delete_ids(Thread, [thread_id])
+    if progress:
+        progress('thread', deleted)
+    return deleted
+
+
+def queue_thread_purge(thread, user=None):
+    """Hide a thread immediately and queue it for batched hard deletion"""
+    Thread.objects.filter(pk=thread.pk).update(is_deleted=True, updated_at=timezone.now())
+    thread.is_deleted = True
+    # update() sends no post_save, so drop the cached pages that list the thread.
+    invalidate_course_hub(thread.course_id)
+    invalidate_thread_summaries([thread.pk])
+    unlink_thread_snapshots(thread.pk, thread.category_id)
+    bump_search_generation()
+    purge, created = ThreadPurge.objects.get_or_create(
+        thread_id=thread.pk,
+        defaults={'thread_title': thread.title[:255], 'requested_by': user},
+    )
+    return purge
+
+
+def run_purge(purge, batch_size=None, progress=None):
+    """Carry out a queued purge, recording progress on the ThreadPurge row"""
+    purge.status = 'Running'
+    purge.started_at = purge.started_at or timezone.now()
+    purge.error = ''
+    purge.save(update_fields=['status', 'started_at', 'error'])
+
+    def record(label, count):
+        ThreadPurge.objects.filter(pk=purge.pk).update(rows_deleted=count)
+        if progress:
+            progress(label, count)
+
+    # Raw deletes skip the signals that keep UserStats current, so note whose
+    # counters this thread contributes to and rebuild them once it is gone.
+    affected_users = set(
+        Reply.objects.filter(thread_id=purge.thread_id).values_list('author_id', flat=True).distinct()
+    )
+    affected_users.update(Thread.objects.filter(pk=purge.thread_id).values_list('author_id', flat=True))
+
+    try:
+        purge.rows_deleted = purge_thread(purge.thread_id, batch_size=batch_size, progress=record)
+    except Exception as e:
+        purge.status = 'Failed'
+        purge.error = str(e)
+        purge.save(update_fields=['status', 'error'])
+        raise
+
+    rebuild_user_stats(affected_users)
+
+    purge.status = 'Done'
+    purge.finished_at = timezone.now()
+    purge.save(update_fields=['status', 'rows_deleted', 'finished_at'])
+    return purge
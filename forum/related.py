@@ -0,0 +1,278 @@
+"""
+Offline "related threads" recommendations.
+
+Threads are turned into TF-IDF vectors over their title, content and tags
+with SciPy sparse matrices, and each thread's top-k most similar threads in
+the same block (category or course) are stored in RelatedThread so that
+thread_detail needs a single indexed lookup. The vocabulary and IDF weights
+of the last full build are saved to RELATED_THREADS_MODEL_PATH so that new
+threads can be added later without rebuilding the whole matrix.
+"""
+import json
+import os
+import tempfile
+from collections import Counter, defaultdict
+
+import numpy as np
+from scipy import sparse
+from django.conf import settings
+from django.db import transaction
+from .models import Thread, ThreadTag, RelatedThread
+from .utils import tokenize
+
+
+# Title words and tags say more about a thread than body text does.
+TITLE_WEIGHT = 2
+TAG_WEIGHT = 2
+
+# Rows of the similarity matrix computed at once; bounds the dense scratch
+# space to ROW_CHUNK x block size floats.
+ROW_CHUNK = 256
+
+
+def thread_terms(title, content, tags):
+    """Bag of terms for one thread, with title and tag terms up-weighted"""
+    terms = Counter(tokenize(content))
+    for term in tokenize(title):
+        terms[term] += TITLE_WEIGHT
+    for tag in tags:
+        terms[f'tag:{tag.lower()}'] += TAG_WEIGHT
+    return terms
+
+
+def block_key(thread, block_by):
+    if block_by == 'course' and thread['course_id']:
+        return ('course', thread['course_id'])
+    return ('category', thread['category_id'])
+
+
+def _load_threads(queryset):
+    """Thread rows with their tag names, as plain dicts"""
+    threads = list(queryset.filter(is_deleted=False).order_by('pk').values(
+        'pk', 'title', 'content', 'category_id', 'course_id'
+    ))
+    tags = defaultdict(list)
+    ids = [t['pk'] for t in threads]
+    for start in range(0, len(ids), 5000):
+        chunk = ids[start:start + 5000]
+        for thread_id, name in ThreadTag.objects.filter(thread_id__in=chunk).values_list('thread_id', 'tag__name'):
+            tags[thread_id].append(name)
+    for thread in threads:
+        thread['tags'] = tags[thread['pk']]
+    return threads
+
+
+def _count_matrix(bags, vocabulary):
+    """Sparse documents x terms matrix of raw counts for terms in the vocabulary"""
+    rows, cols, data = [], [], []
+    for row, bag in enumerate(bags):
+        for term, count in bag.items():
+            col = vocabulary.get(term)
+            if col is not None:
+                rows.append(row)
+                cols.append(col)
+                data.append(count)
+    return sparse.csr_matrix(
+        (np.asarray(data, dtype=np.float32), (np.asarray(rows, dtype=np.int64), np.asarray(cols, dtype=np.int64))),
+        shape=(len(bags), len(vocabulary)),
+    )
+
+
+def _tfidf(counts, idf):
+    """Sublinear TF times IDF, L2-normalised per row"""
+    X = counts.tocsr(copy=True)
+    X.data = np.log1p(X.data) * idf[X.indices]
+    norms = np.sqrt(np.asarray(X.multiply(X).sum(axis=1)).ravel())
+    norms[norms == 0] = 1.0
+    return sparse.diags(1.0 / norms) @ X
+
+
+def _top_k(query, block, k, exclude=None):
+    """
+    For each row of `query`, the k most similar rows of `block`.
+
+    Returns a list of (block_indices, scores) per query row. `exclude` maps a
+    query row to a block row that must be skipped (the thread itself).
+    """
+    results = []
+    for start in range(0, query.shape[0], ROW_CHUNK):
+        sims = (query[start:start + ROW_CHUNK] @ block.T).toarray()
+        if exclude is not None:
+            for offset in range(sims.shape[0]):
+                own = exclude.get(start + offset)
+                if own is not None:
+                    sims[offset, own] = 0.0
+        kk = min(k, sims.shape[1])
+        if kk == 0:
+            results.extend(([], []) for _ in range(sims.shape[0]))
+            continue
+        top = np.argpartition(-sims, kk - 1, axis=1)[:, :kk]
+        top_scores = np.take_along_axis(sims, top, axis=1)
+        order = np.argsort(-top_scores, axis=1)
+        top = np.take_along_axis(top, order, axis=1)
+        top_scores = np.take_along_axis(top_scores, order, axis=1)
+        results.extend(zip(top, top_scores))
+    return results
+
+
+def save_model(vocabulary, idf, max_thread_id, block_by, path=None):
+    path = path or settings.RELATED_THREADS_MODEL_PATH
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    terms = sorted(vocabulary, key=vocabulary.get)
+    payload = {
+        'terms': terms,
+        'idf': idf.tolist(),
+        'max_thread_id': max_thread_id,
+        'block_by': block_by,
+    }
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+    with os.fdopen(fd, 'w') as f:
+        json.dump(payload, f)
+    os.replace(tmp, path)
+
+
+def load_model(path=None):
+    path = path or settings.RELATED_THREADS_MODEL_PATH
+    with open(path) as f:
+        payload = json.load(f)
+    vocabulary = {term: i for i, term in enumerate(payload['terms'])}
+    return vocabulary, np.asarray(payload['idf'], dtype=np.float32), payload['max_thread_id'], payload['block_by']
+
+
+def build_related_threads(top_k=5, block_by='category', min_score=0.05, progress=None):
+    """
+    Full rebuild: fit the vocabulary over every live thread, then replace all
+    RelatedThread rows block by block. Returns the number of rows written.
+    """
+    threads = _load_threads(Thread.objects.all())
+    if not threads:
+        return 0
+
+    bags = [thread_terms(t['title'], t['content'], t['tags']) for t in threads]
+    document_frequency = Counter()
+    for bag in bags:
+        document_frequency.update(bag.keys())
+    # Terms seen in a single thread cannot link any two threads being fitted.
+    vocabulary = {}
+    for term, df in document_frequency.items():
+        if df > 1:
+            vocabulary[term] = len(vocabulary)
+
+    counts = _count_matrix(bags, vocabulary)
+    df = np.bincount(counts.indices, minlength=len(vocabulary)).astype(np.float32)
+    n_docs = len(threads)
+    idf = (np.log((1 + n_docs) / (1 + df)) + 1).astype(np.float32)
+    X = _tfidf(counts, idf)
+
+    blocks = defaultdict(list)
+    for row, thread in enumerate(threads):
+        blocks[block_key(thread, block_by)].append(row)
+
+    written = 0
+    with transaction.atomic():
+        RelatedThread.objects.all().delete()
+        for key, rows in blocks.items():
+            if len(rows) < 2:
+                continue
+            X_block = X[rows]
+            exclude = {i: i for i in range(len(rows))}
+            links = []
+            for i, (neighbours, scores) in enumerate(_top_k(X_block, X_block, top_k, exclude)):
+                for j, score in zip(neighbours, scores):
+                    if score >= min_score:
+                        links.append(RelatedThread(
+                            thread_id=threads[rows[i]]['pk'],
+                            related_id=threads[rows[j]]['pk'],
+                            score=float(score),
+                        ))
+            RelatedThread.objects.bulk_create(links, batch_size=1000)
+            written += len(links)
+            if progress:
+                progress(key, written)
+
+    save_model(vocabulary, idf, threads[-1]['pk'], block_by)
+    return written
+
+
+def update_related_threads(top_k=5, min_score=0.05, progress=None):
+    """
+    Incremental update for threads created since the last build.
+
+    New threads are vectorised with the saved vocabulary and IDF weights and
+    compared only against their own block. Each new thread gets its top-k
+    list, and is added to an existing thread's list when it beats that
+    thread's weakest neighbour. Returns the number of new threads processed.
+    """
+    vocabulary, idf, max_thread_id, block_by = load_model()
+    new_threads = _load_threads(Thread.objects.filter(pk__gt=max_thread_id))
+    if not new_threads:
+        return 0
+
+    by_block = defaultdict(list)
+    for thread in new_threads:
+        by_block[block_key(thread, block_by)].append(thread)
+
+    for (kind, block_id), fresh in by_block.items():
+        block_threads = _load_threads(Thread.objects.filter(**{f'{kind}_id': block_id}))
+        if block_by == 'course' and kind == 'category':
+            block_threads = [t for t in block_threads if not t['course_id']]
+        if len(block_threads) < 2:
+            continue
+        position = {t['pk']: i for i, t in enumerate(block_threads)}
+        X_block = _tfidf(_count_matrix(
+            [thread_terms(t['title'], t['content'], t['tags']) for t in block_threads], vocabulary
+        ), idf)
+        fresh_rows = [position[t['pk']] for t in fresh if t['pk'] in position]
+        X_fresh = X_block[fresh_rows]
+        exclude = {i: row for i, row in enumerate(fresh_rows)}
+
+        # Forward links for the new threads.
+        links = []
+        for i, (neighbours, scores) in enumerate(_top_k(X_fresh, X_block, top_k, exclude)):
+            for j, score in zip(neighbours, scores):
+                if score >= min_score:
+                    links.append(RelatedThread(
+                        thread_id=block_threads[fresh_rows[i]]['pk'],
+                        related_id=block_threads[j]['pk'],
+                        score=float(score),
+                    ))
+
+        # Reverse links: existing threads that the new ones now rank for.
+        # Each thread's current list holds (score, existing pk or pending key).
+        sims = (X_block @ X_fresh.T).tocoo()
+        fresh_ids = {t['pk'] for t in fresh}
+        candidate_ids = {block_threads[r]['pk'] for r in sims.row} - fresh_ids
+        current = defaultdict(list)
+        for link in RelatedThread.objects.filter(thread_id__in=candidate_ids).values('pk', 'thread_id', 'score'):
+            current[link['thread_id']].append((link['score'], ('db', link['pk'])))
+        pending = {}
+        stale_link_ids = []
+        for row, col, score in zip(sims.row, sims.col, sims.data):
+            thread_id = block_threads[row]['pk']
+            related_id = block_threads[fresh_rows[col]]['pk']
+            if thread_id in fresh_ids or score < min_score:
+                continue
+            existing = current[thread_id]
+            if len(existing) >= top_k:
+                weakest = min(existing, key=lambda entry: entry[0])
+                if weakest[0] >= score:
+                    continue
+                existing.remove(weakest)
+                kind_, ref = weakest[1]
+                if kind_ == 'db':
+                    stale_link_ids.append(ref)
+                else:
+                    pending.pop(ref, None)
+            key = (thread_id, related_id)
+            existing.append((float(score), ('new', key)))
+            pending[key] = RelatedThread(thread_id=thread_id, related_id=related_id, score=float(score))
+        links.extend(pending.values())
+
+        with transaction.atomic():
+            RelatedThread.objects.filter(pk__in=stale_link_ids).delete()
+            RelatedThread.objects.bulk_create(links, batch_size=1000, ignore_conflicts=True)
+        if progress:
+            progress((kind, block_id), len(fresh))
+
+    save_model(vocabulary, idf, new_threads[-1]['pk'], block_by)
+    return len(new_threads)
@@ -0,0 +1,112 @@
+from datetime import timedelta
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models import Q, Exists, OuterRef
+from django.utils import timezone
+from .models import Reply, ReplyArchive, Upvote, Report
+from .purge import _raw_delete_ids
+from .stats import rebuild_user_stats
+from .summaries import invalidate_thread_summaries
+
+
+def archivable_replies(days=None):
+    """Soft-deleted replies past the retention period that are safe to move"""
+    days = settings.REPLY_ARCHIVE_AFTER_DAYS if days is None else days
+    cutoff = timezone.now() - timedelta(days=days)
+    return Reply.objects.filter(
+        Q(deleted_at__lt=cutoff) | Q(deleted_at__isnull=True, updated_at__lt=cutoff),
+        is_deleted=True,
+    ).exclude(
+        # Replies under a report stay where moderators can reach them.
+        Exists(Report.objects.filter(reply=OuterRef('pk')))
+    )
+
+
+def archive_deleted_replies(days=None, batch_size=500, progress=None):
+    """
+    Move soft-deleted replies older than `days` into ReplyArchive in batches.
+
+    Each batch copies the replies (and the ids of users who upvoted them) into
+    the archive and then deletes the originals and their votes in one
+    transaction. Returns the number of replies archived.
+    """
+    queryset = archivable_replies(days).order_by('pk')
+    archived = 0
+    while True:
+        with transaction.atomic():
+            replies = list(queryset.values(
+                'pk', 'thread_id', 'author_id', 'content', 'content_html',
+                'created_at', 'deleted_at', 'updated_at',
+            )[:batch_size])
+            if not replies:
+                return archived
+            ids = [r['pk'] for r in replies]
+
+            upvoters = {}
+            for reply_id, user_id in Upvote.objects.filter(reply_id__in=ids).values_list('reply_id', 'user_id'):
+                upvoters.setdefault(reply_id, []).append(user_id)
+
+            ReplyArchive.objects.bulk_create([
+                ReplyArchive(
+                    id=r['pk'],
+                    thread_id=r['thread_id'],
+                    author_id=r['author_id'],
+                    content=r['content'],
+                    content_html=r['content_html'],
+                    upvoter_ids=upvoters.get(r['pk'], []),
+                    created_at=r['created_at'],
+                    deleted_at=r['deleted_at'] or r['updated_at'],
+                )
+                for r in replies
+            ], ignore_conflicts=True)
+
+            _raw_delete_ids(Upvote, list(Upvote.objects.filter(reply_id__in=ids).values_list('pk', flat=True)))
+            _raw_delete_ids(Reply, ids)
+
+        archived += len(ids)
+        if progress:
+            progress(archived)
+
+
+def restore_replies(archives):
+    """Put archived replies back into the live Reply table, undeleted"""
+    archives = list(archives)
+    if not archives:
+        return 0
+
+    with transaction.atomic():
+        replies = [
+            Reply(
+                id=a.id,
+                thread_id=a.thread_id,
+                author_id=a.author_id,
+                content=a.content,
+                content_html=a.content_html,
+                is_deleted=False,
+            )
+            for a in archives
+        ]
+        # bulk_create skips save(), so markdown is not re-rendered and no
+        # reply notification goes out, but auto_now_add still stamps
+        # created_at; put the original timestamps back afterwards.
+        Reply.objects.bulk_create(replies)
+        for reply, archive in zip(replies, archives):
+            reply.created_at = archive.created_at
+        Reply.objects.bulk_update(replies, ['created_at'])
+
+        user_ids = {uid for a in archives for uid in a.upvoter_ids}
+        existing_users = set(User.objects.filter(pk__in=user_ids).values_list('pk', flat=True))
+        Upvote.objects.bulk_create([
+            Upvote(user_id=uid, reply_id=a.id)
+            for a in archives
+            for uid in a.upvoter_ids
+            if uid in existing_users
+        ], ignore_conflicts=True)
+
+        ReplyArchive.objects.filter(pk__in=[a.id for a in archives]).delete()
+        rebuild_user_stats({a.author_id for a in archives})
+    # bulk_create sends no signals, so the reply counts are refreshed here.
+    invalidate_thread_summaries({a.thread_id for a in archives})
+
+    return len(archives)
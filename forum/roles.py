@@ -0,0 +1,70 @@
+import time
+from django.conf import settings
+from django.core.cache import cache
+from .models import UserProfile
+from .utils import cache_is_shared
+
+
+SESSION_KEY = '_forum_role'
+VERSION_KEY = 'forum:role-version:{}'
+
+
+def _role_version(user_id):
+    return cache.get(VERSION_KEY.format(user_id), 0)
+
+
+def invalidate_role(user_id):
+    """Make every session of this user re-read the moderator flag"""
+    key = VERSION_KEY.format(user_id)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, 1, None)
+
+
+def is_moderator(request):
+    """
+    Whether the requesting user is a moderator.
+
+    Resolved at most once per request; the answer is also kept in the session
+    together with the user's role version, which the UserProfile signals bump,
+    so most requests never touch the profile table. ROLE_CACHE_SECONDS bounds
+    how long a session entry is trusted if the version key is evicted.
+    Without a shared cache a bump only reaches one process, so the flag is
+    then read from the profile on every request.
+    """
+    if hasattr(request, '_forum_is_moderator'):
+        return request._forum_is_moderator
+
+    user = getattr(request, 'user', None)
+    if user is None or not user.is_authenticated:
+        request._forum_is_moderator = False
+        return False
+
+    session = getattr(request, 'session', None) if cache_is_shared() else None
+    version = _role_version(user.pk)
+    cached = session.get(SESSION_KEY) if session is not None else None
+    if (
+        cached
+        and cached.get('user_id') == user.pk
+        and cached.get('version') == version
+        and time.time() - cached.get('checked_at', 0) < settings.ROLE_CACHE_SECONDS
+    ):
+        value = cached['is_moderator']
+    else:
+        value = UserProfile.objects.filter(user_id=user.pk, is_moderator=True).exists()
+        if session is not None:
+            session[SESSION_KEY] = {
+                'user_id': user.pk,
+                'version': version,
+                'is_moderator': value,
+                'checked_at': time.time(),
+            }
+
+    request._forum_is_moderator = value
+    return value
+
+
+def can_modify(request, obj):
+    """Authors may change their own content, moderators anyone's"""
+    return obj.author_id == request.user.pk or is_moderator(request)
@@ -0,0 +1,127 @@
+"""
+Daily activity rollups for the moderator dashboard.
+
+`manage.py rollup_activity` reads Thread, Reply and Upvote rows past each
+table's watermark in primary key ranges, counts them per day with grouped
+queries and adds the counts to DailyCategoryActivity, DailyCourseActivity
+and DailyUserActivity. The dashboard reads only those tables.
+
+Rows are counted once, when they are first rolled up: the rollups record
+activity as it happened and do not shrink when content is deleted later.
+"""
+from collections import Counter
+from datetime import timedelta
+from django.db import transaction
+from django.db.models import Count, F, Max
+from django.db.models.functions import Coalesce, TruncDate
+from django.utils import timezone
+from .models import (
+    Thread, Reply, Upvote, DailyCategoryActivity, DailyCourseActivity, DailyUserActivity, RollupWatermark,
+)
+
+
+CHUNK_SIZE = 50000
+
+# Rows newer than this are left for the next run, so that transactions still
+# in flight when a run starts cannot commit a lower id behind the watermark.
+SETTLE_SECONDS = 60
+
+TARGETS = [
+    (DailyCategoryActivity, 'category_id'),
+    (DailyCourseActivity, 'course_id'),
+    (DailyUserActivity, 'user_id'),
+]
+
+
+def _sources():
+    """source name -> (queryset, counter field, {target key: expression})"""
+    return {
+        'thread': (Thread.objects.all(), 'threads', {
+            'category_id': F('category_id'),
+            'course_id': F('course_id'),
+            'user_id': F('author_id'),
+        }),
+        'reply': (Reply.objects.all(), 'replies', {
+            'category_id': F('thread__category_id'),
+            'course_id': F('thread__course_id'),
+            'user_id': F('author_id'),
+        }),
+        'upvote': (Upvote.objects.all(), 'upvotes', {
+            'category_id': Coalesce('thread__category_id', 'reply__thread__category_id'),
+            'course_id': Coalesce('thread__course_id', 'reply__thread__course_id'),
+            'user_id': Coalesce('thread__author_id', 'reply__author_id'),
+        }),
+    }
+
+
+def _settled_max_id(queryset, after):
+    cutoff = timezone.now() - timedelta(seconds=SETTLE_SECONDS)
+    return queryset.filter(pk__gt=after, created_at__lt=cutoff).aggregate(top=Max('pk'))['top']
+
+
+def _add_counts(model, key_field, counter, counts):
+    """Add {(day, key): n} onto the rollup rows, creating missing ones"""
+    if not counts:
+        return
+    days = {day for day, _ in counts}
+    keys = {key for _, key in counts}
+    existing = {
+        (row.day, getattr(row, key_field)): row
+        for row in model.objects.filter(day__in=days, **{f'{key_field}__in': keys})
+    }
+    rows = []
+    for (day, key), n in counts.items():
+        row = existing.get((day, key)) or model(day=day, **{key_field: key})
+        setattr(row, counter, getattr(row, counter) + n)
+        rows.append(row)
+    model.objects.bulk_create(
+        rows, batch_size=1000,
+        update_conflicts=True,
+        unique_fields=['day', key_field],
+        update_fields=['threads', 'replies', 'upvotes'],
+    )
+
+
+def rollup_source(name, chunk_size=CHUNK_SIZE, progress=None):
+    """Fold one source table into the rollups up to its settled maximum id"""
+    queryset, counter, dimensions = _sources()[name]
+    watermark, _ = RollupWatermark.objects.get_or_create(source=name)
+    upper = _settled_max_id(queryset, watermark.last_id)
+    if upper is None:
+        return 0
+
+    processed = 0
+    while watermark.last_id < upper:
+        low, high = watermark.last_id, min(watermark.last_id + chunk_size, upper)
+        chunk = queryset.filter(pk__gt=low, pk__lte=high).annotate(day=TruncDate('created_at'))
+        with transaction.atomic():
+            # Serialises concurrent runs: the second waits, then sees the new watermark.
+            watermark = RollupWatermark.objects.select_for_update().get(pk=watermark.pk)
+            if watermark.last_id != low:
+                continue
+            for model, key_field in TARGETS:
+                counts = Counter()
+                rows = chunk.annotate(key=dimensions[key_field]).values('day', 'key').annotate(n=Count('pk'))
+                for row in rows:
+                    if row['key'] is not None:
+                        counts[(row['day'], row['key'])] += row['n']
+                _add_counts(model, key_field, counter, counts)
+            watermark.last_id = high
+            watermark.save(update_fields=['last_id', 'updated_at'])
+        processed = high
+        if progress:
+            progress(name, high, upper)
+    return processed
+
+
+def rollup_activity(chunk_size=CHUNK_SIZE, progress=None):
+    """Bring every rollup up to date; returns {source: highest id folded in}"""
+    return {name: rollup_source(name, chunk_size, progress) for name in _sources()}
+
+
+def reset_rollups():
+    """Empty the rollups and watermarks so the next run rebuilds them from scratch"""
+    with transaction.atomic():
+        for model, _ in TARGETS:
+            model.objects.all().delete()
+        RollupWatermark.objects.all().delete()
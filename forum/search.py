@@ -0,0 +1,278 @@
+"""
+Thread search with a cache of ranked results.
+
+Queries are normalized first and run in that form: case and whitespace
+are folded and stopwords trimmed from both ends, so "The Midsem  paper"
+and "midsem paper" share one cache entry and match a superset of what the
+original phrase did. Stopwords inside the query and the token order are
+kept: the title/content/tag match is a phrase match, "midsem of cs" is not
+"midsem cs" and "cs f111" is not "f111 cs".
+
+Facet filters (category, course, tag, resource type, answer status) are
+applied in the same queries, so they narrow the candidates before they are
+ranked. The ranked ids of every match, live threads first and archived
+ones after, are cached per normalized query, filters and campus, together
+with the facet counts over them; those come from one UNION of grouped
+queries over the ids. Pages slice the id list and the view hydrates them
+with get_summaries.
+
+Cache keys carry a generation number that any change to threads or tags
+bumps; SEARCH_CACHE_SECONDS is the backstop for changes made behind its
+back, such as raw SQL.
+"""
+import hashlib
+import time
+from urllib.parse import urlencode
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import Q, F, Case, When, Value, Exists, OuterRef, Count, CharField
+from django.utils.text import slugify
+from .models import Resource, Tag, Thread, ThreadTag, Reply, ArchivedThread, ArchivedReply
+from .campuses import campus_filter
+from .utils import STOPWORDS
+
+
+GENERATION_KEY = 'forum:search-generation'
+RESULTS_KEY = 'forum:search:{}:{}:{}'
+
+FACETS = [
+    ('category', 'Category'),
+    ('course', 'Course'),
+    ('tag', 'Tag'),
+    ('resource_type', 'Resource type'),
+    ('status', 'Answers'),
+]
+STATUS_CHOICES = [
+    # No reply is ever marked accepted; one that others upvoted is the closest.
+    ('answered', 'Has upvoted answers'),
+    ('unanswered', 'Unanswered'),
+]
+FACET_VALUES_SHOWN = 10
+# Candidate ids per facet-count query, below the databases' parameter limits.
+FACET_CHUNK_SIZE = 5000
+
+
+def normalize_query(query):
+    """'  The Midsem PAPER of ' -> 'midsem paper'"""
+    tokens = query.casefold().split()
+    start, end = 0, len(tokens)
+    while start < end and tokens[start] in STOPWORDS:
+        start += 1
+    while end > start and tokens[end - 1] in STOPWORDS:
+        end -= 1
+    # A query of nothing but stopwords is searched as typed.
+    return ' '.join(tokens[start:end] or tokens)
+
+
+def generation():
+    value = cache.get(GENERATION_KEY)
+    if value is None:
+        # Start from the clock, so that a lost counter never comes back to
+        # a number that older cached results were stored under.
+        cache.add(GENERATION_KEY, int(time.time() * 1000), None)
+        value = cache.get(GENERATION_KEY, 0)
+    return value
+
+
+def bump_generation():
+    """Retire every cached result; call when threads or tags change"""
+    try:
+        cache.incr(GENERATION_KEY)
+    except ValueError:
+        generation()
+
+
+def parse_filters(params):
+    """The facet filters in a query dict; unknown choices are dropped"""
+    filters = {name: params.get(name, '').strip() for name, _ in FACETS}
+    if filters['resource_type'] not in dict(Resource.RESOURCE_TYPES):
+        filters['resource_type'] = ''
+    if filters['status'] not in dict(STATUS_CHOICES):
+        filters['status'] = ''
+    return {name: value for name, value in filters.items() if value}
+
+
+def _live_status():
+    replies = Reply.objects.filter(thread=OuterRef('pk'), is_deleted=False)
+    return Case(
+        When(Exists(replies.filter(upvotes__isnull=False)), then=Value('answered')),
+        When(~Exists(replies), then=Value('unanswered')),
+        default=Value(''),
+        output_field=CharField(),
+    )
+
+
+def _archived_status():
+    return Case(
+        When(Exists(ArchivedReply.objects.filter(thread=OuterRef('pk'), is_deleted=False, upvote_count__gt=0)),
+             then=Value('answered')),
+        When(reply_count=0, then=Value('unanswered')),
+        default=Value(''),
+        output_field=CharField(),
+    )
+
+
+def _common_filters(queryset, filters):
+    if 'category' in filters:
+        queryset = queryset.filter(category__slug=filters['category'])
+    if 'course' in filters:
+        queryset = queryset.filter(course__code=filters['course'])
+    if 'resource_type' in filters:
+        queryset = queryset.filter(resource__resource_type=filters['resource_type'])
+    return queryset
+
+
+def filter_live(threads, filters):
+    threads = _common_filters(threads, filters)
+    if 'tag' in filters:
+        threads = threads.filter(thread_tags__tag__slug=filters['tag'])
+    if 'status' in filters:
+        threads = threads.annotate(answer_status=_live_status()).filter(answer_status=filters['status'])
+    return threads
+
+
+def filter_archived(archived, filters):
+    archived = _common_filters(archived, filters)
+    if 'tag' in filters:
+        # The archive keeps tag names, comma-separated, not tag rows.
+        name = Tag.objects.filter(slug=filters['tag']).values_list('name', flat=True).first()
+        if name is None:
+            return archived.none()
+        archived = archived.filter(
+            Q(tag_names=name) | Q(tag_names__startswith=f'{name},') |
+            Q(tag_names__endswith=f',{name}') | Q(tag_names__contains=f',{name},')
+        )
+    if 'status' in filters:
+        archived = archived.annotate(answer_status=_archived_status()).filter(answer_status=filters['status'])
+    return archived
+
+
+def load_thread_ids(query, campus='', filters=None):
+    """
+    Ids of the live and of the archived threads matching an already
+    normalized query and the filters, each best first
+    """
+    # Imported here: archiving bumps the generation, so archive imports us.
+    from .archive import search_archive
+
+    filters = filters or {}
+    threads = filter_live(Thread.objects.filter(is_deleted=False, **campus_filter(campus)), filters)
+    text_match = (
+        Q(title__icontains=query) |
+        Q(content__icontains=query) |
+        Q(thread_tags__tag__name__icontains=query)
+    )
+    if connection.vendor == 'postgresql':
+        from django.contrib.postgres.search import TrigramSimilarity
+
+        threads = threads.annotate(
+            title_similarity=TrigramSimilarity('title', query),
+            content_similarity=TrigramSimilarity('content', query),
+        ).filter(
+            Q(title_similarity__gt=0.1) | Q(content_similarity__gt=0.1) | text_match
+        ).distinct().order_by('-title_similarity', '-content_similarity', '-created_at')
+    else:
+        threads = threads.filter(text_match).distinct().order_by('-created_at')
+
+    # Threads from past semesters live in the archive; they follow the live matches.
+    archived = filter_archived(search_archive(query, campus), filters)
+    return list(threads.values_list('pk', flat=True)), list(archived.values_list('pk', flat=True))
+
+
+# Every part of the facet query returns these columns, so they can be UNIONed.
+FACET_COLUMNS = ['category', 'category_name', 'course', 'resource_type', 'status', 'tag', 'tag_name', 'tag_names']
+
+
+def _grouped(queryset, **columns):
+    """queryset grouped by the given columns (field names or expressions)"""
+    names = {column: f'facet_{column}' for column in FACET_COLUMNS}
+    expressions = {
+        column: F(value) if isinstance(value, str) else value for column, value in columns.items()
+    }
+    return queryset.annotate(**{
+        names[column]: expressions.get(column, Value(None, output_field=CharField()))
+        for column in FACET_COLUMNS
+    }).values(*names.values()).annotate(facet_count=Count('pk')).values_list(
+        *names.values(), 'facet_count',
+    ).order_by()
+
+
+def count_facets(live_ids, archived_ids):
+    """{facet: {value: [label, count]}} over the given threads"""
+    counts = {name: {} for name, _ in FACETS}
+
+    def add(facet, value, label, n):
+        if value:
+            entry = counts[facet].setdefault(value, [label or value, 0])
+            entry[1] += n
+
+    for offset in range(0, max(len(live_ids), len(archived_ids)), FACET_CHUNK_SIZE):
+        live = live_ids[offset:offset + FACET_CHUNK_SIZE]
+        archived = archived_ids[offset:offset + FACET_CHUNK_SIZE]
+        parts = []
+        if live:
+            parts.append(_grouped(
+                Thread.objects.filter(pk__in=live),
+                category='category__slug', category_name='category__name', course='course__code',
+                resource_type='resource__resource_type', status=_live_status(),
+            ))
+            parts.append(_grouped(ThreadTag.objects.filter(thread_id__in=live), tag='tag__slug', tag_name='tag__name'))
+        if archived:
+            parts.append(_grouped(
+                ArchivedThread.objects.filter(pk__in=archived),
+                category='category__slug', category_name='category__name', course='course__code',
+                resource_type='resource__resource_type', status=_archived_status(), tag_names='tag_names',
+            ))
+        rows = parts[0].union(*parts[1:], all=True) if len(parts) > 1 else parts[0]
+        for category, category_name, course, resource_type, status, tag, tag_name, tag_names, n in rows:
+            add('category', category, category_name, n)
+            add('course', course, course, n)
+            add('resource_type', resource_type, resource_type, n)
+            add('status', status, dict(STATUS_CHOICES).get(status), n)
+            add('tag', tag, tag_name, n)
+            for name in filter(None, (tag_names or '').split(',')):
+                add('tag', slugify(name), name, n)
+    return counts
+
+
+def search_threads(query, campus='', filters=None):
+    """
+    (ranked ids, facet counts) of the threads matching query and filters,
+    from the cache when possible
+    """
+    query = normalize_query(query)
+    if not query:
+        return [], {name: {} for name, _ in FACETS}
+    filters = filters or {}
+    signature = '\n'.join([query] + [f'{name}={filters[name]}' for name in sorted(filters)])
+    digest = hashlib.md5(signature.encode()).hexdigest()
+    key = RESULTS_KEY.format(generation(), campus or 'all', digest)
+    cached = cache.get(key)
+    if cached is None:
+        live_ids, archived_ids = load_thread_ids(query, campus, filters)
+        cached = (live_ids + archived_ids, count_facets(live_ids, archived_ids))
+        cache.set(key, cached, settings.SEARCH_CACHE_SECONDS)
+    return cached
+
+
+def facet_choices(query, filters, counts):
+    """Facets for the search page: each value with its count and a toggle link"""
+    facets = []
+    for name, label in FACETS:
+        values = sorted(counts.get(name, {}).items(), key=lambda item: (-item[1][1], item[1][0]))
+        shown = values[:FACET_VALUES_SHOWN]
+        # A chosen value stays visible even when it is not among the top ones.
+        shown += [item for item in values[FACET_VALUES_SHOWN:] if item[0] == filters.get(name)]
+        choices = []
+        for value, (value_label, count) in shown:
+            selected = filters.get(name) == value
+            params = {'q': query, **filters}
+            if selected:
+                del params[name]
+            else:
+                params[name] = value
+            choices.append({'label': value_label, 'count': count, 'selected': selected, 'url': '?' + urlencode(params)})
+        if choices:
+            facets.append({'name': name, 'label': label, 'choices': choices})
+    return facets
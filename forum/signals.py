@@ -1,8 +1,19 @@
-from django.db.models.signals import post_save
+from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
+from django.core.cache import cache
+from django.conf import settings
 from django.contrib.auth.models import User
-from .models import UserProfile, Reply
+from .models import UserProfile, Course, Resource, Thread, Tag, ThreadTag, Reply, Upvote
 from .notifications import send_reply_notification
+from .roles import invalidate_role
+from .fragments import invalidate_author as invalidate_reply_fragments
+from .stats import bump_user_stats, upvote_target_author_id
+from .duplicates import loaded_index
+from .courses import hub_key, invalidate_course_hub
+from .summaries import invalidate_thread_summaries
+from .snapshots import unlink_thread as unlink_thread_snapshots
+from .campuses import campus_from_email
+from .search import bump_generation as bump_search_generation
 
 
 @receiver(post_save, sender=User)
@@ -12,21 +23,46 @@ def create_user_profile(sender, instance, created, **kwargs):
         UserProfile.objects.create(
             user=instance,
             full_name=instance.get_full_name() or instance.username,
-            bits_email=instance.email if instance.email else None
+            bits_email=instance.email if instance.email else None,
+            campus=campus_from_email(instance.email),
         )
 
 
 @receiver(post_save, sender=User)
-def save_user_profile(sender, instance, **kwargs):
-    """Save UserProfile when User is saved"""
-    if hasattr(instance, 'profile'):
-        instance.profile.save()
-    else:
-        UserProfile.objects.create(
-            user=instance,
-            full_name=instance.get_full_name() or instance.username,
-            bits_email=instance.email if instance.email else None
-        )
+def save_user_profile(sender, instance, created, update_fields=None, **kwargs):
+    """Backfill a missing UserProfile when an existing User is saved"""
+    # Profiles are created alongside the user above, and nothing on the profile
+    # is derived from the User row, so there is nothing to re-save here. The
+    # last_login update on every sign-in is skipped without touching the table.
+    if created or (update_fields is not None and set(update_fields) <= {'last_login'}):
+        return
+    profile, created = UserProfile.objects.get_or_create(
+        user=instance,
+        defaults={
+            'full_name': instance.get_full_name() or instance.username,
+            'bits_email': instance.email if instance.email else None,
+            'campus': campus_from_email(instance.email),
+        }
+    )
+    # Social sign-ups often get their email after the user row is created.
+    if not created and not profile.campus and campus_from_email(instance.email):
+        UserProfile.objects.filter(pk=profile.pk).update(campus=campus_from_email(instance.email))
+
+
+@receiver(post_save, sender=UserProfile)
+@receiver(post_delete, sender=UserProfile)
+def invalidate_cached_role(sender, instance, **kwargs):
+    """Drop session-cached moderator flags when a profile changes"""
+    invalidate_role(instance.user_id)
+
+
+@receiver(post_save, sender=User)
+@receiver(post_save, sender=UserProfile)
+def refresh_reply_author(sender, instance, created, update_fields=None, **kwargs):
+    """Re-render cached reply fragments when their author's name may have changed"""
+    if created or (update_fields is not None and set(update_fields) <= {'last_login'}):
+        return
+    invalidate_reply_fragments(instance.pk if sender is User else instance.user_id)
 
 
 @receiver(post_save, sender=Reply)
@@ -34,3 +70,138 @@ def notify_thread_author(sender, instance, created, **kwargs):
     """Send email notification when a new reply is created"""
     if created and not instance.is_deleted:
         send_reply_notification(instance)
+
+
+@receiver(post_save, sender=Thread)
+def count_new_thread(sender, instance, created, **kwargs):
+    """Credit the author's stats for a new thread"""
+    if created and not instance.is_deleted:
+        bump_user_stats(instance.author_id, threads=1)
+
+
+@receiver(post_save, sender=Reply)
+def count_new_reply(sender, instance, created, **kwargs):
+    """Credit the author's stats for a new reply"""
+    if created and not instance.is_deleted:
+        bump_user_stats(instance.author_id, replies=1)
+
+
+@receiver(post_save, sender=Upvote)
+def count_new_upvote(sender, instance, created, **kwargs):
+    """Credit the upvoted content's author"""
+    if created:
+        bump_user_stats(upvote_target_author_id(instance), upvotes=1)
+
+
+@receiver(post_delete, sender=Upvote)
+def count_removed_upvote(sender, instance, **kwargs):
+    """Take a withdrawn upvote back off the content's author"""
+    try:
+        author_id = upvote_target_author_id(instance)
+    except (Thread.DoesNotExist, Reply.DoesNotExist):
+        return
+    bump_user_stats(author_id, upvotes=-1, create_missing=False)
+
+
+@receiver(post_delete, sender=Thread)
+def count_removed_thread(sender, instance, **kwargs):
+    """Take a hard-deleted thread off its author's stats"""
+    if not instance.is_deleted:
+        bump_user_stats(instance.author_id, threads=-1, create_missing=False)
+
+
+@receiver(post_delete, sender=Reply)
+def count_removed_reply(sender, instance, **kwargs):
+    """Take a hard-deleted live reply off its author's stats"""
+    if not instance.is_deleted:
+        bump_user_stats(instance.author_id, replies=-1, create_missing=False)
+
+
+@receiver(post_save, sender=Thread)
+def index_thread_for_duplicates(sender, instance, **kwargs):
+    """Keep this process's near-duplicate index current"""
+    index = loaded_index()
+    if index is None:
+        return
+    if instance.is_deleted:
+        index.remove(instance.pk)
+    else:
+        index.add(instance.pk, instance.title, instance.content)
+
+
+@receiver(post_save, sender=Thread)
+@receiver(post_delete, sender=Thread)
+@receiver(post_save, sender=Resource)
+@receiver(post_delete, sender=Resource)
+def refresh_course_hub(sender, instance, **kwargs):
+    """Drop the cached hub page of the course a thread or resource belongs to"""
+    invalidate_course_hub(instance.course_id)
+
+
+@receiver(post_save, sender=Reply)
+def refresh_course_hub_for_reply(sender, instance, created, **kwargs):
+    """A first reply takes a thread off its course's unanswered list"""
+    if created or instance.is_deleted:
+        invalidate_course_hub(instance.thread.course_id)
+
+
+@receiver(post_save, sender=Course)
+@receiver(post_delete, sender=Course)
+def refresh_own_course_hub(sender, instance, **kwargs):
+    cache.delete(hub_key(instance.code))
+
+
+@receiver(post_save, sender=Thread)
+@receiver(post_delete, sender=Thread)
+def refresh_thread_summary(sender, instance, **kwargs):
+    invalidate_thread_summaries([instance.pk])
+
+
+@receiver(post_save, sender=Reply)
+@receiver(post_delete, sender=Reply)
+@receiver(post_save, sender=ThreadTag)
+@receiver(post_delete, sender=ThreadTag)
+def refresh_parent_thread_summary(sender, instance, **kwargs):
+    """Reply counts and tags are part of the thread's summary"""
+    invalidate_thread_summaries([instance.thread_id])
+
+
+@receiver(post_save, sender=Upvote)
+@receiver(post_delete, sender=Upvote)
+def refresh_upvoted_thread_summary(sender, instance, **kwargs):
+    if instance.thread_id:
+        invalidate_thread_summaries([instance.thread_id])
+
+
+@receiver(post_save, sender=Thread)
+@receiver(post_delete, sender=Thread)
+def refresh_thread_snapshots(sender, instance, **kwargs):
+    """Send the thread's pages back to Django until they are republished"""
+    unlink_thread_snapshots(instance.pk, instance.category_id)
+
+
+@receiver(post_save, sender=Reply)
+@receiver(post_delete, sender=Reply)
+def refresh_replied_thread_snapshots(sender, instance, **kwargs):
+    unlink_thread_snapshots(instance.thread_id)
+
+
+@receiver(post_save, sender=Upvote)
+@receiver(post_delete, sender=Upvote)
+def refresh_upvoted_thread_snapshots(sender, instance, **kwargs):
+    if instance.thread_id:
+        unlink_thread_snapshots(instance.thread_id)
+    elif settings.SNAPSHOT_ROOT:
+        thread_id = Reply.objects.filter(pk=instance.reply_id).values_list('thread_id', flat=True).first()
+        if thread_id:
+            unlink_thread_snapshots(thread_id)
+
+
+@receiver(post_save, sender=Thread)
+@receiver(post_delete, sender=Thread)
+@receiver(post_save, sender=ThreadTag)
+@receiver(post_delete, sender=ThreadTag)
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+def refresh_search_results(sender, instance, **kwargs):
+    bump_search_generation()
@@ -0,0 +1,140 @@
+"""
+Pre-rendered anonymous pages that nginx serves without reaching Django.
+
+`manage.py publish_snapshots` renders the forum home, every category page and
+the SNAPSHOT_TOP_THREADS most viewed threads as an anonymous visitor would
+see them, and writes each as `<path>/index.html` plus a gzipped copy under
+SNAPSHOT_ROOT. Files are written to a temporary name and renamed into place,
+so nginx never serves a partial page. nginx only uses a snapshot for a plain
+GET without a query string or session cookie (see nginx.conf).
+
+When a thread, reply or vote changes, the signals unlink the affected
+snapshots straight away, so nginx falls through to Django until the next
+publish run writes them again.
+"""
+import gzip
+import os
+from pathlib import Path
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.test import RequestFactory
+from django.urls import resolve, reverse
+from .models import Category, Thread
+
+
+FILENAME = 'index.html'
+GENERATION_KEY = 'forum:snapshot-gen:{}'
+
+
+def snapshot_dir(path):
+    return Path(settings.SNAPSHOT_ROOT) / path.strip('/')
+
+
+def _generation(path):
+    return cache.get(GENERATION_KEY.format(path), 0)
+
+
+def _bump_generation(path):
+    key = GENERATION_KEY.format(path)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, 1, None)
+
+
+def _write_atomic(target, data):
+    tmp = target.with_name(f'.{target.name}.{os.getpid()}.tmp')
+    tmp.write_bytes(data)
+    os.replace(tmp, target)
+
+
+def render_anonymous(path):
+    """Render a page through its view as a logged-out visitor would get it"""
+    request = RequestFactory().get(path)
+    request.user = AnonymousUser()
+    # Lets thread_detail tell a snapshot render from a real view.
+    request.is_snapshot = True
+    match = resolve(path)
+    return match.func(request, *match.args, **match.kwargs)
+
+
+def publish(path):
+    """Write a fresh snapshot of one page; returns False if it was skipped"""
+    generation = _generation(path)
+    response = render_anonymous(path)
+    if response.status_code != 200 or response.streaming:
+        unlink(path)
+        return False
+    # Something changed while rendering: leave it for the next run.
+    if _generation(path) != generation:
+        return False
+
+    directory = snapshot_dir(path)
+    directory.mkdir(parents=True, exist_ok=True)
+    _write_atomic(directory / f'{FILENAME}.gz', gzip.compress(response.content, mtime=0))
+    _write_atomic(directory / FILENAME, response.content)
+    return True
+
+
+def unlink(path):
+    """Remove a page's snapshot so nginx sends its requests to Django again"""
+    if not settings.SNAPSHOT_ROOT:
+        return
+    _bump_generation(path)
+    directory = snapshot_dir(path)
+    # The plain file goes first: nginx only looks for the .gz once it exists.
+    for name in (FILENAME, f'{FILENAME}.gz'):
+        try:
+            (directory / name).unlink()
+        except FileNotFoundError:
+            pass
+
+
+def unlink_thread(thread_id, category_id=None):
+    """Drop the snapshots a change to a thread shows up on"""
+    if not settings.SNAPSHOT_ROOT:
+        return
+    unlink(reverse('forum:thread_detail', kwargs={'pk': thread_id}))
+    if category_id is None:
+        category_id = Thread.objects.filter(pk=thread_id).values_list('category_id', flat=True).first()
+    slug = Category.objects.filter(pk=category_id).values_list('slug', flat=True).first()
+    if slug:
+        unlink(reverse('forum:category_detail', kwargs={'slug': slug}))
+    unlink(reverse('forum:forum_home'))
+
+
+def snapshot_paths(top=None):
+    top = settings.SNAPSHOT_TOP_THREADS if top is None else top
+    paths = [reverse('forum:forum_home')]
+    paths += [
+        reverse('forum:category_detail', kwargs={'slug': slug})
+        for slug in Category.objects.values_list('slug', flat=True)
+    ]
+    paths += [
+        reverse('forum:thread_detail', kwargs={'pk': pk})
+        for pk in Thread.objects.filter(is_deleted=False).order_by('-view_count', '-pk').values_list('pk', flat=True)[:top]
+    ]
+    return paths
+
+
+def publish_snapshots(top=None, progress=None):
+    """
+    Rewrite the snapshots of the home page, categories and hottest threads,
+    and remove those that dropped out. Returns (written, removed).
+    """
+    paths = snapshot_paths(top)
+    written = 0
+    for path in paths:
+        if publish(path):
+            written += 1
+        if progress:
+            progress(path)
+
+    keep = {snapshot_dir(path) for path in paths}
+    removed = 0
+    for found in Path(settings.SNAPSHOT_ROOT).rglob(FILENAME):
+        if found.parent not in keep:
+            unlink('/' + str(found.parent.relative_to(settings.SNAPSHOT_ROOT)) + '/')
+            removed += 1
+    return written, removed
@@ -0,0 +1,110 @@
+from django.contrib.auth.models import User
+from django.db.models import Count, F, Sum
+from .models import Thread, Reply, Upvote, UserStats, ArchivedThread, ArchivedReply
+
+
+# Karma awarded per live thread, live reply and upvote received.
+THREAD_KARMA = 2
+REPLY_KARMA = 1
+UPVOTE_KARMA = 5
+
+
+def bump_user_stats(user_id, threads=0, replies=0, upvotes=0, create_missing=True):
+    """Apply counter deltas to a user's stats row in a single UPDATE"""
+    karma = threads * THREAD_KARMA + replies * REPLY_KARMA + upvotes * UPVOTE_KARMA
+    updated = UserStats.objects.filter(user_id=user_id).update(
+        thread_count=F('thread_count') + threads,
+        reply_count=F('reply_count') + replies,
+        upvotes_received=F('upvotes_received') + upvotes,
+        karma=F('karma') + karma,
+    )
+    if not updated and create_missing:
+        # No row yet (user predates the stats table): build it from scratch,
+        # which already includes the change being recorded.
+        rebuild_user_stats([user_id])
+
+
+def upvote_target_author_id(upvote):
+    """Author of the thread or reply an upvote was cast on"""
+    if upvote.thread_id:
+        return upvote.thread.author_id
+    return upvote.reply.author_id
+
+
+def reply_removed(reply):
+    """Take a soft-deleted reply and the upvotes it received off its author's stats"""
+    bump_user_stats(reply.author_id, replies=-1, upvotes=-reply.upvotes.count())
+
+
+def _grouped(queryset, field):
+    return dict(queryset.values(field).annotate(n=Count('pk')).values_list(field, 'n'))
+
+
+def _summed(queryset, field, total):
+    return dict(queryset.values(field).annotate(n=Sum(total)).values_list(field, 'n'))
+
+
+def rebuild_user_stats(user_ids=None, batch_size=1000):
+    """
+    Recompute stats rows from the Thread, Reply and Upvote tables and the
+    thread archive.
+
+    Works through users in primary key batches with one grouped query per
+    counter per batch. Returns the number of rows written.
+    """
+    users = User.objects.order_by('pk').values_list('pk', flat=True)
+    if user_ids is not None:
+        users = users.filter(pk__in=list(user_ids))
+
+    written = 0
+    last_pk = 0
+    while True:
+        batch = list(users.filter(pk__gt=last_pk)[:batch_size])
+        if not batch:
+            return written
+        last_pk = batch[-1]
+
+        threads = _grouped(Thread.objects.filter(author_id__in=batch, is_deleted=False), 'author_id')
+        replies = _grouped(
+            Reply.objects.filter(author_id__in=batch, is_deleted=False, thread__is_deleted=False),
+            'author_id',
+        )
+        thread_upvotes = _grouped(
+            Upvote.objects.filter(thread__author_id__in=batch, thread__is_deleted=False),
+            'thread__author_id',
+        )
+        reply_upvotes = _grouped(
+            Upvote.objects.filter(
+                reply__author_id__in=batch, reply__is_deleted=False, reply__thread__is_deleted=False
+            ),
+            'reply__author_id',
+        )
+        archived_threads = _grouped(ArchivedThread.objects.filter(author_id__in=batch), 'author_id')
+        archived_replies = _grouped(ArchivedReply.objects.filter(author_id__in=batch, is_deleted=False), 'author_id')
+        archived_upvotes = _summed(ArchivedThread.objects.filter(author_id__in=batch), 'author_id', 'upvote_count')
+        for user_id, n in _summed(
+            ArchivedReply.objects.filter(author_id__in=batch, is_deleted=False), 'author_id', 'upvote_count'
+        ).items():
+            archived_upvotes[user_id] = archived_upvotes.get(user_id, 0) + n
+
+        rows = []
+        for user_id in batch:
+            thread_count = threads.get(user_id, 0) + archived_threads.get(user_id, 0)
+            reply_count = replies.get(user_id, 0) + archived_replies.get(user_id, 0)
+            upvotes = (
+                thread_upvotes.get(user_id, 0) + reply_upvotes.get(user_id, 0) + archived_upvotes.get(user_id, 0)
+            )
+            rows.append(UserStats(
+                user_id=user_id,
+                thread_count=thread_count,
+                reply_count=reply_count,
+                upvotes_received=upvotes,
+                karma=thread_count * THREAD_KARMA + reply_count * REPLY_KARMA + upvotes * UPVOTE_KARMA,
+            ))
+        UserStats.objects.bulk_create(
+            rows,
+            update_conflicts=True,
+            unique_fields=['user'],
+            update_fields=['thread_count', 'reply_count', 'upvotes_received', 'karma', 'updated_at'],
+        )
+        written += len(rows)
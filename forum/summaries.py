@@ -0,0 +1,114 @@
+"""
+Cached thread "cards" shared by the list pages.
+
+A summary is a small dict with what a thread list shows: title, excerpt,
+author, category, course, counts and tags. List views run an id-only query
+for the page and call get_summaries(ids), which reads every card with one
+cache.get_many and builds the misses in bulk. Signals drop a thread's summary
+when the thread, its replies, its upvotes or its tags change.
+"""
+from collections import defaultdict
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Q
+from .models import Thread, ThreadTag, ArchivedThread
+
+
+KEY = 'forum:thread-summary:{}'
+
+
+def summary_key(thread_id):
+    return KEY.format(thread_id)
+
+
+def build_summaries(thread_ids):
+    """Summaries for the given live or archived threads, straight from the database"""
+    rows = Thread.objects.filter(pk__in=thread_ids, is_deleted=False).annotate(
+        reply_count=Count('replies', filter=Q(replies__is_deleted=False), distinct=True),
+        upvote_count=Count('upvotes', distinct=True),
+    ).values(
+        'pk', 'title', 'excerpt', 'is_locked', 'created_at', 'author_id',
+        'author__username', 'author__first_name', 'author__last_name',
+        'category__name', 'category__slug', 'course__code', 'reply_count', 'upvote_count', 'view_count',
+    )
+    tags = defaultdict(list)
+    for thread_id, name in ThreadTag.objects.filter(thread_id__in=thread_ids).order_by('tag__name').values_list('thread_id', 'tag__name'):
+        tags[thread_id].append(name)
+
+    summaries = {}
+    for row in rows:
+        full_name = f"{row['author__first_name']} {row['author__last_name']}".strip()
+        summaries[row['pk']] = {
+            'pk': row['pk'],
+            'title': row['title'],
+            'excerpt': row['excerpt'],
+            'is_locked': row['is_locked'],
+            'created_at': row['created_at'],
+            'author_id': row['author_id'],
+            'author_name': full_name or row['author__username'],
+            'category_name': row['category__name'],
+            'category_slug': row['category__slug'],
+            'course_code': row['course__code'],
+            'reply_count': row['reply_count'],
+            'upvote_count': row['upvote_count'],
+            'view_count': row['view_count'],
+            'tags': tags[row['pk']],
+            'semester': None,
+        }
+
+    # Threads moved to the cold archive keep their ids, so search results
+    # that point at them still get a card.
+    archived = ArchivedThread.objects.filter(pk__in=[pk for pk in thread_ids if pk not in summaries]).values(
+        'pk', 'title', 'excerpt', 'created_at', 'author_id',
+        'author__username', 'author__first_name', 'author__last_name',
+        'category__name', 'category__slug', 'course__code', 'reply_count', 'upvote_count', 'view_count',
+        'tag_names', 'semester',
+    )
+    for row in archived:
+        full_name = f"{row['author__first_name']} {row['author__last_name']}".strip()
+        summaries[row['pk']] = {
+            'pk': row['pk'],
+            'title': row['title'],
+            'excerpt': row['excerpt'],
+            'is_locked': True,
+            'created_at': row['created_at'],
+            'author_id': row['author_id'],
+            'author_name': full_name or row['author__username'],
+            'category_name': row['category__name'],
+            'category_slug': row['category__slug'],
+            'course_code': row['course__code'],
+            'reply_count': row['reply_count'],
+            'upvote_count': row['upvote_count'],
+            'view_count': row['view_count'],
+            'tags': row['tag_names'].split(',') if row['tag_names'] else [],
+            'semester': row['semester'],
+        }
+    return summaries
+
+
+def get_summaries(thread_ids):
+    """Summaries in the order of thread_ids, skipping threads that no longer exist"""
+    thread_ids = list(thread_ids)
+    if not thread_ids:
+        return []
+    cached = cache.get_many([summary_key(pk) for pk in thread_ids])
+    found = {pk: cached[summary_key(pk)] for pk in thread_ids if summary_key(pk) in cached}
+
+    missing = [pk for pk in thread_ids if pk not in found]
+    if missing:
+        built = build_summaries(missing)
+        cache.set_many({summary_key(pk): s for pk, s in built.items()}, settings.THREAD_SUMMARY_CACHE_SECONDS)
+        found.update(built)
+    return [found[pk] for pk in thread_ids if pk in found]
+
+
+def invalidate_thread_summaries(thread_ids):
+    keys = [summary_key(pk) for pk in thread_ids if pk]
+    if keys:
+        cache.delete_many(keys)
+
+
+def summarize_page(page_obj):
+    """Swap an id-only paginator page's object_list for summaries"""
+    page_obj.object_list = get_summaries(page_obj.object_list)
+    return page_obj
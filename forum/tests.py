@@ -0,0 +1,162 @@
+from django.contrib.auth.models import User
+from django.test import TestCase
+from django.urls import reverse
+from .models import Category, Tag, Thread, ThreadTag, ThreadPurge, Reply, Upvote, UserStats
+from .moderation import set_threads_locked, soft_delete_threads, soft_delete_replies
+from .purge import queue_thread_purge, run_purge
+from .stats import rebuild_user_stats
+from .viewcounts import REGISTERS, add_to_sketch, estimate, visitor_hash, write_views
+
+
+def stats_of(users):
+    return {
+        user.pk: UserStats.objects.values_list('thread_count', 'reply_count', 'upvotes_received', 'karma').get(user=user)
+        for user in users
+    }
+
+
+class ReplyDeleteTests(TestCase):
+    def setUp(self):
+        self.author = User.objects.create_user('author', 'author@pilani.bits-pilani.ac.in', 'pw-for-tests')
+        category = Category.objects.create(name='General')
+        thread = Thread.objects.create(title='Question', content='Body', author=self.author, category=category)
+        self.reply = Reply.objects.create(thread=thread, author=self.author, content='Answer')
+        self.client.force_login(self.author)
+
+    def test_deleting_twice_counts_once(self):
+        url = reverse('forum:reply_delete', args=[self.reply.pk])
+        self.client.post(url)
+        deleted_at = Reply.objects.get(pk=self.reply.pk).deleted_at
+
+        response = self.client.post(url)
+
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(Reply.objects.get(pk=self.reply.pk).deleted_at, deleted_at)
+        stats = UserStats.objects.get(user=self.author)
+        rebuild_user_stats([self.author.pk])
+        rebuilt = UserStats.objects.get(user=self.author)
+        self.assertEqual((stats.reply_count, stats.karma), (rebuilt.reply_count, rebuilt.karma))
+
+
+class ThreadPurgeTests(TestCase):
+    def setUp(self):
+        self.author = User.objects.create_user('author', 'author@pilani.bits-pilani.ac.in')
+        self.voter = User.objects.create_user('voter', 'voter@goa.bits-pilani.ac.in')
+        category = Category.objects.create(name='General')
+        self.thread = Thread.objects.create(title='Question', content='Body', author=self.author, category=category)
+        ThreadTag.objects.create(thread=self.thread, tag=Tag.objects.create(name='exams'))
+        Upvote.objects.create(user=self.voter, thread=self.thread)
+        for n in range(5):
+            reply = Reply.objects.create(thread=self.thread, author=self.author, content=f'Answer {n}')
+            Upvote.objects.create(user=self.voter, reply=reply)
+
+    def test_purge_deletes_everything_in_batches(self):
+        purge = queue_thread_purge(self.thread, user=self.author)
+        self.assertTrue(Thread.objects.get(pk=self.thread.pk).is_deleted)
+        steps = []
+
+        run_purge(purge, batch_size=2, progress=lambda label, count: steps.append(label))
+
+        self.assertEqual(steps.count('replies'), 3)
+        self.assertFalse(Thread.objects.filter(pk=self.thread.pk).exists())
+        self.assertFalse(Reply.objects.filter(thread_id=self.thread.pk).exists())
+        self.assertFalse(Upvote.objects.exists())
+        self.assertFalse(ThreadTag.objects.exists())
+        purge = ThreadPurge.objects.get(pk=purge.pk)
+        # 5 replies, 6 upvotes, 1 tag and the thread
+        self.assertEqual((purge.status, purge.rows_deleted), ('Done', 13))
+        self.assertEqual(stats_of([self.author])[self.author.pk], (0, 0, 0, 0))
+
+
+class UserStatsTests(TestCase):
+    def setUp(self):
+        self.alice = User.objects.create_user('alice', 'alice@pilani.bits-pilani.ac.in')
+        self.bob = User.objects.create_user('bob', 'bob@goa.bits-pilani.ac.in')
+        self.category = Category.objects.create(name='General')
+
+    def assertMatchesRebuild(self):
+        users = [self.alice, self.bob]
+        incremental = stats_of(users)
+        rebuild_user_stats([user.pk for user in users])
+        self.assertEqual(incremental, stats_of(users))
+
+    def test_incremental_counters_match_a_rebuild(self):
+        thread = Thread.objects.create(title='Question', content='Body', author=self.alice, category=self.category)
+        replies = [Reply.objects.create(thread=thread, author=self.bob, content='Answer') for _ in range(3)]
+        Upvote.objects.create(user=self.bob, thread=thread)
+        Upvote.objects.create(user=self.alice, reply=replies[0])
+        withdrawn = Upvote.objects.create(user=self.alice, reply=replies[1])
+        self.assertMatchesRebuild()
+
+        withdrawn.delete()
+        self.client.force_login(self.bob)
+        self.client.post(reverse('forum:reply_delete', args=[replies[0].pk]))
+        self.assertMatchesRebuild()
+        self.assertEqual(stats_of([self.bob])[self.bob.pk], (0, 2, 0, 2))
+
+
+class ViewSketchTests(TestCase):
+    def test_estimate_is_close(self):
+        for n in (50, 20000):
+            registers = bytearray(REGISTERS)
+            for i in range(n):
+                add_to_sketch(registers, visitor_hash(f'visitor-{i}'))
+            self.assertAlmostEqual(estimate(registers), n, delta=n * 0.1)
+
+    def test_flushes_merge_into_the_thread(self):
+        author = User.objects.create_user('author', 'author@pilani.bits-pilani.ac.in')
+        category = Category.objects.create(name='General')
+        thread = Thread.objects.create(title='Question', content='Body', author=author, category=category)
+
+        def visitors(start, stop):
+            return {visitor_hash(f'visitor-{i}') for i in range(start, stop)}
+
+        write_views({thread.pk: (1000, visitors(0, 1000))})
+        write_views({thread.pk: (1000, visitors(500, 1500))})
+        thread.refresh_from_db()
+        self.assertEqual(thread.view_count, 2000)
+        self.assertAlmostEqual(thread.unique_viewers, 1500, delta=150)
+
+        # Viewers already counted do not count again.
+        unique = thread.unique_viewers
+        write_views({thread.pk: (10, visitors(0, 10))})
+        thread.refresh_from_db()
+        self.assertEqual((thread.view_count, thread.unique_viewers), (2010, unique))
+
+
+class BulkModerationTests(TestCase):
+    def setUp(self):
+        self.author = User.objects.create_user('author', 'author@pilani.bits-pilani.ac.in')
+        self.replier = User.objects.create_user('replier', 'replier@goa.bits-pilani.ac.in')
+        category = Category.objects.create(name='General')
+        self.threads = [
+            Thread.objects.create(title=f'Question {n}', content='Body', author=self.author, category=category)
+            for n in range(2)
+        ]
+        self.replies = [
+            Reply.objects.create(thread=thread, author=self.replier, content='Answer') for thread in self.threads
+        ]
+
+    def test_lock_changes_each_thread_once(self):
+        threads = Thread.objects.filter(pk__in=[t.pk for t in self.threads])
+        self.assertEqual(set_threads_locked(threads, True), 2)
+        self.assertEqual(set_threads_locked(threads, True), 0)
+        self.assertTrue(all(Thread.objects.filter(pk__in=[t.pk for t in self.threads]).values_list('is_locked', flat=True)))
+
+    def test_soft_delete_threads_updates_stats(self):
+        threads = Thread.objects.filter(pk=self.threads[0].pk)
+        self.assertEqual(soft_delete_threads(threads), 1)
+        self.assertEqual(soft_delete_threads(threads), 0)
+
+        stats = stats_of([self.author, self.replier])
+        self.assertEqual(stats[self.author.pk][:2], (1, 0))
+        self.assertEqual(stats[self.replier.pk][:2], (0, 1))
+        rebuild_user_stats()
+        self.assertEqual(stats, stats_of([self.author, self.replier]))
+
+    def test_soft_delete_replies_updates_stats(self):
+        replies = Reply.objects.filter(pk__in=[r.pk for r in self.replies])
+        self.assertEqual(soft_delete_replies(replies), 2)
+
+        self.assertFalse(Reply.objects.filter(pk__in=[r.pk for r in self.replies], deleted_at__isnull=True).exists())
+        self.assertEqual(stats_of([self.replier])[self.replier.pk], (0, 0, 0, 0))
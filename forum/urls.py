@@ -6,7 +6,12 @@ app_name = 'forum'
 urlpatterns = [
     path('', views.forum_home, name='forum_home'),
     path('category/<slug:slug>/', views.category_detail, name='category_detail'),
+    path('course/<str:code>/', views.course_hub, name='course_hub'),
     path('thread/create/', views.thread_create, name='thread_create'),
+    path('thread/duplicates/', views.thread_duplicates, name='thread_duplicates'),
+    path('autocomplete/courses/', views.autocomplete_courses, name='autocomplete_courses'),
+    path('autocomplete/resources/', views.autocomplete_resources, name='autocomplete_resources'),
+    path('autocomplete/tags/', views.autocomplete_tags, name='autocomplete_tags'),
     path('thread/<int:pk>/', views.thread_detail, name='thread_detail'),
     path('thread/<int:pk>/edit/', views.thread_edit, name='thread_edit'),
     path('thread/<int:pk>/delete/', views.thread_delete, name='thread_delete'),
@@ -18,6 +23,12 @@ urlpatterns = [
     path('report/', views.report_create, name='report_create'),
     path('reports/', views.report_list, name='report_list'),
     path('report/<int:report_id>/resolve/', views.report_resolve, name='report_resolve'),
+    path('moderation/activity/', views.activity_dashboard, name='activity_dashboard'),
+    path('export/', views.discussion_export, name='discussion_export'),
+    path('replies/archived/', views.archived_reply_list, name='archived_reply_list'),
+    path('replies/archived/<int:reply_id>/restore/', views.archived_reply_restore, name='archived_reply_restore'),
     path('user/<int:user_id>/', views.user_profile, name='user_profile'),
+    path('leaderboard/', views.leaderboard, name='leaderboard'),
     path('search/', views.search, name='search'),
+    path('campus/', views.campus_select, name='campus_select'),
 ]
@@ -1,5 +1,11 @@
+import re
+from html import unescape
 import markdown
 import bleach
+from django.core.cache import caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.utils.html import strip_tags
 from django.utils.safestring import mark_safe
 from django.conf import settings
 
@@ -33,3 +39,37 @@ def render_markdown(text):
     )
     
     return mark_safe(cleaned)
+
+
+EXCERPT_LENGTH = 300
+
+
+def make_excerpt(html, length=EXCERPT_LENGTH):
+    """Plain-text preview of rendered content, cut at a word boundary"""
+    text = ' '.join(unescape(strip_tags(html or '')).split())
+    if len(text) <= length:
+        return text
+    return text[:length - 1].rsplit(' ', 1)[0] + '…'
+
+
+TOKEN_RE = re.compile(r'[a-z0-9]+')
+
+STOPWORDS = frozenset("""
+a about above after again all also am an and any are as at be because been
+before being below between both but by can could did do does doing down during
+each few for from further had has have having he her here hers him his how i if
+in into is it its itself just me more most my no nor not now of off on once only
+or other our out over own same she should so some such than that the their them
+then there these they this those through to too under until up very was we were
+what when where which while who whom why will with would you your
+""".split())
+
+
+def tokenize(text):
+    """Lowercase word tokens with stopwords and single characters dropped"""
+    return [t for t in TOKEN_RE.findall((text or '').lower()) if t not in STOPWORDS and len(t) > 1]
+
+
+def cache_is_shared():
+    """Whether other processes see what this one writes to the cache"""
+    return not isinstance(caches['default'], (LocMemCache, DummyCache))
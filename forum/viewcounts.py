@@ -0,0 +1,217 @@
+"""
+Thread view counting without a database write per page view.
+
+thread_detail calls record_view(), which only touches a per-process buffer.
+Every VIEW_BUFFER_SECONDS (or VIEW_BUFFER_SIZE views) a worker writes its
+buffer to the shared cache as one batch: per thread, the number of views
+and the hashes of the distinct viewers. Batches are numbered from a shared
+counter and never modified, so workers flushing at once cannot overwrite
+each other. `manage.py flush_view_counts` reads the new batches, merges the
+viewer hashes into each thread's HyperLogLog sketch (ThreadViewSketch, under
+a row lock) and writes view_count/unique_viewers with one bulk_update.
+
+Without a shared cache (no REDIS_URL) that command would see nothing, so
+workers write their buffers to the database themselves. gunicorn's
+worker_exit hook writes out what a worker still holds.
+"""
+import atexit
+import hashlib
+import math
+import threading
+import time
+from collections import defaultdict
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F
+from .models import Thread, ThreadViewSketch
+from .utils import cache_is_shared
+from .summaries import invalidate_thread_summaries
+
+
+# 2**10 one-byte registers: 1 KB per thread and about 3% standard error.
+PRECISION = 10
+REGISTERS = 1 << PRECISION
+
+BATCH_KEY = 'forum:views:batch:{}'
+BATCH_SEQ_KEY = 'forum:views:batch-seq'
+FLUSHED_SEQ_KEY = 'forum:views:flushed-seq'
+FLUSH_LOCK_KEY = 'forum:views:flush-lock'
+# Longer than any flush takes; a crashed flush only holds the lock this long.
+FLUSH_LOCK_SECONDS = 300
+MISSING_BATCH_KEY = 'forum:views:missing-batch'
+# A batch is written right after its number is taken, so one missing for
+# longer than this was lost (its worker died, or it expired) and is skipped.
+MISSING_BATCH_SECONDS = 60
+
+
+# HyperLogLog
+
+def visitor_hash(visitor):
+    return int.from_bytes(hashlib.blake2b(visitor.encode(), digest_size=8).digest(), 'big')
+
+
+def add_to_sketch(registers, hashed):
+    index = hashed >> (64 - PRECISION)
+    rest = (hashed << PRECISION) & ((1 << 64) - 1)
+    rank = min(64 - rest.bit_length() + 1, 64 - PRECISION + 1)
+    if rank > registers[index]:
+        registers[index] = rank
+
+
+def estimate(registers):
+    alpha = 0.7213 / (1 + 1.079 / REGISTERS)
+    raw = alpha * REGISTERS * REGISTERS / sum(2.0 ** -r for r in registers)
+    zeros = registers.count(0)
+    if raw <= 2.5 * REGISTERS and zeros:
+        # Linear counting is more accurate while most registers are empty.
+        return round(REGISTERS * math.log(REGISTERS / zeros))
+    return round(raw)
+
+
+# Request path
+
+_lock = threading.Lock()
+_buffer = {}
+_buffered_views = 0
+_last_flush = time.monotonic()
+
+
+def visitor_id(request):
+    if request.user.is_authenticated:
+        return f'u:{request.user.pk}'
+    ip = request.META.get('REMOTE_ADDR', '')
+    # Raw addresses are never stored; the salt keeps hashes from being reversed.
+    return 'ip:' + hashlib.sha256(f'{settings.SECRET_KEY}:{ip}'.encode()).hexdigest()[:16]
+
+
+def record_view(request, thread_id):
+    """Note one view of a thread; costs a dict update on the request path"""
+    global _buffered_views
+    hashed = visitor_hash(visitor_id(request))
+    with _lock:
+        entry = _buffer.setdefault(thread_id, [0, set()])
+        entry[0] += 1
+        entry[1].add(hashed)
+        _buffered_views += 1
+        due = (
+            _buffered_views >= settings.VIEW_BUFFER_SIZE
+            or time.monotonic() - _last_flush >= settings.VIEW_BUFFER_SECONDS
+        )
+    if due:
+        flush_buffer()
+
+
+def _incr(key, delta):
+    try:
+        cache.incr(key, delta)
+    except ValueError:
+        cache.add(key, 0, None)
+        cache.incr(key, delta)
+
+
+def flush_buffer():
+    """
+    Write this process's buffered views to the shared cache as one batch, or
+    straight to the database when the cache is this process's own
+    """
+    global _buffer, _buffered_views, _last_flush
+    with _lock:
+        buffered, _buffer = _buffer, {}
+        _buffered_views = 0
+        _last_flush = time.monotonic()
+    if not buffered:
+        return
+    if not cache_is_shared():
+        write_views(buffered)
+        return
+
+    batch = {thread_id: (count, list(hashes)) for thread_id, (count, hashes) in buffered.items()}
+    _incr(BATCH_SEQ_KEY, 0)
+    seq = cache.incr(BATCH_SEQ_KEY)
+    cache.set(BATCH_KEY.format(seq), batch, settings.VIEW_DIRTY_TTL_SECONDS)
+
+
+atexit.register(flush_buffer)
+
+
+# Periodic flush into the database
+
+def write_views(views):
+    """
+    Add views ({thread id: (views, viewer hashes)}) to Thread and the sketches.
+    Returns the number of threads updated.
+    """
+    thread_ids = sorted(Thread.objects.filter(pk__in=list(views)).values_list('pk', flat=True))
+    if not thread_ids:
+        return 0
+    # Rows are created empty first and then merged under a lock, so two
+    # flushes of the same thread add to each other instead of replacing.
+    # Outside the transaction, so with campus schemas they are created in
+    # the same table as the rows ignore_conflicts has to see.
+    ThreadViewSketch.objects.bulk_create(
+        [ThreadViewSketch(thread_id=pk, registers=bytes(REGISTERS)) for pk in thread_ids],
+        ignore_conflicts=True,
+    )
+    with transaction.atomic():
+        rows = list(ThreadViewSketch.objects.select_for_update().filter(thread_id__in=thread_ids).order_by('thread_id'))
+        threads = []
+        for row in rows:
+            count, hashes = views[row.thread_id]
+            registers = bytearray(row.registers)
+            for hashed in hashes:
+                add_to_sketch(registers, hashed)
+            row.registers = bytes(registers)
+            threads.append(Thread(
+                pk=row.thread_id,
+                view_count=F('view_count') + count,
+                unique_viewers=estimate(registers),
+            ))
+        ThreadViewSketch.objects.bulk_update(rows, ['registers'], batch_size=500)
+        # bulk_update leaves updated_at alone, so views do not count as edits.
+        Thread.objects.bulk_update(threads, ['view_count', 'unique_viewers'], batch_size=500)
+    invalidate_thread_summaries(thread_ids)
+    return len(threads)
+
+
+def _batch_lost(seq):
+    """Whether batch seq has been missing for MISSING_BATCH_SECONDS"""
+    missing = cache.get(MISSING_BATCH_KEY)
+    if missing is None or missing[0] != seq:
+        cache.set(MISSING_BATCH_KEY, (seq, time.time()), None)
+        return False
+    return time.time() - missing[1] >= MISSING_BATCH_SECONDS
+
+
+def flush_view_counts():
+    """
+    Write the batches of views in the cache to the database.
+    Returns the number of threads updated.
+    """
+    # One flush at a time, so no batch is counted twice.
+    if not cache.add(FLUSH_LOCK_KEY, True, FLUSH_LOCK_SECONDS):
+        return 0
+    try:
+        flushed = cache.get(FLUSHED_SEQ_KEY, 0)
+        current = cache.get(BATCH_SEQ_KEY, 0)
+        if current <= flushed:
+            return 0
+        found = cache.get_many([BATCH_KEY.format(seq) for seq in range(flushed + 1, current + 1)])
+        views = defaultdict(lambda: [0, set()])
+        done = flushed
+        for seq in range(flushed + 1, current + 1):
+            batch = found.get(BATCH_KEY.format(seq))
+            # Stop at a batch whose number is taken but that is not written
+            # yet; the next flush picks it up.
+            if batch is None and not _batch_lost(seq):
+                break
+            for thread_id, (count, hashes) in (batch or {}).items():
+                views[thread_id][0] += count
+                views[thread_id][1].update(hashes)
+            done = seq
+        updated = write_views(views)
+        cache.set(FLUSHED_SEQ_KEY, done, None)
+        cache.delete_many([BATCH_KEY.format(seq) for seq in range(flushed + 1, done + 1)])
+        return updated
+    finally:
+        cache.delete(FLUSH_LOCK_KEY)
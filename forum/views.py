@@ -1,27 +1,54 @@
+from datetime import timedelta
+from urllib.parse import urlencode
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.models import User
 from django.contrib import messages
 from django.core.paginator import Paginator
-from django.db.models import Q, Count, F, Case, When, IntegerField
-from django.http import JsonResponse
+from django.db.models import Q, Count, F, Sum, Case, When, IntegerField
+from django.http import Http404, HttpResponse, HttpResponseForbidden, JsonResponse, StreamingHttpResponse
+from django.urls import reverse
+from django.utils.http import url_has_allowed_host_and_scheme
 from django.views.decorators.http import require_POST
 from django.utils import timezone
+from django.utils.crypto import constant_time_compare
+from django.conf import settings
 from django_ratelimit.decorators import ratelimit
 from .models import (
     Category, Thread, Reply, Upvote, Tag, ThreadTag, Report,
-    UserProfile, Course, Resource
+    UserProfile, UserStats, Course, Resource, ReplyArchive, RelatedThread,
+    DailyCategoryActivity, DailyCourseActivity, DailyUserActivity, RollupWatermark, ArchivedThread
 )
 from .forms import ThreadForm, ReplyForm, ReportForm
 from .utils import render_markdown
+from .purge import queue_thread_purge, run_purge
+from .retention import restore_replies
+from .roles import is_moderator, can_modify
+from .stats import reply_removed
+from .duplicates import find_duplicates
+from .export import export_threads, stream_export
+from .courses import get_course_hub
+from .autocomplete import complete_courses, complete_resources, complete_tags
+from .fragments import LIST_FIELDS as REPLY_LIST_FIELDS, attach_reply_fragments
+from .summaries import get_summaries, summarize_page
+from .viewcounts import record_view
+from .search import search_threads, parse_filters, facet_choices
+from .campuses import current_campus, set_campus, campus_filter, thread_campus
+from .metrics import render as render_metrics
 
 
 def forum_home(request):
-    """Home page showing all categories"""
-    categories = Category.objects.annotate(
-        thread_count=Count('threads')
-    ).all()
-    recent_threads = Thread.objects.select_related('author', 'category').order_by('-created_at')[:10]
+    """Home page showing the campus's categories"""
+    campus = current_campus(request)
+    categories = Category.objects.all()
+    if campus:
+        categories = categories.filter(campus__in=['', campus])
+    categories = categories.annotate(
+        thread_count=Count('threads', filter=Q(threads__is_deleted=False, **campus_filter(campus, 'threads__campus')))
+    )
+    recent_threads = get_summaries(
+        Thread.objects.filter(is_deleted=False, **campus_filter(campus)).order_by('-created_at').values_list('pk', flat=True)[:10]
+    )
     
     context = {
         'categories': categories,
@@ -33,22 +60,25 @@ def forum_home(request):
 def category_detail(request, slug):
     """View threads in a specific category"""
     category = get_object_or_404(Category, slug=slug)
-    threads = Thread.objects.filter(category=category).select_related('author', 'category').annotate(
-        reply_count=Count('replies', filter=Q(replies__is_deleted=False)),
-        upvote_count=Count('upvotes')
-    )
+    # A campus's own category already holds only its threads.
+    campus = '' if category.campus else current_campus(request)
+    threads = Thread.objects.filter(category=category, is_deleted=False, **campus_filter(campus))
     
     sort_by = request.GET.get('sort', 'latest')
     if sort_by == 'popular':
-        threads = threads.order_by('-upvote_count', '-reply_count', '-created_at')
+        threads = threads.annotate(
+            reply_count=Count('replies', filter=Q(replies__is_deleted=False), distinct=True),
+            upvote_count=Count('upvotes', distinct=True),
+        ).order_by('-upvote_count', '-reply_count', '-created_at')
     elif sort_by == 'upvotes':
-        threads = threads.order_by('-upvote_count', '-created_at')
+        threads = threads.annotate(upvote_count=Count('upvotes')).order_by('-upvote_count', '-created_at')
     else:
         threads = threads.order_by('-created_at')
     
-    paginator = Paginator(threads, 10)
+    # The page query returns ids only; the cards come from the summary cache.
+    paginator = Paginator(threads.values_list('pk', flat=True), 10)
     page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    page_obj = summarize_page(paginator.get_page(page_number))
     
     context = {
         'category': category,
@@ -58,6 +88,15 @@ def category_detail(request, slug):
     return render(request, 'forum/category_detail.html', context)
 
 
+def course_hub(request, code):
+    """Course hub: resources by type plus recent, top and unanswered threads"""
+    try:
+        course = get_course_hub(code)
+    except Course.DoesNotExist:
+        raise Http404('No course with that code')
+    return render(request, 'forum/course_hub.html', {'course': course})
+
+
 @ratelimit(key='ip', rate='5/m', method='POST', block=True)
 @ratelimit(key='user', rate='10/h', method='POST', block=True)
 @login_required
@@ -68,6 +107,7 @@ def thread_create(request):
         if form.is_valid():
             thread = form.save(commit=False)
             thread.author = request.user
+            thread.campus = thread_campus(thread.category, request.user.pk)
             thread.save()
             
             tag_names = request.POST.get('tags', '').split(',')
@@ -84,19 +124,66 @@ def thread_create(request):
     
     context = {
         'form': form,
-        'categories': Category.objects.all(),
-        'courses': Course.objects.all(),
     }
     return render(request, 'forum/thread_create.html', context)
 
 
+def _autocomplete_limit(request):
+    limit = request.GET.get('limit', '')
+    return int(limit) if limit.isdigit() else 10
+
+
+@ratelimit(key='user_or_ip', rate='120/m', block=True)
+def autocomplete_courses(request):
+    """Typeahead for courses by code prefix"""
+    results = complete_courses(request.GET.get('q', '')[:20], _autocomplete_limit(request))
+    return JsonResponse({'results': results})
+
+
+@ratelimit(key='user_or_ip', rate='120/m', block=True)
+def autocomplete_resources(request):
+    """Typeahead for resources by title, optionally within a course"""
+    course = request.GET.get('course', '')
+    results = complete_resources(
+        request.GET.get('q', '')[:100], _autocomplete_limit(request),
+        course_id=int(course) if course.isdigit() else None,
+    )
+    return JsonResponse({'results': results})
+
+
+@ratelimit(key='user_or_ip', rate='120/m', block=True)
+def autocomplete_tags(request):
+    """Typeahead for tags by name prefix"""
+    results = complete_tags(request.GET.get('q', '')[:50], _autocomplete_limit(request))
+    return JsonResponse({'results': results})
+
+
+@ratelimit(key='user_or_ip', rate='60/m', block=True)
+@login_required
+def thread_duplicates(request):
+    """Suggest existing threads that look like near-duplicates of a draft"""
+    title = request.GET.get('title', '')[:255]
+    content = request.GET.get('content', '')[:5000]
+    exclude = request.GET.get('exclude')
+    matches = find_duplicates(title, content, exclude=int(exclude) if exclude and exclude.isdigit() else None)
+    for match in matches:
+        match['url'] = reverse('forum:thread_detail', kwargs={'pk': match['id']})
+    return JsonResponse({'results': matches})
+
+
 def thread_detail(request, pk):
     """View thread details and replies"""
-    thread = get_object_or_404(Thread.objects.select_related('author', 'category'), pk=pk)
+    thread = Thread.objects.select_related('author', 'category').filter(pk=pk, is_deleted=False).first()
+    if thread is None:
+        return archived_thread_detail(request, pk)
+    if not getattr(request, 'is_snapshot', False):
+        record_view(request, thread.pk)
     
     sort_by = request.GET.get('sort', 'latest')
     
-    replies = Reply.objects.filter(thread=thread, is_deleted=False).select_related('author').annotate(
+    # Bodies and action buttons come from the fragment cache, so the page
+    # query only needs the columns that key and order it.
+    replies = Reply.objects.filter(thread=thread, is_deleted=False).only(*REPLY_LIST_FIELDS).annotate(
         upvote_count=Count('upvotes')
     )
     
@@ -112,10 +199,16 @@ def thread_detail(request, pk):
     paginator = Paginator(replies, 10)
     page_number = request.GET.get('page')
     page_obj = paginator.get_page(page_number)
+    page_obj.object_list = attach_reply_fragments(request, page_obj.object_list)
+    
+    related_threads = RelatedThread.objects.filter(
+        thread=thread, related__is_deleted=False
+    ).select_related('related').only('score', 'related__id', 'related__title', 'related__created_at')[:5]
     
     context = {
         'thread': thread,
         'page_obj': page_obj,
+        'related_threads': related_threads,
         'user_upvoted': user_upvoted,
         'form': ReplyForm() if request.user.is_authenticated else None,
         'sort_by': sort_by,
@@ -123,23 +216,43 @@ def thread_detail(request, pk):
     return render(request, 'forum/thread_detail.html', context)
 
 
+def archived_thread_detail(request, pk):
+    """Read-only view of a thread from the cold archive"""
+    thread = get_object_or_404(ArchivedThread.objects.select_related('author', 'category', 'course', 'resource'), pk=pk)
+    
+    sort_by = request.GET.get('sort', 'latest')
+    replies = thread.replies.filter(is_deleted=False).select_related('author')
+    if sort_by == 'popular':
+        replies = replies.order_by('-upvote_count', 'created_at')
+    else:
+        replies = replies.order_by('created_at')
+    
+    paginator = Paginator(replies, 10)
+    page_obj = paginator.get_page(request.GET.get('page'))
+    
+    context = {
+        'thread': thread,
+        'page_obj': page_obj,
+        'sort_by': sort_by,
+    }
+    return render(request, 'forum/archived_thread_detail.html', context)
+
+
 @login_required
 def thread_edit(request, pk):
     """Edit a thread (only by author or moderator)"""
-    thread = get_object_or_404(Thread, pk=pk)
-    try:
-        user_profile = request.user.profile
-    except UserProfile.DoesNotExist:
-        user_profile = None
-    
-    if thread.author != request.user and not (user_profile and user_profile.is_moderator):
+    thread = get_object_or_404(Thread, pk=pk, is_deleted=False)
+    if not can_modify(request, thread):
         messages.error(request, 'You do not have permission to edit this thread.')
         return redirect('forum:thread_detail', pk=pk)
     
     if request.method == 'POST':
         form = ThreadForm(request.POST, instance=thread)
         if form.is_valid():
-            form.save()
+            thread = form.save(commit=False)
+            # Moving to another category can move the thread to another campus.
+            thread.campus = thread_campus(thread.category, thread.author_id)
+            thread.save()
             messages.success(request, 'Thread updated successfully!')
             return redirect('forum:thread_detail', pk=pk)
     else:
@@ -155,19 +268,18 @@ def thread_edit(request, pk):
 @login_required
 def thread_delete(request, pk):
     """Delete a thread (only by author or moderator)"""
-    thread = get_object_or_404(Thread, pk=pk)
-    try:
-        user_profile = request.user.profile
-    except UserProfile.DoesNotExist:
-        user_profile = None
-    
-    if thread.author != request.user and not (user_profile and user_profile.is_moderator):
+    thread = get_object_or_404(Thread, pk=pk, is_deleted=False)
+    if not can_modify(request, thread):
         messages.error(request, 'You do not have permission to delete this thread.')
         return redirect('forum:thread_detail', pk=pk)
     
     if request.method == 'POST':
         category_slug = thread.category.slug
-        thread.delete()
+        # Hide the thread right away; large threads are hard-deleted later in
+        # batches by the purge_threads command instead of inside the request.
+        purge = queue_thread_purge(thread, user=request.user)
+        if thread.replies.count() <= settings.THREAD_PURGE_INLINE_LIMIT:
+            run_purge(purge)
         messages.success(request, 'Thread deleted successfully!')
         return redirect('forum:category_detail', slug=category_slug)
     
@@ -177,13 +289,8 @@ def thread_delete(request, pk):
 @login_required
 def thread_lock(request, pk):
     """Lock/unlock a thread (moderator only)"""
-    thread = get_object_or_404(Thread, pk=pk)
-    try:
-        user_profile = request.user.profile
-    except UserProfile.DoesNotExist:
-        user_profile = None
-    
-    if not (user_profile and user_profile.is_moderator):
+    thread = get_object_or_404(Thread, pk=pk, is_deleted=False)
+    if not is_moderator(request):
         messages.error(request, 'Only moderators can lock threads.')
         return redirect('forum:thread_detail', pk=pk)
     
@@ -200,7 +307,7 @@ def thread_lock(request, pk):
 @login_required
 def reply_create(request, pk):
     """Create a reply to a thread"""
-    thread = get_object_or_404(Thread, pk=pk)
+    thread = get_object_or_404(Thread, pk=pk, is_deleted=False)
     
     if thread.is_locked:
         messages.error(request, 'This thread is locked.')
@@ -222,13 +329,8 @@ def reply_create(request, pk):
 @login_required
 def reply_edit(request, reply_id):
     """Edit a reply (only by author or moderator)"""
-    reply = get_object_or_404(Reply, pk=reply_id)
-    try:
-        user_profile = request.user.profile
-    except UserProfile.DoesNotExist:
-        user_profile = None
-    
-    if reply.author != request.user and not (user_profile and user_profile.is_moderator):
+    reply = get_object_or_404(Reply, pk=reply_id, thread__is_deleted=False)
+    if not can_modify(request, reply):
         messages.error(request, 'You do not have permission to edit this reply.')
         return redirect('forum:thread_detail', pk=reply.thread.pk)
     
@@ -251,19 +353,16 @@ def reply_edit(request, reply_id):
 @login_required
 def reply_delete(request, reply_id):
     """Soft delete a reply (only by author or moderator)"""
-    reply = get_object_or_404(Reply, pk=reply_id)
-    try:
-        user_profile = request.user.profile
-    except UserProfile.DoesNotExist:
-        user_profile = None
-    
-    if reply.author != request.user and not (user_profile and user_profile.is_moderator):
+    reply = get_object_or_404(Reply, pk=reply_id, is_deleted=False, thread__is_deleted=False)
+    if not can_modify(request, reply):
         messages.error(request, 'You do not have permission to delete this reply.')
         return redirect('forum:thread_detail', pk=reply.thread.pk)
     
     if request.method == 'POST':
         reply.is_deleted = True
+        reply.deleted_at = timezone.now()
         reply.save()
+        reply_removed(reply)
         messages.success(request, 'Reply deleted successfully!')
         return redirect('forum:thread_detail', pk=reply.thread.pk)
     
@@ -279,7 +378,7 @@ def upvote_toggle(request):
     
     try:
         if content_type == 'thread':
-            obj = get_object_or_404(Thread, pk=content_id)
+            obj = get_object_or_404(Thread, pk=content_id, is_deleted=False)
             upvote = Upvote.objects.filter(user=request.user, thread=obj).first()
             if upvote:
                 upvote.delete()
@@ -289,7 +388,7 @@ def upvote_toggle(request):
                 upvoted = True
             count = obj.upvotes.count()
         elif content_type == 'reply':
-            obj = get_object_or_404(Reply, pk=content_id)
+            obj = get_object_or_404(Reply, pk=content_id, is_deleted=False, thread__is_deleted=False)
             upvote = Upvote.objects.filter(user=request.user, reply=obj).first()
             if upvote:
                 upvote.delete()
@@ -337,12 +436,7 @@ def report_create(request):
 @login_required
 def report_list(request):
     """List all reports (moderator only)"""
-    try:
-        user_profile = request.user.profile
-    except UserProfile.DoesNotExist:
-        user_profile = None
-    
-    if not (user_profile and user_profile.is_moderator):
+    if not is_moderator(request):
         messages.error(request, 'Only moderators can view reports.')
         return redirect('forum:forum_home')
     
@@ -354,16 +448,46 @@ def report_list(request):
     return render(request, 'forum/report_list.html', context)
 
 
+@login_required
+def activity_dashboard(request):
+    """Activity per day, category, course and user, read from the rollup tables (moderator only)"""
+    if not is_moderator(request):
+        messages.error(request, 'Only moderators can view the activity dashboard.')
+        return redirect('forum:forum_home')
+    
+    days = request.GET.get('days', '30')
+    days = min(int(days), 366) if days.isdigit() and int(days) > 0 else 30
+    since = timezone.localdate() - timedelta(days=days - 1)
+    totals = {'threads': Sum('threads'), 'replies': Sum('replies'), 'upvotes': Sum('upvotes')}
+    
+    daily = DailyCategoryActivity.objects.filter(day__gte=since).values('day').annotate(**totals).order_by('-day')
+    categories = DailyCategoryActivity.objects.filter(day__gte=since).values(
+        'category__name', 'category__slug'
+    ).annotate(**totals).order_by('-threads', '-replies')
+    courses = DailyCourseActivity.objects.filter(day__gte=since).values(
+        'course__code', 'course__title'
+    ).annotate(**totals).order_by('-threads', '-replies')[:20]
+    week_start = timezone.localdate() - timedelta(days=6)
+    active_users = DailyUserActivity.objects.filter(day__gte=week_start).values(
+        'user_id', 'user__username'
+    ).annotate(**totals).order_by('-replies', '-threads')[:20]
+    
+    context = {
+        'days': days,
+        'daily': daily,
+        'categories': categories,
+        'courses': courses,
+        'active_users': active_users,
+        'watermarks': RollupWatermark.objects.order_by('source'),
+    }
+    return render(request, 'forum/activity_dashboard.html', context)
+
+
 @login_required
 def report_resolve(request, report_id):
     """Resolve a report (moderator only)"""
     report = get_object_or_404(Report, pk=report_id)
-    try:
-        user_profile = request.user.profile
-    except UserProfile.DoesNotExist:
-        user_profile = None
-    
-    if not (user_profile and user_profile.is_moderator):
+    if not is_moderator(request):
         messages.error(request, 'Only moderators can resolve reports.')
         return redirect('forum:forum_home')
     
@@ -378,65 +502,122 @@ def report_resolve(request, report_id):
     return render(request, 'forum/report_resolve.html', {'report': report})
 
 
+@login_required
+def archived_reply_list(request):
+    """List replies moved to the archive after deletion (moderator only)"""
+    if not is_moderator(request):
+        messages.error(request, 'Only moderators can view archived replies.')
+        return redirect('forum:forum_home')
+    
+    archives = ReplyArchive.objects.select_related('author', 'thread').order_by('-archived_at')
+    paginator = Paginator(archives, 20)
+    page_obj = paginator.get_page(request.GET.get('page'))
+    
+    return render(request, 'forum/archived_reply_list.html', {'page_obj': page_obj})
+
+
+@login_required
+@require_POST
+def archived_reply_restore(request, reply_id):
+    """Restore an archived reply to its thread (moderator only)"""
+    archive = get_object_or_404(ReplyArchive, pk=reply_id, thread__is_deleted=False)
+    if not is_moderator(request):
+        messages.error(request, 'Only moderators can restore replies.')
+        return redirect('forum:forum_home')
+    
+    restore_replies([archive])
+    messages.success(request, 'Reply restored successfully!')
+    return redirect('forum:thread_detail', pk=archive.thread_id)
+
+
+@login_required
+def discussion_export(request):
+    """Stream a course's or category's threads and replies (moderator only)"""
+    if not is_moderator(request):
+        messages.error(request, 'Only moderators can export discussions.')
+        return redirect('forum:forum_home')
+    
+    course = category = None
+    if request.GET.get('course'):
+        course = get_object_or_404(Course, code=request.GET['course'])
+    if request.GET.get('category'):
+        category = get_object_or_404(Category, slug=request.GET['category'])
+    if course is None and category is None:
+        return JsonResponse({'error': 'Specify a course or category'}, status=400)
+    
+    fmt = 'csv' if request.GET.get('format') == 'csv' else 'jsonl'
+    compress = request.GET.get('gzip') == '1'
+    name = (course.code if course else category.slug).replace(' ', '_')
+    filename = f'{name}.{fmt}' + ('.gz' if compress else '')
+    
+    response = StreamingHttpResponse(
+        stream_export(export_threads(course=course, category=category), fmt=fmt, compress=compress),
+        content_type='application/gzip' if compress else ('text/csv' if fmt == 'csv' else 'application/x-ndjson'),
+    )
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+
 def user_profile(request, user_id):
     """View user profile"""
-    user = get_object_or_404(User, pk=user_id)
-    profile, created = UserProfile.objects.get_or_create(user=user)
-    threads = Thread.objects.filter(author=user).order_by('-created_at')[:10]
-    replies = Reply.objects.filter(author=user, is_deleted=False).order_by('-created_at')[:10]
+    user = get_object_or_404(User.objects.select_related('profile', 'stats'), pk=user_id)
+    # Read-only: a missing profile or stats row just renders as empty/zero.
+    profile = getattr(user, 'profile', None)
+    stats = getattr(user, 'stats', None) or UserStats(user=user)
+    threads = get_summaries(
+        Thread.objects.filter(author=user, is_deleted=False).order_by('-created_at').values_list('pk', flat=True)[:10]
+    )
+    replies = Reply.objects.filter(author=user, is_deleted=False, thread__is_deleted=False).order_by('-created_at')[:10]
     
     context = {
         'profile_user': user,
         'profile': profile,
+        'stats': stats,
         'threads': threads,
         'replies': replies,
     }
     return render(request, 'forum/user_profile.html', context)
 
 
+def leaderboard(request):
+    """Top users by karma, read straight off the UserStats karma index"""
+    top_stats = UserStats.objects.select_related('user').order_by('-karma', 'user')[:50]
+    return render(request, 'forum/leaderboard.html', {'top_stats': top_stats})
+
+
 def search(request):
-    """Search threads by title, content, or tags with fuzzy search"""
+    """Search threads by title, content, or tags with fuzzy search, narrowed by facets"""
     query = request.GET.get('q', '')
-    threads = Thread.objects.none()
+    filters = parse_filters(request.GET)
+    thread_ids, facet_counts = search_threads(query, current_campus(request), filters)
     
-    if query:
-        from django.db import connection
-        
-        try:
-            if connection.vendor == 'postgresql':
-                from django.contrib.postgres.search import TrigramSimilarity
-                
-                threads = Thread.objects.annotate(
-                    title_similarity=TrigramSimilarity('title', query),
-                    content_similarity=TrigramSimilarity('content', query),
-                ).filter(
-                    Q(title_similarity__gt=0.1) |
-                    Q(content_similarity__gt=0.1) |
-                    Q(title__icontains=query) |
-                    Q(content__icontains=query) |
-                    Q(thread_tags__tag__name__icontains=query)
-                ).distinct().select_related('author', 'category').annotate(
-                    reply_count=Count('replies', filter=Q(replies__is_deleted=False)),
-                    upvote_count=Count('upvotes')
-                ).order_by('-title_similarity', '-content_similarity', '-created_at')
-            else:
-                raise ImportError("Not PostgreSQL")
-        except (ImportError, AttributeError):
-            threads = Thread.objects.filter(
-                Q(title__icontains=query) |
-                Q(content__icontains=query) |
-                Q(thread_tags__tag__name__icontains=query)
-            ).distinct().select_related('author', 'category').annotate(
-                reply_count=Count('replies', filter=Q(replies__is_deleted=False)),
-                upvote_count=Count('upvotes')
-            ).order_by('-created_at')
-    
-    paginator = Paginator(threads, 10)
+    paginator = Paginator(thread_ids, 10)
     page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    page_obj = summarize_page(paginator.get_page(page_number))
     
     context = {
         'query': query,
         'page_obj': page_obj,
+        'facets': facet_choices(query, filters, facet_counts),
+        'filters': filters,
+        'search_params': urlencode({'q': query, **filters}),
     }
     return render(request, 'forum/search.html', context)
+
+
+def campus_select(request):
+    """Switch the campus whose threads are listed; empty shows every campus"""
+    set_campus(request, request.GET.get('campus', ''))
+    next_url = request.GET.get('next', '')
+    if not url_has_allowed_host_and_scheme(next_url, allowed_hosts={request.get_host()}, require_https=request.is_secure()):
+        next_url = reverse('forum:forum_home')
+    return redirect(next_url)
+
+
+def metrics(request):
+    """Prometheus metrics, for staff or a scraper holding METRICS_TOKEN"""
+    token = request.headers.get('Authorization', '').removeprefix('Bearer ')
+    authorized = (settings.METRICS_TOKEN and constant_time_compare(token, settings.METRICS_TOKEN)) or request.user.is_staff
+    if not authorized:
+        return HttpResponseForbidden()
+    return HttpResponse(render_metrics(), content_type='text/plain; version=0.0.4; charset=utf-8')
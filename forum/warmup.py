@@ -0,0 +1,99 @@
+"""
+Worker warmup.
+
+Run from wsgi.py, so that with gunicorn's preload_app (gunicorn.conf.py) it
+happens once in the master and the workers share the result copy-on-write:
+heavy modules are imported, every forum template is compiled into the
+cached loader, the duplicate question index is loaded and the summaries
+and course hubs of the hottest threads are put in the cache. Database
+connections opened on the way are closed again, since they must not be
+shared across fork; each worker opens its own in post_worker_init.
+"""
+import importlib
+import logging
+import time
+from django.conf import settings
+from django.db import connections
+from django.template.loader import get_template
+
+logger = logging.getLogger(__name__)
+
+# Imported lazily elsewhere, on the first request that needs them.
+HEAVY_MODULES = [
+    'markdown',
+    'markdown.extensions.fenced_code',
+    'markdown.extensions.tables',
+    'markdown.extensions.nl2br',
+    'bleach',
+    'numpy',
+    'django.contrib.admin',
+    'forum.views',
+    'forum.admin',
+]
+POSTGRES_MODULES = ['django.contrib.postgres.search']
+
+
+def import_heavy_modules():
+    modules = list(HEAVY_MODULES)
+    if any(connections[alias].vendor == 'postgresql' for alias in connections):
+        modules += POSTGRES_MODULES
+    for name in modules:
+        importlib.import_module(name)
+    # The first Markdown() also builds its parsers and loads the extensions.
+    from .utils import render_markdown
+    render_markdown('**warm**')
+    return len(modules)
+
+
+def compile_templates():
+    """Compile every project template (forum/, account/ and base.html)"""
+    count = 0
+    for template_dir in settings.TEMPLATES[0]['DIRS']:
+        for path in sorted(template_dir.glob('**/*.html')):
+            get_template(path.relative_to(template_dir).as_posix())
+            count += 1
+    return count
+
+
+def open_connections():
+    for alias in connections:
+        connections[alias].ensure_connection()
+
+
+def prime_caches(top=None):
+    """Cache the summaries and course hubs of the most viewed threads"""
+    from .models import Thread
+    from .summaries import get_summaries
+    from .courses import get_course_hub
+
+    top = settings.WARMUP_HOT_THREADS if top is None else top
+    hot = list(
+        Thread.objects.filter(is_deleted=False).order_by('-view_count', '-pk')
+        .values_list('pk', 'course__code')[:top]
+    )
+    get_summaries([pk for pk, _ in hot])
+    codes = {code for _, code in hot if code}
+    for code in codes:
+        get_course_hub(code)
+    return len(hot), len(codes)
+
+
+def warm_up():
+    """Everything above, logged with timings; failures are logged, not raised"""
+    from .duplicates import warm_index
+
+    steps = [
+        ('imports', import_heavy_modules),
+        ('templates', compile_templates),
+        ('duplicate index', warm_index),
+        ('caches', prime_caches),
+    ]
+    for name, step in steps:
+        started = time.monotonic()
+        try:
+            result = step()
+        except Exception:
+            logger.exception('Warmup step %s failed', name)
+            continue
+        logger.info('Warmup %s: %s in %.2fs', name, result, time.monotonic() - started)
+    connections.close_all()
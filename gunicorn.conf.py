@@ -0,0 +1,44 @@
+"""
+gunicorn settings, read from ./gunicorn.conf.py by default.
+
+With preload_app the application, and so forum/warmup.py, is loaded once in
+the master; workers fork from it with modules, compiled templates and the
+duplicate index already in memory, shared copy-on-write.
+"""
+import os
+
+bind = os.environ.get('GUNICORN_BIND', f"0.0.0.0:{os.environ.get('PORT', 8000)}")
+workers = int(os.environ.get('WEB_CONCURRENCY', 3))
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 30))
+preload_app = os.environ.get('GUNICORN_PRELOAD', 'true').lower() in ('1', 'true', 'yes')
+# Recycle workers now and then so slow leaks cannot build up.
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', 0))
+max_requests_jitter = max_requests // 10
+
+
+def post_worker_init(worker):
+    # The master closed its connections before forking; open this worker's
+    # now rather than on its first request.
+    from forum.warmup import open_connections
+    try:
+        open_connections()
+    except Exception:
+        worker.log.exception('Could not open database connections')
+
+
+def on_starting(server):
+    # Counters from the previous run's workers would otherwise be added in.
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'studydeck.settings')
+    from forum.metrics import clear_files
+    clear_files()
+
+
+def worker_exit(server, worker):
+    # Write out what this worker counted since its last flush.
+    from forum.metrics import flush
+    from forum.viewcounts import flush_buffer
+    flush(force=True)
+    try:
+        flush_buffer()
+    except Exception:
+        worker.log.exception('Could not flush buffered thread views')
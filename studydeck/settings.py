@@ -12,6 +12,7 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 
 from pathlib import Path
 import os
+import tempfile
 from decouple import config
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -69,12 +70,14 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'forum.metrics.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',  # Required to serve static files in production
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'forum.profiling.ProfilerMiddleware',
     'allauth.account.middleware.AccountMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
@@ -86,12 +89,21 @@ TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
         'DIRS': [BASE_DIR / 'templates'],
-        'APP_DIRS': True,
         'OPTIONS': {
+            # Cached whatever DEBUG says; forum/warmup.py fills it at startup
+            # and the autoreloader clears it when a template changes.
+            'loaders': [
+                ('django.template.loaders.cached.Loader', [
+                    'django.template.loaders.filesystem.Loader',
+                    'django.template.loaders.app_directories.Loader',
+                ]),
+            ],
             'context_processors': [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'forum.context_processors.roles',
+                'forum.context_processors.campus',
             ],
         },
     },
@@ -120,6 +132,43 @@ else:
         }
     }
 
+# Optional PostgreSQL schema per campus for its forum rows, e.g.
+# GOA_DB_SCHEMA=campus_goa (see forum/campuses.py). Each gets an alias
+# campus_<campus>; run `manage.py prepare_campus_schemas` after every
+# migrate and then nightly.
+CAMPUS_SCHEMAS = {}
+for _campus in ('pilani', 'goa', 'hyderabad'):
+    _schema = config(f'{_campus.upper()}_DB_SCHEMA', default='')
+    if _schema:
+        CAMPUS_SCHEMAS[_campus] = _schema
+        DATABASES[f'campus_{_campus}'] = {
+            **DATABASES['default'],
+            'OPTIONS': {**DATABASES['default'].get('OPTIONS', {}), 'options': f'-c search_path={_schema},public'},
+            'TEST': {'MIRROR': 'default'},
+        }
+
+DATABASE_ROUTERS = ['forum.campuses.CampusRouter']
+
+
+# Cache
+# A shared cache (Redis) is needed for cached pages and counters to be
+# consistent across workers; without REDIS_URL each process has its own.
+REDIS_URL = config('REDIS_URL', default='')
+
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'forum.metrics.MeteredRedisCache',
+            'LOCATION': REDIS_URL,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'forum.metrics.MeteredLocMemCache',
+        }
+    }
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -206,7 +255,9 @@ ACCOUNT_LOGOUT_ON_GET = True
 ACCOUNT_ADAPTER = 'forum.adapters.BITsEmailAdapter'
 
 # Email Configuration
-EMAIL_BACKEND = config('EMAIL_BACKEND', default='django.core.mail.backends.console.EmailBackend')
+# Mail is timed and counted by forum.metrics on its way to this backend
+EMAIL_DELIVERY_BACKEND = config('EMAIL_BACKEND', default='django.core.mail.backends.console.EmailBackend')
+EMAIL_BACKEND = 'forum.metrics.MeteredEmailBackend'
 EMAIL_HOST = config('EMAIL_HOST', default='')
 EMAIL_PORT = config('EMAIL_PORT', default=587, cast=int)
 EMAIL_USE_TLS = config('EMAIL_USE_TLS', default=True, cast=bool)
@@ -220,3 +271,83 @@ RATELIMIT_USE_CACHE = config('RATELIMIT_USE_CACHE', default='default')
 
 # Markdown Configuration
 MARKDOWN_EXTENSIONS = ['fenced_code', 'tables', 'nl2br']
+
+# Thread deletion: threads with more replies than the inline limit are hidden
+# and hard-deleted in batches by `manage.py purge_threads`
+THREAD_PURGE_BATCH_SIZE = config('THREAD_PURGE_BATCH_SIZE', default=500, cast=int)
+THREAD_PURGE_INLINE_LIMIT = config('THREAD_PURGE_INLINE_LIMIT', default=100, cast=int)
+
+# Soft-deleted replies older than this are moved to the archive table by
+# `manage.py archive_replies`
+REPLY_ARCHIVE_AFTER_DAYS = config('REPLY_ARCHIVE_AFTER_DAYS', default=30, cast=int)
+
+# Locked threads with no activity in the current semester or the previous
+# THREAD_ARCHIVE_KEEP_SEMESTERS - 1 are moved to the archive tables by
+# `manage.py archive_threads`
+THREAD_ARCHIVE_KEEP_SEMESTERS = config('THREAD_ARCHIVE_KEEP_SEMESTERS', default=1, cast=int)
+
+# How long a session may trust its cached moderator flag before re-checking.
+# Without REDIS_URL the flag is not cached, so role changes apply at once.
+ROLE_CACHE_SECONDS = config('ROLE_CACHE_SECONDS', default=300, cast=int)
+
+# Vocabulary and IDF weights from the last `manage.py build_related_threads`
+RELATED_THREADS_MODEL_PATH = config('RELATED_THREADS_MODEL_PATH', default=str(BASE_DIR / 'var' / 'related_threads.json'))
+
+# Near-duplicate question index snapshot (`manage.py build_duplicate_index`)
+DUPLICATE_INDEX_PATH = config('DUPLICATE_INDEX_PATH', default=str(BASE_DIR / 'var' / 'duplicate_index.npz'))
+DUPLICATE_INDEX_REFRESH_SECONDS = config('DUPLICATE_INDEX_REFRESH_SECONDS', default=30, cast=int)
+
+# Course hub pages are cached and dropped when the course's threads or
+# resources change; vote counts on them may lag by up to this long
+COURSE_HUB_CACHE_SECONDS = config('COURSE_HUB_CACHE_SECONDS', default=600, cast=int)
+
+# Typeahead results for courses, resources and tags
+AUTOCOMPLETE_CACHE_SECONDS = config('AUTOCOMPLETE_CACHE_SECONDS', default=300, cast=int)
+
+# Rendered reply blocks on thread pages; keys include the reply's updated_at,
+# so edits show up at once and this only bounds how long a fragment lingers
+REPLY_FRAGMENT_CACHE_SECONDS = config('REPLY_FRAGMENT_CACHE_SECONDS', default=86400, cast=int)
+
+# Thread cards on list pages; dropped on any change to the thread, its
+# replies, votes or tags, so this mainly bounds stale author/category names
+THREAD_SUMMARY_CACHE_SECONDS = config('THREAD_SUMMARY_CACHE_SECONDS', default=3600, cast=int)
+
+# Ranked search results per normalized query; any thread or tag change
+# retires them at once, so this only bounds other staleness
+SEARCH_CACHE_SECONDS = config('SEARCH_CACHE_SECONDS', default=300, cast=int)
+
+# Thread views are buffered per worker and pushed to the cache every
+# VIEW_BUFFER_SECONDS or VIEW_BUFFER_SIZE views; `manage.py flush_view_counts`
+# must run more often than VIEW_DIRTY_TTL_SECONDS to pick them all up.
+# Without REDIS_URL workers write their views to the database themselves.
+VIEW_BUFFER_SECONDS = config('VIEW_BUFFER_SECONDS', default=10, cast=int)
+VIEW_BUFFER_SIZE = config('VIEW_BUFFER_SIZE', default=500, cast=int)
+VIEW_DIRTY_TTL_SECONDS = config('VIEW_DIRTY_TTL_SECONDS', default=86400, cast=int)
+
+# Directory of pre-rendered anonymous pages that nginx serves before proxying,
+# written by `manage.py publish_snapshots`; empty turns snapshots off
+SNAPSHOT_ROOT = config('SNAPSHOT_ROOT', default='')
+SNAPSHOT_TOP_THREADS = config('SNAPSHOT_TOP_THREADS', default=200, cast=int)
+
+# Where each process writes its metrics for /metrics to add up (see
+# forum/metrics.py); /metrics answers staff users, or this bearer token
+METRICS_DIR = config('METRICS_DIR', default=os.path.join(tempfile.gettempdir(), 'studydeck-metrics'))
+METRICS_TOKEN = config('METRICS_TOKEN', default='')
+
+# Sampling profiler (forum/profiling.py): staff requests sent with an
+# X-Profile header are sampled every PROFILE_INTERVAL_MS; with
+# PROFILE_SLOW_MS set, a PROFILE_SAMPLE_RATE share of all requests is
+# sampled every PROFILE_SLOW_INTERVAL_MS and kept if it took that long
+PROFILE_SPOOL_DIR = config('PROFILE_SPOOL_DIR', default=os.path.join(tempfile.gettempdir(), 'studydeck-profiles'))
+PROFILE_INTERVAL_MS = config('PROFILE_INTERVAL_MS', default=5, cast=int)
+PROFILE_SLOW_MS = config('PROFILE_SLOW_MS', default=0, cast=int)
+PROFILE_SAMPLE_RATE = config('PROFILE_SAMPLE_RATE', default=0.05, cast=float)
+PROFILE_SLOW_INTERVAL_MS = config('PROFILE_SLOW_INTERVAL_MS', default=20, cast=int)
+
+# Most viewed threads whose summaries and course hubs forum/warmup.py
+# caches when the app starts
+WARMUP_HOT_THREADS = config('WARMUP_HOT_THREADS', default=200, cast=int)
+
+# Admin changelists on PostgreSQL show the planner's row estimate instead of
+# an exact COUNT(*) once a table or filtered result is larger than this
+ADMIN_ESTIMATED_COUNT_THRESHOLD = config('ADMIN_ESTIMATED_COUNT_THRESHOLD', default=10000, cast=int)
@@ -20,11 +20,13 @@ from django.conf import settings
 from django.conf.urls.static import static
 
 from django.views.generic import RedirectView
+from forum import views as forum_views
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('accounts/', include('allauth.urls')),
     path('forum/', include('forum.urls')),
+    path('metrics', forum_views.metrics, name='metrics'),
     path('', RedirectView.as_view(url='/forum/', permanent=False), name='home'),
 ]
 
@@ -14,3 +14,8 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'studydeck.settings')
 
 application = get_wsgi_application()
+
+# Imports, templates, the duplicate index and hot caches, before the first
+# request needs them (in the gunicorn master when preloading).
+from forum.warmup import warm_up  # noqa: E402
+warm_up()